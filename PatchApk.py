@@ -10,25 +10,306 @@ import webbrowser
 import zipfile
 import re
 import json
+import mmap
+import base64
+import sqlite3
+import hashlib
+import struct
+import zlib
+import tempfile
+import argparse
+import atexit
+import fnmatch
+import xml.parsers.expat
+from xml.sax.saxutils import escape as xml_escape
 import tkinter as tk
 from tkinter import filedialog
+from array import array
+from contextlib import redirect_stdout
+from collections import OrderedDict, deque
+from itertools import islice, groupby
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future, as_completed
+try:
+    import fcntl  # reflinks (FICLONE) on Linux
+except ImportError:
+    fcntl = None
 
 # Global variable to store path to Apk_Patch
 APK_PATCH_DIR = os.path.join(os.path.expanduser("~"), "Desktop", "Apk_Patch")
 dependencies_dir = os.path.join(APK_PATCH_DIR, "dependencies")
-LOG_FILE = os.path.join(APK_PATCH_DIR, "modification_log.json")
+LOG_FILE = os.path.join(APK_PATCH_DIR, "modification_log.json")  # legacy format, imported into the journal
+
+# Append-only journal of replaced lines and deleted files, one session per delete/replace run
+JOURNAL_FILE = os.path.join(APK_PATCH_DIR, "modification_journal.sqlite")
+JOURNAL_BATCH_SIZE = 1000  # entries buffered before one executemany + commit
+
+# Content-addressed copies of every file a session touched or deleted, blobs/<sha256[:2]>/<sha256>
+SNAPSHOT_DIR = os.path.join(APK_PATCH_DIR, "snapshots")
+
+# Data keyed by APK hash, kept across sessions (clear_old_apk_files leaves it alone)
+CACHE_DIR = os.path.join(APK_PATCH_DIR, "cache")
+SYMBOL_INDEX_DIR = os.path.join(CACHE_DIR, "symbols")
+
+# Pristine apktool output keyed by APK SHA-256 + apktool version, linked into the workspace on a re-unpack.
+# Least recently used entries are evicted once the cache grows past DECODE_CACHE_MAX_BYTES.
+DECODE_CACHE_DIR = os.path.join(CACHE_DIR, "decoded")
+DECODE_CACHE_MAX_BYTES = 20 * 1024 ** 3
+FICLONE = 0x40049409  # linux/fs.h
+apktool_versions = {}  # (tool path, mtime_ns, size) -> version, so the jar is only opened once
+
+# Signed APKs keyed by input SHA-256 + keystore fingerprint + signer version: sign_Apk links unchanged splits in
+# from here and only signs the rest, spread over SIGN_WORKERS signer processes. Oldest entries go past the limit.
+SIGNED_CACHE_DIR = os.path.join(CACHE_DIR, "signed")
+SIGNED_CACHE_MAX_BYTES = 5 * 1024 ** 3
+SIGN_WORKERS = min(4, os.cpu_count() or 1)  # each worker is its own JVM
+SIGNED_SUFFIX = "-aligned-debugSigned.apk"  # uber-apk-signer output name with the debug keystore
+DEBUG_KEYSTORE = os.path.join(os.path.expanduser("~"), ".android", "debug.keystore")  # used by uber when present
+signer_versions = {}  # (jar path, mtime_ns, size) -> version
+file_digests = {}  # (path, size, mtime_ns, inode) -> sha256, see cached_sha256
+
+# CREATE_NO_WINDOW only exists on Windows, 0 keeps the same calls working elsewhere (CI, nightly runs)
+NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+# Warm JVM: tools/ToolHost.java keeps apktool and the signer loaded between calls. It needs a JDK 11-23: the
+# source launch needs javac, and the host must catch the tools' System.exit, which Java 24 no longer allows
+# (11 traps by default, 12-23 need -Djava.security.manager=allow, which 11 and 24+ refuse to start with).
+# Opt-in with APK_PATCH_TOOL_HOST=1 or --tool-host; every call falls back to java -jar when it is unavailable.
+TOOL_HOST_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tools", "ToolHost.java")
+TOOL_HOST_JAVA_VERSIONS = range(11, 24)
+USE_TOOL_HOST = os.environ.get("APK_PATCH_TOOL_HOST") == "1"
+tool_host = None  # running ToolHost, started on first use
+tool_host_failed = False  # do not retry a host that could not start
+java_versions = {}  # java path -> feature version (8, 11, 17...) or None
+
+# Incremental pack: a (size, mtime, hash) manifest of every decoded file is saved next to the folder at unpack.
+# At pack the untouched build units (one dex per smali folder, the compiled resources) are seeded from the
+# original APK into build/apk/, which apktool b treats as up to date, so only the changed units are rebuilt.
+UNPACK_MANIFEST_SUFFIX = ".unpack.json"
+UNPACK_MANIFEST_VERSION = 1
+APKTOOL_OUTPUT_DIRS = ("build", "dist")
+REUSED_OUTPUTS_FILE = "apk_patch_reused.json"  # inside build/, what the last pack seeded from the original APK
+
+# Partial decodes: apktool flags per profile. Parts left undecoded stay raw in the tree and apktool b copies them
+# back unchanged. The manifest can only be decoded together with the resource table it references, so manifest
+# and resources share flags. "sources" with selected dex files decodes only those, every other dex stays raw.
+DECODE_PROFILES = {
+    "full": (),
+    "manifest": ("-s",),  # same decode as resources, kept as a name for the CLI
+    "resources": ("-s",),
+    "sources": ("-r",),
+    "raw": ("-r", "-s"),  # nothing needs decoding (lib/, assets/ only)
+}
+UNDECODED_TOP_DIRS = ("lib", "assets", "unknown", "kotlin", "original", "META-INF")  # copied as-is by every profile
+
+# Direct ZIP patching (zip_patch_apk): untouched entries are copied as raw compressed bytes, no decode or rebuild
+ZIP_STORED_ALIGNMENT = 4  # zipalign's default for uncompressed entries
+ZIP_SO_ALIGNMENT = 4096  # uncompressed native libs are mmapped straight from the APK
+ZIP_COPY_CHUNK = 1024 * 1024
+MEDIA_EXTENSIONS = frozenset({
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".ogg", ".mp3", ".m4a", ".aac", ".mp4", ".webm", ".mkv",
+})  # already compressed, deflate saves next to nothing (aapt stores the same list by default)
+ZIP_STORE_EXTENSIONS = MEDIA_EXTENSIONS | {
+    ".zip", ".gz", ".jar", ".apk", ".bnk", ".unity3d", ".arsc", ".so",
+}  # new entries of these types are stored, deflating them again gains nothing
+
+# Align stage between pack and sign (align_apk): media stored, stored entries aligned, big entries done in threads
+ALIGN_WORKERS = os.cpu_count() or 1  # zlib releases the GIL, so threads scale
+ALIGN_PARALLEL_MIN_SIZE = 256 * 1024  # smaller entries are cheaper to handle inline
+ALIGN_WINDOW_BYTES = 256 * 1024 * 1024  # uncompressed bytes in flight before the writer waits
+V1_SIGNATURE_FILE = re.compile(r"^META-INF/([^/]+\.(SF|RSA|DSA|EC)|MANIFEST\.MF)$", re.IGNORECASE)
+
+# Workspace staging (stage_file): hardlink, then reflink / copy_file_range, then sendfile, a plain copy last.
+# Staged hardlinks share the user's original file; they are recorded here and are only ever read, renamed
+# over or unlinked, never written through.
+STAGED_LINKS_FILE = os.path.join(APK_PATCH_DIR, "staged_links.json")
+
+# Every folder the tool itself keeps in the workspace, never an unpacked APK (hidden folders are temp space)
+RESERVED_DIRS = ("dependencies", "signed", "cache", "batch", "snapshots")
+
+# Revert history (journal, legacy log, snapshot blobs), left alone by the headless run/zip-patch cleanup
+WORKSPACE_HISTORY = ("modification_log.json", "modification_journal.sqlite", "modification_journal.sqlite-wal",
+                     "modification_journal.sqlite-shm", "snapshots")
+
+# Batch mode: one workspace per APK under batch/, jobs limited by CPU count and free memory
+BATCH_DIR_NAME = "batch"
+BATCH_JOB_MEMORY = 2 * 1024 ** 3  # an apktool JVM peaks around 1-2 GB
+
+# Parallel search settings
+SEARCH_WORKERS = os.cpu_count() or 1
+PARALLEL_SEARCH_MIN_FILES = 2000  # below this the pool startup costs more than it saves
+SEARCH_SHARDS_PER_WORKER = 4  # smaller shards keep all cores busy until the end
+
+# Byte-level search for ASCII keywords (no decoding, lines are only located around hits)
+USE_BYTE_SEARCH = True
+MMAP_MIN_SIZE = 256 * 1024  # smaller files are cheaper to read in one call than to map
+MMAP_WINDOW_SIZE = 4 * 1024 * 1024  # mapped files are lowercased one window at a time
+
+# File enumeration: binary resources are skipped by extension, unknown extensions by a NUL sniff
+BINARY_EXTENSIONS = frozenset({
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp", ".ico", ".svgz",
+    ".so", ".dex", ".jar", ".apk", ".zip", ".gz", ".arsc", ".bin", ".dat", ".db",
+    ".ttf", ".otf", ".woff", ".woff2",
+    ".ogg", ".mp3", ".wav", ".m4a", ".aac", ".flac", ".mp4", ".webm", ".mkv",
+    ".pak", ".bnk", ".obb", ".unity3d", ".assets", ".resource", ".tflite", ".pb",
+})
+TEXT_EXTENSIONS = frozenset({
+    ".smali", ".xml", ".json", ".txt", ".yml", ".yaml", ".properties", ".html", ".htm",
+    ".js", ".css", ".java", ".kt", ".md", ".csv", ".ini", ".cfg", ".pro", ".version",
+})
+BINARY_SNIFF_SIZE = 8192
+
+# Characters that make up a smali identifier token for whole-token search
+SMALI_TOKEN_CHARS = r"[\w$-]"
+
+# Rewritten files go through a temp file + os.replace; fsync also survives power loss but costs ~0.5ms a file
+ATOMIC_WRITE_FSYNC = False
+
+# Manifest component patcher (remove_ads / restore_ads)
+AD_KEYWORDS = ['reward', 'adactivity', 'ads', 'interstitial']
+MANIFEST_COMPONENT_TAGS = frozenset({"activity", "service", "receiver", "provider"})
+ANDROID_NS = "http://schemas.android.com/apk/res/android"
+MANIFEST_CHUNK_SIZE = 1024 * 1024  # the manifest is streamed, only one chunk plus one tag is held
+
+# Declarative patch rules (apply_patch_rules)
+PATCH_RULE_TYPES = ("manifest", "replace", "delete", "resource")
+RESOURCE_VALUE_PATHS = ("res/values*/*.xml",)
+
+# Trigram index of the base folder, kept next to the workspace
+SEARCH_INDEX_FILE = os.path.join(APK_PATCH_DIR, "search_index.json")  # plain data, never unpickled: the workspace is user-writable
+SEARCH_INDEX_VERSION = 2
+search_index_cache = None  # (index file mtime, index) so repeat searches skip the parse
+
+# In-memory LRU of complete search results, keyed by query and base folder fingerprint
+SEARCH_CACHE_MAX_ENTRIES = 32
+SEARCH_CACHE_MAX_RESULTS = 200_000  # total results held across all entries
+search_cache = OrderedDict()  # key -> (total_files, results)
 
 # Ensure the directories exist
 os.makedirs(dependencies_dir, exist_ok=True)  
 
+def set_workspace(apk_patch_dir, shared_dependencies_dir=None, shared_cache_dir=None):
+    # Points every workspace path at another Apk_Patch folder (scripts, benchmarks, batch runs)
+    global APK_PATCH_DIR, dependencies_dir, LOG_FILE, JOURNAL_FILE, SNAPSHOT_DIR, STAGED_LINKS_FILE, CACHE_DIR, SYMBOL_INDEX_DIR, DECODE_CACHE_DIR, SIGNED_CACHE_DIR, SEARCH_INDEX_FILE, search_index_cache
+    APK_PATCH_DIR = os.path.abspath(apk_patch_dir)
+    dependencies_dir = shared_dependencies_dir or os.path.join(APK_PATCH_DIR, "dependencies")
+    LOG_FILE = os.path.join(APK_PATCH_DIR, "modification_log.json")
+    JOURNAL_FILE = os.path.join(APK_PATCH_DIR, "modification_journal.sqlite")
+    SNAPSHOT_DIR = os.path.join(APK_PATCH_DIR, "snapshots")
+    STAGED_LINKS_FILE = os.path.join(APK_PATCH_DIR, "staged_links.json")
+    CACHE_DIR = shared_cache_dir or os.path.join(APK_PATCH_DIR, "cache")
+    SYMBOL_INDEX_DIR = os.path.join(CACHE_DIR, "symbols")
+    DECODE_CACHE_DIR = os.path.join(CACHE_DIR, "decoded")
+    SIGNED_CACHE_DIR = os.path.join(CACHE_DIR, "signed")
+    SEARCH_INDEX_FILE = os.path.join(APK_PATCH_DIR, "search_index.json")
+    search_index_cache = None
+    search_cache.clear()
+    os.makedirs(APK_PATCH_DIR, exist_ok=True)
+
+
+def java_feature_version():
+    # Major version of the java on PATH ("1.8.0_392" -> 8, "17.0.9" -> 17), None when it cannot be run
+    java_path = shutil.which("java")
+    if java_path not in java_versions:
+        version = None
+        try:
+            result = subprocess.run([java_path or "java", "-version"], capture_output=True, text=True, timeout=60, creationflags=NO_WINDOW)
+            match = re.search(r'version "(?:1\.)?(\d+)', result.stderr)
+            version = int(match.group(1)) if match else None
+        except (OSError, subprocess.SubprocessError):
+            pass
+        java_versions[java_path] = version
+    return java_versions[java_path]
+
+
+class ToolHost:
+    # Python side of tools/ToolHost.java, one request at a time
+
+    def __init__(self):
+        version = java_feature_version()
+        if version not in TOOL_HOST_JAVA_VERSIONS:
+            # On 24+ every tool's System.exit would end the host, so nothing would stay warm
+            found = f"Java {version}" if version else "no usable java"
+            raise OSError(f"needs a JDK {TOOL_HOST_JAVA_VERSIONS[0]}-{TOOL_HOST_JAVA_VERSIONS[-1]}, found {found}")
+        flags = ["-Djava.security.manager=allow"] if version >= 12 else []
+        self.process = subprocess.Popen(
+            ["java", *flags, TOOL_HOST_SOURCE],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            creationflags=NO_WINDOW
+        )
+        ready = self.process.stdout.readline().split()
+        if ready != ["READY", "trap"]:
+            self.process.kill()
+            self.process.wait()
+            raise OSError("tool host did not start" if not ready else "tool host cannot catch System.exit")
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def run(self, jar_path, args):
+        # Returns the tool's exit code, or None when the host died without a usable answer
+        try:
+            self.process.stdin.write("\t".join([jar_path] + args) + "\n")
+            self.process.stdin.flush()
+            while True:
+                reply = self.process.stdout.readline()
+                if not reply:
+                    break
+                if reply.startswith("DONE "):
+                    return int(reply.split()[1])
+        except (OSError, ValueError):
+            pass
+        self.process.wait()
+        return None
+
+    def close(self):
+        if self.alive():
+            try:
+                self.process.stdin.write("EXIT\n")
+                self.process.stdin.close()
+                self.process.wait(timeout=10)
+            except (OSError, ValueError, subprocess.TimeoutExpired):
+                self.process.kill()
+
+def close_tool_host():
+    global tool_host
+    if tool_host is not None:
+        tool_host.close()
+        tool_host = None
+
+atexit.register(close_tool_host)
+
+def run_java_tool(jar_path, args):
+    # java -jar jar_path args, through the warm tool host when enabled.
+    # Raises CalledProcessError on failure, like subprocess.run(check=True).
+    global tool_host, tool_host_failed
+    args = [str(arg) for arg in args]
+    command = ["java", "-jar", jar_path] + args
+    if USE_TOOL_HOST and not tool_host_failed and not any("\t" in arg or "\n" in arg for arg in [jar_path] + args):
+        code = None
+        try:
+            if tool_host is None or not tool_host.alive():
+                tool_host = ToolHost()
+            code = tool_host.run(os.path.abspath(jar_path), args)
+        except OSError as e:
+            print(f"[!] Tool host unavailable, using java -jar instead ({e})")
+            tool_host_failed = True
+        if code is not None:
+            if code != 0:
+                raise subprocess.CalledProcessError(code, command)
+            return
+        # The host died mid-request, run the tool the usual way
+        tool_host = None
+
+    subprocess.run(command, check=True, creationflags=NO_WINDOW)
 
 def PORE():
+    # Returns True to show the menu again; the caller loops instead of recursing
     print("\n[⏸] Press ENTER to Restart or anykey to Exit...")
     message = input()
-    if (message):
-        exit(1)
-    main()
-    PORE()
+    return not message
     
 def download_with_progress(url, dest, progress_callback):
     def show_progress(block_num, block_size, total_size):
@@ -373,15 +654,8 @@ def select_Apk():
                 continue
             else:
                 print(f"\n[+] APK file selected: {selected_path}")
-
-                destination_path = os.path.join(APK_PATCH_DIR, "base.apk")
-
-                try:
-                    shutil.copy2(selected_path, destination_path)
-                    print(f"\n[+] Copied APK to Apk_Patch folder:\n    {destination_path}")
+                if import_Apk(selected_path):
                     return
-                except Exception as e:
-                    print(f"\n[!] Failed to copy APK: {e}")
 
     def select_apk_from_folder():
         root = tk.Tk()
@@ -398,13 +672,7 @@ def select_Apk():
             return None
 
         print(f"\n[+] APK file selected: {apk_path}")
-
-        destination_path = os.path.join(APK_PATCH_DIR, "base.apk")
-        try:
-            shutil.copy2(apk_path, destination_path)
-            print(f"\n[+] Copied APK to Apk_Patch folder:\n    {destination_path}")
-        except Exception as e:
-            print(f"\n[!] Failed to copy APK: {e}")
+        import_Apk(apk_path)
 
 
     print("\nDo you have the app installed on your phone or do you have the APK files on your PC?")
@@ -423,10 +691,634 @@ def select_Apk():
         select_apk_from_folder()
     else:
         print("\nInvalid choice!")
-        main()
         return
 
-def unpack_Apk():
+def copy_with_file_range(src_fd, dst_fd, size):
+    copied = 0
+    while copied < size:
+        sent = os.copy_file_range(src_fd, dst_fd, size - copied)
+        if sent == 0:
+            break
+        copied += sent
+    return copied
+
+def copy_with_sendfile(src_fd, dst_fd, size):
+    copied = 0
+    while copied < size:
+        sent = os.sendfile(dst_fd, src_fd, copied, size - copied)
+        if sent == 0:
+            break
+        copied += sent
+    return copied
+
+def copy_in_kernel(src, dst):
+    # copy_file_range (shares extents on Btrfs/XFS, copies server-side on NFS/SMB), then sendfile; both keep the
+    # bytes out of user space. Falls back to a buffered copy; returns the method used.
+    size = os.path.getsize(src)
+    method = "copy"
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        for name, copy in (("copy_file_range", copy_with_file_range), ("sendfile", copy_with_sendfile)):
+            if not hasattr(os, name):
+                continue
+            try:
+                if copy(fsrc.fileno(), fdst.fileno(), size) == size:
+                    method = name
+                    break
+            except OSError:
+                pass
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+        else:
+            shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+    shutil.copystat(src, dst)
+    return method
+
+def load_staged_links():
+    try:
+        with open(STAGED_LINKS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def staged_link_source(path, links=None):
+    # The user's file a staged path is hardlinked to, or None when the staged file is a private copy
+    source = (load_staged_links() if links is None else links).get(os.path.abspath(path))
+    try:
+        return source if source and os.path.samefile(path, source) else None
+    except OSError:
+        return None
+
+def stage_file(src, dst, track=True):
+    # Puts src at dst without copying bytes when the filesystem allows it; returns the method used.
+    # The file is staged under a temp name and renamed into place, so a dst that is already a hardlink
+    # to someone's original is replaced, never truncated and written through.
+    folder = os.path.dirname(os.path.abspath(dst))
+    os.makedirs(folder, exist_ok=True)
+    temp_path = os.path.join(folder, f".{os.path.basename(dst)}.staging-{os.getpid()}")
+    if os.path.lexists(temp_path):
+        os.remove(temp_path)
+    try:
+        try:
+            os.link(src, temp_path)
+            method = "hardlink"
+        except OSError:
+            method = "reflink" if clone_file(src, temp_path) else copy_in_kernel(src, temp_path)
+        os.replace(temp_path, dst)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+    if track:
+        links = load_staged_links()
+        key = os.path.abspath(dst)
+        if method == "hardlink":
+            # Staging a staged link (workspace -> signed/) still points at the user's original
+            links[key] = links.get(os.path.abspath(src), os.path.abspath(src))
+        elif links.pop(key, None) is None:
+            return method
+        atomic_write(STAGED_LINKS_FILE, json.dumps(links, indent=2))
+    return method
+
+def import_Apk(apk_path, split_paths=()):
+    # Stages an APK into the workspace as base.apk (plus any split APKs under their own names)
+    destination_path = os.path.join(APK_PATCH_DIR, "base.apk")
+    try:
+        os.makedirs(APK_PATCH_DIR, exist_ok=True)
+        method = stage_file(apk_path, destination_path)
+        print(f"\n[+] Staged APK in Apk_Patch folder ({method}):\n    {destination_path}")
+        for split_path in split_paths:
+            method = stage_file(split_path, os.path.join(APK_PATCH_DIR, os.path.basename(split_path)))
+            print(f"[+] Staged split APK ({method}): {os.path.basename(split_path)}")
+        bind_history_to_apk(cached_sha256(destination_path))
+    except Exception as e:
+        print(f"\n[!] Failed to copy APK: {e}")
+        return None
+    return destination_path
+
+def file_blake2b(file_path, chunk_size=1024 * 1024):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_shard(file_paths):
+    return [file_blake2b(file_path) for file_path in file_paths]
+
+def hash_tree_files(folder, rel_paths, sizes=None, workers=None):
+    file_paths = [os.path.join(folder, rel_path) for rel_path in rel_paths]
+    if workers is None:
+        workers = SEARCH_WORKERS if len(file_paths) >= PARALLEL_SEARCH_MIN_FILES else 1
+    if workers <= 1:
+        return hash_shard(file_paths)
+    shards = split_into_shards(file_paths, workers * SEARCH_SHARDS_PER_WORKER, sizes)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return [digest for shard in executor.map(hash_shard, shards) for digest in shard]
+
+def unpack_manifest_path(unpack_dir):
+    unpack_dir = unpack_dir.rstrip(os.sep)
+    return os.path.join(os.path.dirname(unpack_dir), os.path.basename(unpack_dir) + UNPACK_MANIFEST_SUFFIX)
+
+def decoded_tree_stats(unpack_dir):
+    # build/ and dist/ are apktool's own output, not decoded sources
+    return {
+        rel_path: stat for rel_path, stat in scan_tree_stats(unpack_dir).items()
+        if rel_path.split(os.sep, 1)[0] not in APKTOOL_OUTPUT_DIRS
+    }
+
+def record_unpack_manifest(unpack_dir, apk_path, apk_sha256=None, files=None, profile="full", dex_names=None):
+    # files: a manifest already known for this tree (restored from the decode cache), skips the hashing
+    if files is None:
+        stats = decoded_tree_stats(unpack_dir)
+        rel_paths = list(stats)
+        digests = hash_tree_files(unpack_dir, rel_paths, [stats[rel_path][1] for rel_path in rel_paths])
+        files = {rel_path: [stats[rel_path][1], stats[rel_path][0], digest] for rel_path, digest in zip(rel_paths, digests)}
+    apk_stat = os.stat(apk_path)
+    manifest = {
+        "version": UNPACK_MANIFEST_VERSION,
+        "apk": os.path.abspath(apk_path),
+        "apk_sha256": apk_sha256 or file_sha256(apk_path),
+        "apk_stat": [apk_stat.st_size, apk_stat.st_mtime_ns],  # pack only hashes the APK again when these moved
+        "profile": profile,
+        "dex": dex_names,  # sources profile: the only dex files decoded to smali
+        "files": files,
+    }
+    atomic_write(unpack_manifest_path(unpack_dir), json.dumps(manifest))
+    return manifest
+
+def load_unpack_manifest(unpack_dir):
+    try:
+        with open(unpack_manifest_path(unpack_dir), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("version") == UNPACK_MANIFEST_VERSION else None
+
+def changed_since_unpack(unpack_dir, manifest):
+    # Relative paths added, removed or edited since unpack; a file whose size matches but mtime moved is hashed
+    recorded = manifest["files"]
+    stats = decoded_tree_stats(unpack_dir)
+    changed = {rel_path for rel_path in recorded if rel_path not in stats}
+    suspects = []
+    for rel_path, (mtime_ns, size) in stats.items():
+        entry = recorded.get(rel_path)
+        if entry is None or entry[0] != size:
+            changed.add(rel_path)
+        elif entry[1] != mtime_ns:
+            suspects.append(rel_path)
+    if suspects:
+        digests = hash_tree_files(unpack_dir, suspects, [stats[rel_path][1] for rel_path in suspects])
+        changed.update(rel_path for rel_path, digest in zip(suspects, digests) if digest != recorded[rel_path][2])
+    return changed
+
+def smali_dex_name(folder):
+    # apktool names decoded dex folders smali (classes.dex) and smali_<dex path with / as @>
+    if folder == "smali":
+        return "classes.dex"
+    return folder[len("smali_"):].replace("@", "/") + ".dex"
+
+def extract_apk_entry(apk, name, target_path):
+    # Written fresh, so the mtime is newer than every decoded source and apktool b sees the output as current
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    with apk.open(name) as src, open(target_path, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+def original_apk_unchanged(unpack_dir, manifest):
+    # Same size and mtime as at unpack is enough; otherwise the APK is hashed, and the new stat recorded on a match
+    apk_path = manifest["apk"]
+    try:
+        st = os.stat(apk_path)
+    except OSError:
+        return False
+    if manifest.get("apk_stat") == [st.st_size, st.st_mtime_ns]:
+        return True
+    if file_sha256(apk_path) != manifest["apk_sha256"]:
+        return False
+    manifest["apk_stat"] = [st.st_size, st.st_mtime_ns]
+    atomic_write(unpack_manifest_path(unpack_dir), json.dumps(manifest))
+    return True
+
+def prepare_incremental_build(unpack_dir, manifest):
+    # Seeds build/apk/ with the original dex files and compiled resources of every unit untouched since unpack.
+    # Returns False when a full rebuild is needed.
+    build_dir = os.path.join(unpack_dir, "build")
+    build_apk_dir = os.path.join(build_dir, "apk")
+    reused_file = os.path.join(build_dir, REUSED_OUTPUTS_FILE)
+
+    apk_path = manifest["apk"]
+    if not original_apk_unchanged(unpack_dir, manifest):
+        print("[!] Original APK changed since unpack, doing a full rebuild.")
+        shutil.rmtree(build_dir, ignore_errors=True)
+        return False
+
+    changed_tops = {rel_path.split(os.sep, 1)[0] for rel_path in changed_since_unpack(unpack_dir, manifest)}
+    if "apktool.yml" in changed_tops:
+        print("[*] apktool.yml changed, doing a full rebuild.")
+        shutil.rmtree(build_dir, ignore_errors=True)
+        return False
+
+    try:
+        with open(reused_file, "r", encoding="utf-8") as f:
+            previously_reused = set(json.load(f))
+    except (OSError, ValueError):
+        previously_reused = set()
+
+    smali_folders = sorted(
+        d for d in os.listdir(unpack_dir)
+        if (d == "smali" or d.startswith("smali_")) and os.path.isdir(os.path.join(unpack_dir, d))
+    )
+    resources_changed = "res" in changed_tops or "AndroidManifest.xml" in changed_tops
+    reused = []
+    rebuild = []
+
+    with zipfile.ZipFile(apk_path) as apk:
+        names = set(apk.namelist())
+
+        for folder in smali_folders:
+            dex_name = smali_dex_name(folder)
+            target_path = os.path.join(build_apk_dir, *dex_name.split("/"))
+            if folder not in changed_tops and dex_name in names:
+                extract_apk_entry(apk, dex_name, target_path)
+                reused.append(dex_name)
+                continue
+            # A dex seeded by an earlier pack is stale now, apktool rebuilds whatever is missing
+            if dex_name in previously_reused and os.path.exists(target_path):
+                os.remove(target_path)
+            rebuild.append(dex_name)
+
+        if not resources_changed and "resources.arsc" in names and "AndroidManifest.xml" in names:
+            # aapt output from an earlier pack may use other file names, start res/ from scratch
+            shutil.rmtree(os.path.join(build_apk_dir, "res"), ignore_errors=True)
+            for name in sorted(names):
+                if name in ("resources.arsc", "AndroidManifest.xml") or (name.startswith("res/") and not name.endswith("/")):
+                    extract_apk_entry(apk, name, os.path.join(build_apk_dir, *name.split("/")))
+            reused.append("resources")
+        else:
+            if "resources" in previously_reused:
+                for name in ("resources.arsc", "AndroidManifest.xml"):
+                    target_path = os.path.join(build_apk_dir, name)
+                    if os.path.exists(target_path):
+                        os.remove(target_path)
+                shutil.rmtree(os.path.join(build_apk_dir, "res"), ignore_errors=True)
+            rebuild.append("resources")
+
+    os.makedirs(build_dir, exist_ok=True)
+    atomic_write(reused_file, json.dumps(reused))
+
+    reused_dex = [name for name in reused if name != "resources"]
+    print(f"[*] Incremental build: rebuilding {', '.join(rebuild) or 'nothing'}")
+    if reused:
+        kept = (["resources"] if "resources" in reused else []) + ([f"{len(reused_dex)} dex file(s)"] if reused_dex else [])
+        print(f"    reusing {' and '.join(kept)} from the original APK")
+    return True
+
+def find_apktool_jar():
+    for file in os.listdir(dependencies_dir):
+        if "apktool" in file.lower() and file.lower().endswith(".jar"):
+            return os.path.join(dependencies_dir, file)
+    return None
+
+def apktool_version():
+    # Identifies the apktool unpack_Apk runs, so trees decoded by another apktool version are never reused
+    # Same choice as run_apktool_decode: the local jar under the tool host, else apktool on PATH, else the jar
+    tool_path = find_apktool_jar() if USE_TOOL_HOST else None
+    tool_path = tool_path or shutil.which("apktool") or find_apktool_jar()
+    if tool_path is None:
+        return None
+    try:
+        st = os.stat(tool_path)
+    except OSError:
+        return None
+    key = (tool_path, st.st_mtime_ns, st.st_size)
+    if key not in apktool_versions:
+        version = None
+        try:
+            if tool_path.lower().endswith(".jar"):
+                with zipfile.ZipFile(tool_path) as jar:
+                    properties = jar.read("apktool.properties").decode("utf-8", "ignore")
+                match = re.search(r"^application\.version=(\S+)", properties, re.MULTILINE)
+                version = match.group(1) if match else None
+            else:
+                result = subprocess.run([tool_path, "--version"], capture_output=True, text=True, timeout=120, creationflags=NO_WINDOW)
+                words = result.stdout.split()
+                version = words[-1] if result.returncode == 0 and words else None
+        except (OSError, KeyError, zipfile.BadZipFile, subprocess.SubprocessError):
+            pass
+        # Unknown versions fall back to the tool's own hash, a replaced jar still gets its own entries
+        apktool_versions[key] = re.sub(r"[^\w.-]", "_", version) if version else "sha-" + file_sha256(tool_path)[:16]
+    return apktool_versions[key]
+
+def decode_cache_entry(apk_sha256, version, profile_key=""):
+    return os.path.join(DECODE_CACHE_DIR, f"{apk_sha256}-{version}{profile_key}")
+
+def clone_file(src, dst):
+    # Copy-on-write clone (Btrfs, XFS, bcachefs); False when the filesystem cannot share extents
+    if fcntl is None:
+        return False
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    except OSError:
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+def materialize_tree(src_folder, dst_folder, rel_paths):
+    # Reflinks when the filesystem supports them, otherwise hardlinks, otherwise copies; returns the method used.
+    # mtimes are kept either way, so an unpack manifest recorded for src_folder stays valid for dst_folder.
+    # Hardlinks are safe because every writer here replaces files (atomic_write) instead of editing in place.
+    method = "reflink" if fcntl is not None else "hardlink"
+    made_dirs = set()
+    for rel_path in rel_paths:
+        src = os.path.join(src_folder, rel_path)
+        dst = os.path.join(dst_folder, rel_path)
+        folder = os.path.dirname(dst)
+        if folder not in made_dirs:
+            os.makedirs(folder, exist_ok=True)
+            made_dirs.add(folder)
+        if method == "reflink":
+            if clone_file(src, dst):
+                continue
+            method = "hardlink"  # same trees on the same filesystems, no point trying again for the next file
+        if method == "hardlink":
+            try:
+                os.link(src, dst)
+                continue
+            except OSError:
+                method = "copy"
+        shutil.copy2(src, dst)
+    return method
+
+def read_decode_cache_meta(entry_dir):
+    try:
+        with open(os.path.join(entry_dir, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def store_decoded_tree(unpack_dir, apk_sha256, version, manifest, apk_name, profile_key=""):
+    entry_dir = decode_cache_entry(apk_sha256, version, profile_key)
+    if os.path.exists(entry_dir):
+        return
+    # Built under a temp name and renamed, so a batch worker never sees a half-written entry
+    temp_dir = f"{entry_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    try:
+        files = manifest["files"]
+        method = materialize_tree(unpack_dir, os.path.join(temp_dir, "tree"), files)
+        now = time.time()
+        meta = {
+            "apk_name": apk_name,
+            "apk_sha256": apk_sha256,
+            "apktool_version": version,
+            "profile": manifest.get("profile", "full"),
+            "dex": manifest.get("dex"),
+            "bytes": sum(entry[0] for entry in files.values()),
+            "created": now,
+            "last_used": now,
+            "files": files,
+        }
+        atomic_write(os.path.join(temp_dir, "meta.json"), json.dumps(meta))
+        os.rename(temp_dir, entry_dir)
+        print(f"[*] Decoded tree cached ({method}): {os.path.basename(entry_dir)}")
+    except OSError as e:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        if not os.path.exists(entry_dir):
+            print(f"[!] Failed to cache decoded tree: {e}")
+        return
+    prune_decode_cache(keep=os.path.basename(entry_dir))
+
+def restore_decoded_tree(apk_path, apk_sha256, version, unpack_dir, profile_key=""):
+    # Links a cached tree into unpack_dir; False on a miss, or when a cached file was edited in place
+    entry_dir = decode_cache_entry(apk_sha256, version, profile_key)
+    meta = read_decode_cache_meta(entry_dir)
+    if meta is None:
+        return False
+    started = time.perf_counter()
+    tree_dir = os.path.join(entry_dir, "tree")
+    files = meta["files"]
+    stats = scan_tree_stats(tree_dir)
+    if len(stats) != len(files) or any(stats.get(rel_path) != (entry[1], entry[0]) for rel_path, entry in files.items()):
+        print("[!] Cached decoded tree was modified outside the toolkit, decoding again.")
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        return False
+
+    shutil.rmtree(unpack_dir, ignore_errors=True)
+    try:
+        method = materialize_tree(tree_dir, unpack_dir, files)
+        record_unpack_manifest(unpack_dir, apk_path, apk_sha256, files, meta.get("profile", "full"), meta.get("dex"))
+    except OSError as e:
+        print(f"[!] Failed to restore cached tree ({e}), decoding again.")
+        shutil.rmtree(unpack_dir, ignore_errors=True)
+        return False
+
+    meta["last_used"] = time.time()
+    try:
+        atomic_write(os.path.join(entry_dir, "meta.json"), json.dumps(meta))
+    except OSError:
+        pass
+    print(f"\n[+] Restored {len(files)} file(s) from the decode cache ({method}) in {time.perf_counter() - started:.2f}s:\n    {unpack_dir}")
+    return True
+
+def list_decode_cache():
+    # Cache entries without their file lists, most recently used first
+    entries = []
+    if os.path.isdir(DECODE_CACHE_DIR):
+        for name in os.listdir(DECODE_CACHE_DIR):
+            entry_dir = os.path.join(DECODE_CACHE_DIR, name)
+            if ".tmp-" in name or not os.path.isdir(entry_dir):
+                continue
+            meta = read_decode_cache_meta(entry_dir)
+            if meta is None:
+                continue
+            meta.pop("files", None)
+            meta["key"] = name
+            entries.append(meta)
+    entries.sort(key=lambda meta: meta["last_used"], reverse=True)
+    return entries
+
+def prune_decode_cache(max_bytes=None, keep=None):
+    # Evicts least recently used entries until the cache fits in max_bytes; returns (entries, bytes) freed
+    max_bytes = DECODE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = list_decode_cache()
+    total = sum(meta["bytes"] for meta in entries)
+    removed = freed = 0
+    for meta in reversed(entries):
+        if total <= max_bytes:
+            break
+        if meta["key"] == keep:
+            continue
+        shutil.rmtree(os.path.join(DECODE_CACHE_DIR, meta["key"]), ignore_errors=True)
+        total -= meta["bytes"]
+        removed += 1
+        freed += meta["bytes"]
+        print(f"[🗑] Evicted cached tree: {meta['apk_name']} ({meta['apk_sha256'][:12]})")
+    return removed, freed
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def parse_size(text):
+    # "500M", "20G", "1024" -> bytes
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)B?\s*", text, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size: {text}")
+    return int(float(match.group(1)) * 1024 ** " KMGT".index(match.group(2).upper() or " "))
+
+def print_decode_cache():
+    entries = list_decode_cache()
+    if not entries:
+        print("\n[*] Decode cache is empty.")
+        return entries
+    print(f"\n[*] Decode cache: {DECODE_CACHE_DIR}\n")
+    for i, meta in enumerate(entries, 1):
+        last_used = time.strftime("%Y-%m-%d %H:%M", time.localtime(meta["last_used"]))
+        print(f"{i}. {meta['apk_name']:<24} {meta.get('profile', 'full'):<10} apktool {meta['apktool_version']:<12} {format_size(meta['bytes']):>10}  last used {last_used}  {meta['apk_sha256'][:12]}")
+    total = sum(meta["bytes"] for meta in entries)
+    print(f"\n    {len(entries)} tree(s), {format_size(total)} of {format_size(DECODE_CACHE_MAX_BYTES)}")
+    return entries
+
+def decode_cache_menu():
+    if not print_decode_cache():
+        return
+    choice = input("\nEnter 'p' to prune to a size, 'c' to clear everything, or press Enter to go back: ").strip().lower()
+    if choice == "p":
+        try:
+            max_bytes = parse_size(input("Keep at most (e.g. 5G): ").strip())
+        except ValueError as e:
+            print(f"[!] {e}")
+            return
+    elif choice == "c":
+        max_bytes = 0
+    else:
+        return
+    removed, freed = prune_decode_cache(max_bytes)
+    print(f"[+] Removed {removed} tree(s), freed {format_size(freed)}.")
+
+def run_apktool_decode(apk_path, out_dir, extra_args=()):
+    # apktool from PATH, else the local jar; returns True on success
+    args = ["d", apk_path, "-o", out_dir, "-f", *extra_args]
+    host_jar = find_apktool_jar() if USE_TOOL_HOST else None
+    if host_jar:
+        # The warm host runs jars, so the local one wins over apktool on PATH
+        try:
+            run_java_tool(host_jar, args)
+            print(f"\n[+] APK successfully unpacked using local apktool into:\n    {out_dir}")
+            return True
+        except subprocess.CalledProcessError as e:
+            print(f"\n[!] Failed to unpack APK with local apktool: {e}")
+            return False
+    try:
+        subprocess.run(["apktool"] + args, check=True, creationflags=NO_WINDOW)
+        print(f"\n[+] APK successfully unpacked into:\n    {out_dir}")
+        return True
+    except FileNotFoundError:
+        print("\n[!] 'apktool' not found in system PATH. Trying local dependency...")
+
+        # Try using the jar file from the dependencies folder
+        apktool_jar = find_apktool_jar()
+
+        if apktool_jar:
+            try:
+                run_java_tool(apktool_jar, args)
+                print(f"\n[+] APK successfully unpacked using local apktool into:\n    {out_dir}")
+                return True
+            except subprocess.CalledProcessError as e:
+                print(f"\n[!] Failed to unpack APK with local apktool: {e}")
+        else:
+            print("\n[✖] apktool not found in dependencies folder.")
+            print("    → Please run the dependency check from the main menu.")
+    except subprocess.CalledProcessError as e:
+        print(f"\n[!] Failed to unpack APK: {e}")
+    return False
+
+def dex_smali_folder(dex_name):
+    # Inverse of smali_dex_name
+    if dex_name == "classes.dex":
+        return "smali"
+    return "smali_" + dex_name[:-len(".dex")].replace("/", "@")
+
+def decode_selected_dex(apk_path, unpack_dir, dex_names):
+    # apktool has no per-dex switch: a stub APK holding only the wanted dex files is decoded and its smali moved in.
+    # The raw copies the main -s decode left in the tree are removed, so apktool b smalis these folders instead.
+    with tempfile.TemporaryDirectory(prefix=".decode-", dir=APK_PATCH_DIR) as temp_dir:
+        stub_path = os.path.join(temp_dir, "dex.apk")
+        with zipfile.ZipFile(apk_path) as apk, zipfile.ZipFile(stub_path, "w") as stub:
+            for name in ["AndroidManifest.xml", *dex_names]:
+                with apk.open(name) as src, stub.open(apk.getinfo(name), "w") as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+        stub_dir = os.path.join(temp_dir, "decoded")
+        if not run_apktool_decode(stub_path, stub_dir, ("-r",)):
+            return False
+        for name in dex_names:
+            folder = dex_smali_folder(name)
+            shutil.move(os.path.join(stub_dir, folder), os.path.join(unpack_dir, folder))
+            os.remove(os.path.join(unpack_dir, *name.split("/")))
+    return True
+
+def decode_profile_key(profile, dex_names=None):
+    # Cache entries of partial decodes are kept apart from full ones
+    if profile == "full":
+        return ""
+    key = profile if not dex_names else f"{profile}+{'+'.join(sorted(dex_names))}"
+    return "-" + re.sub(r"[^\w.+-]", "_", key)
+
+def plan_decode_profile(rule_files=(), remove_ads_patch=False):
+    # Smallest decode that still covers every planned patch: (profile, dex names or None for every dex)
+    # apktool decodes the manifest together with the resources, so manifest patches plan the resources profile
+    needs = set()
+    dex_names = set()
+    if remove_ads_patch:
+        needs.add("resources")
+    for rule_file in rule_files:
+        for rule in compile_patch_rules(load_patch_rules(rule_file)):
+            if rule["type"] in ("manifest", "resource"):
+                needs.add("resources")
+                continue
+            if not rule["paths"]:
+                if rule["file_types"] and set(rule["file_types"]) <= {".smali"}:
+                    needs.add("sources")
+                    dex_names.add(None)
+                elif rule["file_types"] and set(rule["file_types"]) <= {".xml"}:
+                    needs.add("resources")
+                else:
+                    needs.add("full")
+                continue
+            for glob in rule["paths"]:
+                top = glob.split("/", 1)[0]
+                if top in UNDECODED_TOP_DIRS:
+                    continue
+                if top == "res" or top == "AndroidManifest.xml":
+                    needs.add("resources")
+                elif (top == "smali" or top.startswith("smali_")) and not any(c in top for c in "*?["):
+                    needs.add("sources")
+                    dex_names.add(smali_dex_name(top))
+                elif top.startswith("smali"):
+                    needs.add("sources")
+                    dex_names.add(None)
+                else:
+                    needs.add("full")
+
+    if "full" in needs or ("sources" in needs and "resources" in needs):
+        return "full", None
+    if "sources" in needs:
+        return "sources", None if None in dex_names else sorted(dex_names)
+    if "resources" in needs:
+        return "resources", None
+    return "raw", None
+
+def unpack_Apk(apk_name=None, profile="full", dex_names=None):
     print("\n[+] Scanning for APKs in Apk_Patch directory...")
 
     if not os.path.exists(APK_PATCH_DIR):
@@ -442,67 +1334,92 @@ def unpack_Apk():
         print("\n[!] No APK files found in Apk_Patch.")
         return
     
-    print("\nSelect an APK to unpack:\n")
-    for idx, apk in enumerate(apk_files, 1):
-        print(f"{idx}. {apk}")
-    choice = input("\nEnter the number of the APK to unpack (or press Enter to cancel): ").strip()
+    if apk_name:
+        if apk_name not in apk_files:
+            print(f"\n[!] {apk_name} not found in Apk_Patch.")
+            return
+        selected_apk = apk_name
+    else:
+        print("\nSelect an APK to unpack:\n")
+        for idx, apk in enumerate(apk_files, 1):
+            print(f"{idx}. {apk}")
+        choice = input("\nEnter the number of the APK to unpack (or press Enter to cancel): ").strip()
 
-    if not choice.isdigit() or int(choice) < 1 or int(choice) > len(apk_files):
-        print("\n[!] Invalid selection or canceled.")
-        return
+        if not choice.isdigit() or int(choice) < 1 or int(choice) > len(apk_files):
+            print("\n[!] Invalid selection or canceled.")
+            return
 
-    selected_apk = apk_files[int(choice) - 1]
+        selected_apk = apk_files[int(choice) - 1]
     apk_path = os.path.join(APK_PATCH_DIR, selected_apk)
     unpack_folder_name = os.path.splitext(selected_apk)[0]
     unpack_dir = os.path.join(APK_PATCH_DIR, unpack_folder_name)
 
     print(f"\n[+] Unpacking {selected_apk} to:\n    {unpack_dir}")
 
-    # Create unpack folder
-    os.makedirs(unpack_dir, exist_ok=True)
-
-    try:
-        subprocess.run(["apktool", "d", apk_path, "-o", unpack_dir, "-f"], check=True, creationflags=subprocess.CREATE_NO_WINDOW)
-        print(f"\n[+] APK successfully unpacked into:\n    {unpack_dir}")
-    except FileNotFoundError:
-        print("\n[!] 'apktool' not found in system PATH. Trying local dependency...")
-
-        # Try using the jar file from the dependencies folder
-        dependencies_dir = os.path.join(APK_PATCH_DIR, "dependencies")
-        apktool_jar = None
-        for file in os.listdir(dependencies_dir):
-            if "apktool" in file.lower() and file.lower().endswith(".jar"):
-                apktool_jar = os.path.join(dependencies_dir, file)
-                break
-
-        if apktool_jar:
+    if profile not in DECODE_PROFILES:
+        print(f"\n[!] Unknown decode profile: {profile}")
+        return
+    dex_names = sorted(dex_names) if profile == "sources" and dex_names else None
+    if DECODE_PROFILES[profile] == DECODE_PROFILES["resources"]:
+        profile = "resources"  # one cache entry for the same decode
+    if profile != "full":
+        print(f"[*] Decode profile: {profile}" + (f" ({', '.join(dex_names)})" if dex_names else ""))
+
+    # The same APK decoded earlier by the same apktool is linked in from the cache instead of decoded again
+    apk_sha256 = cached_sha256(apk_path)
+    version = apktool_version()
+    profile_key = decode_profile_key(profile, dex_names)
+    from_cache = version is not None and restore_decoded_tree(apk_path, apk_sha256, version, unpack_dir, profile_key)
+    unpacked = from_cache
+
+    if not from_cache:
+        # Create unpack folder
+        os.makedirs(unpack_dir, exist_ok=True)
+        flags = DECODE_PROFILES["raw"] if dex_names else DECODE_PROFILES[profile]
+        unpacked = run_apktool_decode(apk_path, unpack_dir, flags)
+        if unpacked and dex_names:
             try:
-                subprocess.run(["java", "-jar", apktool_jar, "d", apk_path, "-o", unpack_dir, "-f"], check=True, creationflags=subprocess.CREATE_NO_WINDOW)
-                print(f"\n[+] APK successfully unpacked using local apktool into:\n    {unpack_dir}")
-            except subprocess.CalledProcessError as e:
-                print(f"\n[!] Failed to unpack APK with local apktool: {e}")
+                unpacked = decode_selected_dex(apk_path, unpack_dir, dex_names)
+            except (OSError, KeyError, zipfile.BadZipFile) as e:
+                print(f"\n[!] Failed to decode {', '.join(dex_names)}: {e}")
+                unpacked = False
+
+    # Fresh decode of the base folder, index it so searches only verify candidate files
+    if unpacked:
+        clear_search_cache()
+    if unpacked and not from_cache:
+        try:
+            add_do_not_compress(unpack_dir, MEDIA_EXTENSIONS)
+        except OSError as e:
+            print(f"[!] Could not update apktool.yml: {e}")
+        try:
+            manifest = record_unpack_manifest(unpack_dir, apk_path, apk_sha256, profile=profile, dex_names=dex_names)
+        except Exception as e:
+            print(f"[!] Failed to record unpack manifest, the next pack will be a full rebuild: {e}")
         else:
-            print("\n[✖] apktool not found in dependencies folder.")
-            print("    → Please run the dependency check from the main menu.")
-    except subprocess.CalledProcessError as e:
-        print(f"\n[!] Failed to unpack APK: {e}")
-
-def pack_Apk():
+            if version is not None:
+                store_decoded_tree(unpack_dir, apk_sha256, version, manifest, selected_apk, profile_key)
+    if unpacked and unpack_folder_name == "base":
+        print("\n[*] Building search index...")
+        if update_search_index(unpack_dir, rebuild=True):
+            print(f"[+] Search index saved to:\n    {SEARCH_INDEX_FILE}")
+    return unpack_dir if unpacked else None
+
+def pack_Apk(src_folder=None, incremental=True, align=True):
     print("\n[+] Packing APK...")
 
     # Set paths
-    dependencies_dir = os.path.join(APK_PATCH_DIR, "dependencies")
     apktool_path = os.path.join(dependencies_dir, "apktool.jar")
 
     if not os.path.exists(apktool_path):
         print("\n[!] apktool.jar not found in dependencies.")
         return
 
-      # Look for directories in APK_PATCH_DIR excluding 'dependencies'
-    subdirs = [
+      # Look for directories in APK_PATCH_DIR excluding the tool's own folders
+    subdirs = [src_folder] if src_folder else [
         os.path.join(APK_PATCH_DIR, d)
         for d in os.listdir(APK_PATCH_DIR)
-        if os.path.isdir(os.path.join(APK_PATCH_DIR, d)) and d.lower() != "dependencies" and d.lower() != "signed"
+        if os.path.isdir(os.path.join(APK_PATCH_DIR, d)) and d.lower() not in RESERVED_DIRS and not d.startswith(".")
     ]
 
     if not subdirs:
@@ -522,22 +1439,104 @@ def pack_Apk():
 
     print(f"\n[+] Building APK from: {src_folder}")
 
+    build_args = ["b", src_folder, "-o", output_apk_path]
+    manifest = load_unpack_manifest(src_folder)
+    if manifest is not None and manifest.get("profile", "full") != "full":
+        print(f"[*] Partial decode ({manifest['profile']}): parts that were not decoded are copied from the original APK")
     try:
-        result = subprocess.run(
-            ["java", "-jar", apktool_path, "b", src_folder, "-o", output_apk_path],
-            check=True,
-            creationflags=subprocess.CREATE_NO_WINDOW
-        )
-        print(f"[+] APK successfully rebuilt to:\n    {output_apk_path}")
+        if incremental and manifest is not None and not prepare_incremental_build(src_folder, manifest):
+            incremental = False
+    except (OSError, zipfile.BadZipFile, KeyError) as e:
+        print(f"[!] Incremental build unavailable ({e}), doing a full rebuild.")
+        shutil.rmtree(os.path.join(src_folder, "build"), ignore_errors=True)
+    if not incremental:
+        build_args.append("-f")  # skip apktool's change detection, rebuild every unit
 
+    try:
+        run_java_tool(apktool_path, build_args)
+        print(f"[+] APK successfully rebuilt to:\n    {output_apk_path}")
     except subprocess.CalledProcessError as e:
         print("\n[!] Failed to build APK.\n")
         print(e.stderr)
+        return
+
+    if align:
+        try:
+            align_apk(output_apk_path)
+        except (OSError, ValueError, zipfile.BadZipFile, zlib.error) as e:
+            print(f"[!] Alignment skipped: {e}")
+    return output_apk_path
+
+def signer_version(signer_path):
+    # Implementation-Version from the jar manifest, else the jar's own hash
+    st = os.stat(signer_path)
+    key = (signer_path, st.st_mtime_ns, st.st_size)
+    if key not in signer_versions:
+        version = None
+        try:
+            with zipfile.ZipFile(signer_path) as jar:
+                manifest = jar.read("META-INF/MANIFEST.MF").decode("utf-8", "ignore")
+            match = re.search(r"^Implementation-Version:\s*(\S+)", manifest, re.MULTILINE)
+            version = match.group(1) if match else None
+        except (OSError, KeyError, zipfile.BadZipFile):
+            pass
+        signer_versions[key] = re.sub(r"[^\w.-]", "_", version) if version else "sha-" + file_sha256(signer_path)[:16]
+    return signer_versions[key]
+
+def keystore_fingerprint():
+    # uber-apk-signer signs with ~/.android/debug.keystore when it exists, else with its embedded debug key
+    if os.path.isfile(DEBUG_KEYSTORE):
+        return "ks-" + file_sha256(DEBUG_KEYSTORE)[:16]
+    return "embedded"
+
+def signed_cache_path(apk_sha256, keystore, version):
+    return os.path.join(SIGNED_CACHE_DIR, f"{apk_sha256}-{keystore}-{version}.apk")
+
+def prune_signed_cache(max_bytes=None, keep=()):
+    # Drops the least recently used signed APKs until the cache fits in max_bytes; returns (files, bytes) freed
+    max_bytes = SIGNED_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    if os.path.isdir(SIGNED_CACHE_DIR):
+        for name in os.listdir(SIGNED_CACHE_DIR):
+            path = os.path.join(SIGNED_CACHE_DIR, name)
+            if not name.endswith(".apk") or not os.path.isfile(path):
+                continue
+            # Batch workers share the cache and prune it concurrently, an entry can vanish at any point
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    removed = freed = 0
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        if path in keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            total -= size  # another worker evicted it
+            continue
+        total -= size
+        removed += 1
+        freed += size
+    return removed, freed
+
+def sign_group(signer_path, group_dir):
+    try:
+        # Absolute path: the warm tool host cannot change its working directory
+        run_java_tool(signer_path, ["-a", group_dir, "--allowResign"])
+        return True
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"[!] Signing failed in {os.path.basename(group_dir)}: {e}")
+        return False
 
 def sign_Apk():
     print("\n[+] Preparing APKs for bulk signing...")
 
-    dependencies_dir = os.path.join(APK_PATCH_DIR, "dependencies")
     signer_path = os.path.join(dependencies_dir, "ubersigner.jar")
     signed_dir = os.path.join(APK_PATCH_DIR, "signed")
     shutil.rmtree(signed_dir, ignore_errors=True)  # delete the folder if it exists
@@ -550,63 +1549,407 @@ def sign_Apk():
     # Create the signed output directory
     os.makedirs(signed_dir, exist_ok=True)
 
-    # Step 1: Move *_patched.apk to signed/
-    patched_apks = [f for f in os.listdir(APK_PATCH_DIR) if f.endswith("_patched.apk")]
-    for patched_file in patched_apks:
-        src = os.path.join(APK_PATCH_DIR, patched_file)
-        dst = os.path.join(signed_dir, patched_file)
-        shutil.move(src, dst)
-        print(f"[→] Moved patched APK: {patched_file} → signed/")
-
-     # Step 2: Copy other APKs (excluding base.apk and *_patched.apk)
-    other_apks = [
-        f for f in os.listdir(APK_PATCH_DIR)
-        if f.endswith(".apk") and not f.lower().startswith("base") and not f.endswith("_patched.apk")
-    ]
-    for apk in other_apks:
-        src = os.path.join(APK_PATCH_DIR, apk)
-        dst = os.path.join(signed_dir, apk)
-        shutil.copy2(src, dst)
-        print(f"[+] Copied APK: {apk} → signed/")
-
-    # Step 3: Rename *_patched.apk to base.apk
-    for f in os.listdir(signed_dir):
+    # *_patched.apk is signed as base.apk, every other APK (excluding base.apk) under its own name
+    inputs = {}
+    for f in sorted(os.listdir(APK_PATCH_DIR)):
         if f.endswith("_patched.apk"):
-            old_path = os.path.join(signed_dir, f)
-            new_path = os.path.join(signed_dir, "base.apk")
-            os.rename(old_path, new_path)
-            print(f"[✎] Renamed: {f} → base.apk")
+            inputs["base.apk"] = os.path.join(APK_PATCH_DIR, f)
+            print(f"[✎] Signing patched APK as base.apk: {f}")
+        elif f.endswith(".apk") and not f.lower().startswith("base"):
+            inputs[f] = os.path.join(APK_PATCH_DIR, f)
+
+    # An APK signed before with the same keystore and signer is linked in instead of signed again
+    keystore = keystore_fingerprint()
+    version = signer_version(signer_path)
+    with ThreadPoolExecutor(max_workers=SIGN_WORKERS) as pool:
+        hashes = dict(zip(inputs, pool.map(file_sha256, inputs.values())))
+    cache_paths = {name: signed_cache_path(hashes[name], keystore, version) for name in inputs}
+    os.makedirs(SIGNED_CACHE_DIR, exist_ok=True)
+
+    to_sign = []
+    for name, cache_path in cache_paths.items():
+        if not os.path.isfile(cache_path):
+            to_sign.append(name)
+            continue
+        output_name = name[:-len(".apk")] + SIGNED_SUFFIX
+        method = stage_file(cache_path, os.path.join(signed_dir, output_name), track=False)
+        os.utime(cache_path)  # most recently used
+        print(f"[✓] Reused signed APK ({method}): {output_name}")
+
+    # The rest is split over a few signer processes, largest APKs first so the groups finish together.
+    # The warm tool host serves one request at a time, so it signs everything in one group.
+    ok = True
+    if to_sign:
+        workers = 1 if USE_TOOL_HOST else max(1, min(SIGN_WORKERS, len(to_sign)))
+        groups = [[] for _ in range(workers)]
+        sizes = [0] * workers
+        for name in sorted(to_sign, key=lambda name: os.path.getsize(inputs[name]), reverse=True):
+            i = sizes.index(min(sizes))
+            groups[i].append(name)
+            sizes[i] += os.path.getsize(inputs[name])
+
+        group_dirs = []
+        for i, group in enumerate(groups):
+            group_dir = os.path.join(signed_dir, f".sign-{i}")
+            os.makedirs(group_dir)
+            for name in group:
+                method = stage_file(inputs[name], os.path.join(group_dir, name), track=False)
+                print(f"[+] Staged APK ({method}): {name} → signed/")
+            group_dirs.append(group_dir)
+
+        print(f"\n[🔐] Signing {len(to_sign)} APK(s) with {workers} signer(s), {len(inputs) - len(to_sign)} reused...")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda group_dir: sign_group(signer_path, group_dir), group_dirs))
+
+        for group, group_dir, signed in zip(groups, group_dirs, results):
+            for name in group:
+                output_name = name[:-len(".apk")] + SIGNED_SUFFIX
+                output_path = os.path.join(group_dir, output_name)
+                if not signed or not os.path.isfile(output_path):
+                    ok = False
+                    continue
+                os.replace(output_path, os.path.join(signed_dir, output_name))
+                stage_file(os.path.join(signed_dir, output_name), cache_paths[name], track=False)
+            # Only the signer's .idsig files and the unsigned inputs are left behind
+            shutil.rmtree(group_dir, ignore_errors=True)
 
-    # Step 4: Sign all APKs in signed/
-    print("\n[🔐] Signing all APKs in 'signed' folder...")
-    try:
-        subprocess.run(
-            ["java", "-jar", signer_path, "-a", "signed", "--allowResign"],
-            cwd=APK_PATCH_DIR,
-            check=True,
-            creationflags=subprocess.CREATE_NO_WINDOW
-        )
-    except subprocess.CalledProcessError as e:
+    if not ok:
         print("[!] Signing failed.")
         return
-    
-    # Cleanup: Delete all .idsig files
-    idsig_files = [f for f in os.listdir(signed_dir) if f.endswith(".idsig")]
-    for f in idsig_files:
-        os.remove(os.path.join(signed_dir, f))
-        print(f"[🗑] Deleted .idsig: {f}")
-
-    # Step 6: Delete every .apk in signed that doesn't contain 'debugSigned'
-    non_signed_apks = [
-        f for f in os.listdir(signed_dir)
-        if f.endswith(".apk") and "debugSigned" not in f
-    ]
-    for f in non_signed_apks:
-        os.remove(os.path.join(signed_dir, f))
-        print(f"[🗑] Deleted unsigned APK: {f}")
+
+    # The patched APK is consumed by signing, as before
+    for name, path in inputs.items():
+        if path.endswith("_patched.apk"):
+            os.remove(path)
+
+    removed, freed = prune_signed_cache(keep=set(cache_paths.values()))
+    if removed:
+        print(f"[🗑] Evicted {removed} cached signed APK(s), freed {format_size(freed)}")
 
     print("\n[+] All APKs signed successfully and saved to:")
     print(f"    {signed_dir}")
+    return signed_dir
+
+# ---------- Direct ZIP patching ----------
+def zip_dos_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+def zip_alignment(name, compress_type):
+    if compress_type != zipfile.ZIP_STORED:
+        return 1
+    return ZIP_SO_ALIGNMENT if name.endswith(b".so") else ZIP_STORED_ALIGNMENT
+
+def zip_alignment_extra(offset, name_len, alignment):
+    # Android's alignment extra field (0xd935) pads the local header so the data starts on a boundary
+    if alignment <= 1:
+        return b""
+    pad = -(offset + 30 + name_len + 6) % alignment
+    return struct.pack("<HHH", 0xD935, 2 + pad, alignment) + b"\0" * pad
+
+def zip_check_size(*values):
+    if any(value > 0xFFFFFFFF for value in values):
+        raise ValueError("APK too large for ZIP patching (needs zip64), use unpack/pack instead")
+
+def write_zip_local_header(out, entry, extra):
+    out.write(struct.pack(
+        "<4s2B4HL2L2H", b"PK\x03\x04", entry["extract_version"], 0, entry["flag_bits"], entry["compress_type"],
+        entry["dos_time"], entry["dos_date"], entry["crc"], entry["compress_size"], entry["file_size"],
+        len(entry["name"]), len(extra),
+    ))
+    out.write(entry["name"])
+    out.write(extra)
+
+def zip_entry_from_info(info):
+    # Central directory fields of an existing entry, as write_zip_* expect them
+    dos_time, dos_date = zip_dos_time(info.date_time)
+    return {
+        "name": info.filename.encode("utf-8" if info.flag_bits & 0x800 else "cp437"),
+        "create_version": info.create_version, "create_system": info.create_system,
+        "extract_version": info.extract_version, "flag_bits": info.flag_bits & ~0x8,
+        "compress_type": info.compress_type, "dos_time": dos_time, "dos_date": dos_date,
+        "crc": info.CRC, "compress_size": info.compress_size, "file_size": info.file_size,
+        "internal_attr": info.internal_attr, "external_attr": info.external_attr, "comment": info.comment,
+    }
+
+def seek_zip_data(src, info):
+    # Positions src at the entry's compressed bytes, returns the name exactly as the local header stores it
+    src.seek(info.header_offset)
+    header = src.read(30)
+    if header[:4] != b"PK\x03\x04":
+        raise zipfile.BadZipFile(f"Bad local header for {info.filename}")
+    name_len, extra_len = struct.unpack("<HH", header[26:30])
+    name = src.read(name_len)
+    src.seek(extra_len, os.SEEK_CUR)
+    return name
+
+def copy_zip_entry(src, out, info, entry):
+    # Raw copy: the compressed bytes are moved as they are, only the local header is written anew
+    entry["name"] = seek_zip_data(src, info)
+    entry["offset"] = out.tell()
+    zip_check_size(entry["offset"])
+    write_zip_local_header(out, entry, zip_alignment_extra(entry["offset"], len(entry["name"]), zip_alignment(entry["name"], entry["compress_type"])))
+    remaining = info.compress_size
+    while remaining:
+        chunk = src.read(min(ZIP_COPY_CHUNK, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated entry {info.filename}")
+        out.write(chunk)
+        remaining -= len(chunk)
+
+def write_zip_entry(out, entry, file_path):
+    # Header first with placeholder sizes, data streamed through zlib, then crc/sizes patched in place
+    entry.update(offset=out.tell(), crc=0, compress_size=0, file_size=0)
+    zip_check_size(entry["offset"])
+    write_zip_local_header(out, entry, zip_alignment_extra(entry["offset"], len(entry["name"]), zip_alignment(entry["name"], entry["compress_type"])))
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15) if entry["compress_type"] == zipfile.ZIP_DEFLATED else None
+    crc = file_size = compress_size = 0
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(ZIP_COPY_CHUNK), b""):
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            if compressor:
+                chunk = compressor.compress(chunk)
+            out.write(chunk)
+            compress_size += len(chunk)
+    if compressor:
+        tail = compressor.flush()
+        out.write(tail)
+        compress_size += len(tail)
+    zip_check_size(file_size, compress_size, out.tell())
+    end = out.tell()
+    out.seek(entry["offset"] + 14)
+    out.write(struct.pack("<3L", crc, compress_size, file_size))
+    out.seek(end)
+    entry.update(crc=crc, compress_size=compress_size, file_size=file_size)
+
+def write_zip_central_directory(out, entries):
+    start = out.tell()
+    for entry in entries:
+        out.write(struct.pack(
+            "<4s4B4HL2L5H2L", b"PK\x01\x02", entry["create_version"], entry["create_system"], entry["extract_version"], 0,
+            entry["flag_bits"], entry["compress_type"], entry["dos_time"], entry["dos_date"], entry["crc"],
+            entry["compress_size"], entry["file_size"], len(entry["name"]), 0, len(entry["comment"]), 0,
+            entry["internal_attr"], entry["external_attr"], entry["offset"],
+        ))
+        out.write(entry["name"])
+        out.write(entry["comment"])
+    size = out.tell() - start
+    zip_check_size(start, size)
+    if len(entries) > 0xFFFF:
+        raise ValueError("APK has too many entries for ZIP patching (needs zip64), use unpack/pack instead")
+    out.write(struct.pack("<4s4H2LH", b"PK\x05\x06", 0, 0, len(entries), len(entries), size, start, 0))
+
+def zip_patch_apk(apk_path, replacements=None, removals=(), output_path=None):
+    # Rewrites only the replaced/removed entries; every other entry keeps its compressed bytes, method and alignment.
+    # replacements: {entry name: local file}, unknown names are appended; removals: entry names or globs.
+    # The old v1 signature files are dropped and the signing block goes with the old central directory,
+    # so the result is unsigned and ready for sign_Apk.
+    replacements = {name.replace("\\", "/").lstrip("/"): path for name, path in (replacements or {}).items()}
+    for name, path in replacements.items():
+        if not os.path.isfile(path):
+            raise ValueError(f"Replacement for {name} not found: {path}")
+    if output_path is None:
+        output_path = os.path.join(APK_PATCH_DIR, f"{os.path.splitext(os.path.basename(apk_path))[0]}_patched.apk")
+
+    print(f"\n[+] Patching {os.path.basename(apk_path)} at ZIP level...")
+    started = time.perf_counter()
+    counts = {"copied": 0, "replaced": 0, "added": 0, "removed": 0}
+    entries = []
+    fd, temp_path = tempfile.mkstemp(prefix=".zip_patch.", suffix=".tmp", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        with zipfile.ZipFile(apk_path) as apk, open(apk_path, "rb") as src, os.fdopen(fd, "wb") as out:
+            for info in apk.infolist():
+                name = info.filename
+                if info.flag_bits & 0x1:
+                    raise ValueError(f"Encrypted entry {name} cannot be patched")
+                if name not in replacements and (
+                    V1_SIGNATURE_FILE.match(name) or any(fnmatch.fnmatchcase(name, glob) for glob in removals)
+                ):
+                    counts["removed"] += 1
+                    continue
+                entry = zip_entry_from_info(info)
+                if name in replacements:
+                    if entry["compress_type"] not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                        entry["compress_type"] = zipfile.ZIP_DEFLATED
+                    entry["flag_bits"] &= 0x800  # the old deflate level hints no longer apply
+                    write_zip_entry(out, entry, replacements.pop(name))
+                    counts["replaced"] += 1
+                else:
+                    copy_zip_entry(src, out, info, entry)
+                    counts["copied"] += 1
+                entries.append(entry)
+
+            for name, path in replacements.items():
+                ext = os.path.splitext(name)[1].lower()
+                entry = {
+                    "name": name.encode("utf-8"), "create_version": 20, "create_system": 0, "extract_version": 20,
+                    "flag_bits": 0 if name.isascii() else 0x800,
+                    "compress_type": zipfile.ZIP_STORED if ext in ZIP_STORE_EXTENSIONS else zipfile.ZIP_DEFLATED,
+                    "internal_attr": 0, "external_attr": 0, "comment": b"",
+                }
+                entry["dos_time"], entry["dos_date"] = zip_dos_time(time.localtime()[:6])
+                write_zip_entry(out, entry, path)
+                counts["added"] += 1
+                entries.append(entry)
+
+            write_zip_central_directory(out, entries)
+        shutil.copymode(apk_path, temp_path)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+    print(f"[+] {counts['copied']} entries copied as-is, {counts['replaced']} replaced, {counts['added']} added, "
+          f"{counts['removed']} removed in {time.perf_counter() - started:.2f}s")
+    print(f"[+] Patched APK written to:\n    {output_path}")
+    return output_path
+
+def write_zip_bytes(out, entry, payload):
+    # Entry whose crc and sizes are already known (align_apk results)
+    entry["offset"] = out.tell()
+    zip_check_size(entry["offset"], entry["compress_size"], entry["file_size"])
+    write_zip_local_header(out, entry, zip_alignment_extra(entry["offset"], len(entry["name"]), zip_alignment(entry["name"], entry["compress_type"])))
+    out.write(payload)
+
+def transcode_zip_entry(raw, compress_type, target_type, level):
+    # Thread pool worker: returns the payload for target_type; inflating and deflating both release the GIL
+    data = zlib.decompress(raw, -15) if compress_type == zipfile.ZIP_DEFLATED else raw
+    if target_type == zipfile.ZIP_STORED:
+        return data
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+def align_apk(apk_path, output_path=None, recompress_level=None, workers=None):
+    # zipalign in Python: stored entries start on 4 bytes (.so on 4096), deflated media is stored instead.
+    # recompress_level (1-9) also re-deflates every other compressed entry. Entries keep their order; big
+    # ones are transcoded in a thread pool while the writer streams the rest, with a bounded window in flight.
+    output_path = output_path or apk_path
+    workers = workers or ALIGN_WORKERS
+    print(f"\n[+] Aligning {os.path.basename(apk_path)}...")
+    started = time.perf_counter()
+    counts = {"copied": 0, "stored": 0, "recompressed": 0}
+    entries = []
+    pending = deque()  # (entry, future or None for a raw copy, info)
+    in_flight = 0
+
+    def write_head():
+        nonlocal in_flight
+        entry, future, info = pending.popleft()
+        if future is None:
+            copy_zip_entry(src, out, info, entry)
+            counts["copied"] += 1
+        else:
+            payload = future.result()
+            in_flight -= entry["file_size"]
+            entry["compress_size"] = len(payload)
+            write_zip_bytes(out, entry, payload)
+            counts["stored" if entry["compress_type"] == zipfile.ZIP_STORED else "recompressed"] += 1
+        entries.append(entry)
+
+    fd, temp_path = tempfile.mkstemp(prefix=".align.", suffix=".tmp", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        with zipfile.ZipFile(apk_path) as apk, open(apk_path, "rb") as src, os.fdopen(fd, "wb") as out, \
+                ThreadPoolExecutor(max_workers=workers) as pool:
+            for info in apk.infolist():
+                entry = zip_entry_from_info(info)
+                ext = os.path.splitext(info.filename)[1].lower()
+                target = None
+                if info.compress_type == zipfile.ZIP_DEFLATED:
+                    if ext in MEDIA_EXTENSIONS:
+                        target = zipfile.ZIP_STORED
+                    elif recompress_level is not None:
+                        target = zipfile.ZIP_DEFLATED
+
+                if target is None:
+                    pending.append((entry, None, info))
+                else:
+                    entry["name"] = seek_zip_data(src, info)
+                    raw = src.read(info.compress_size)
+                    entry["compress_type"] = target
+                    entry["flag_bits"] &= 0x800  # level hints no longer apply
+                    if info.file_size >= ALIGN_PARALLEL_MIN_SIZE and workers > 1:
+                        future = pool.submit(transcode_zip_entry, raw, info.compress_type, target, recompress_level or 6)
+                    else:
+                        future = Future()
+                        future.set_result(transcode_zip_entry(raw, info.compress_type, target, recompress_level or 6))
+                    pending.append((entry, future, info))
+                    in_flight += info.file_size
+
+                # Raw copies at the head go out right away; transcoded ones once the window is full
+                while pending and (pending[0][1] is None or pending[0][1].done() or in_flight > ALIGN_WINDOW_BYTES):
+                    write_head()
+            while pending:
+                write_head()
+            write_zip_central_directory(out, entries)
+        shutil.copymode(apk_path, temp_path)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+    print(f"[+] {counts['copied']} entries aligned as-is, {counts['stored']} media entries stored, "
+          f"{counts['recompressed']} recompressed in {time.perf_counter() - started:.2f}s")
+    return output_path
+
+def add_do_not_compress(unpack_dir, extensions):
+    # Lists media extensions under doNotCompress in apktool.yml, so apktool b stores them instead of deflating
+    yml_path = os.path.join(unpack_dir, "apktool.yml")
+    if not os.path.exists(yml_path):
+        return
+    with open(yml_path, "r", encoding="utf-8", newline="") as f:
+        lines = f.read().split("\n")
+    wanted = [ext.lstrip(".") for ext in sorted(extensions)]
+    if "doNotCompress:" in lines:
+        start = end = lines.index("doNotCompress:") + 1
+        while end < len(lines) and lines[end].startswith("- "):
+            end += 1
+        listed = {line[2:].strip() for line in lines[start:end]}
+        lines[end:end] = [f"- {ext}" for ext in wanted if ext not in listed]
+    else:
+        if lines and lines[-1] == "":
+            lines.pop()
+        lines += ["doNotCompress:"] + [f"- {ext}" for ext in wanted] + [""]
+    atomic_write(yml_path, "\n".join(lines))
+
+def parse_zip_replacements(pairs):
+    # "assets/x.bin=C:/mods/x.bin" -> {"assets/x.bin": "C:/mods/x.bin"}
+    replacements = {}
+    for pair in pairs:
+        name, sep, path = pair.partition("=")
+        if not sep or not name.strip() or not path.strip():
+            raise ValueError(f"Expected ENTRY=FILE, got: {pair}")
+        replacements[name.strip()] = path.strip().strip('"')
+    return replacements
+
+def zip_patch_menu():
+    apk_path = os.path.join(APK_PATCH_DIR, "base.apk")
+    if not os.path.exists(apk_path):
+        print("\n[!] base.apk not found. Select/Import an APK first.")
+        return
+    print("\nEnter replacements as ENTRY=FILE, e.g. assets/config.json=C:\\mods\\config.json (empty line to finish):")
+    pairs = []
+    while True:
+        line = input("  > ").strip()
+        if not line:
+            break
+        pairs.append(line)
+    removals = [g.strip() for g in input("Entries to remove (comma separated names/globs, Enter for none): ").split(",") if g.strip()]
+    if not pairs and not removals:
+        print("[!] Nothing to do.")
+        return
+    try:
+        zip_patch_apk(apk_path, parse_zip_replacements(pairs), removals)
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        print(f"[!] ZIP patch failed: {e}")
+        return
+    print("    → Use option 5 to sign it.")
 
 def install_Apk():
     print("\n[+] Installing APK(s) to device...")
@@ -639,7 +1982,7 @@ def install_Apk():
                 check=True,
                 capture_output=True,
                 text=True, 
-                creationflags=subprocess.CREATE_NO_WINDOW
+                creationflags=NO_WINDOW
             )
             print(f"[+] Install Success:\n{result.stdout}")
         else:
@@ -649,15 +1992,18 @@ def install_Apk():
                 check=True,
                 capture_output=True,
                 text=True, 
-                creationflags=subprocess.CREATE_NO_WINDOW
+                creationflags=NO_WINDOW
             )
             print(f"[+] Install Success:\n{result.stdout}")
     except subprocess.CalledProcessError as e:
         print(f"[!] Install Failed:\n{e.stderr}")
 
-def clear_old_apk_files():
-    print("\n[?] Do you want to clear all old APK files and folders except 'dependencies'?")
-    choice = input("    (y/N): ").strip().lower()
+def clear_old_apk_files(ask=True, keep=()):
+    if ask:
+        print("\n[?] Do you want to clear all old APK files and folders except 'dependencies' and 'cache'?")
+        choice = input("    (y/N): ").strip().lower()
+    else:
+        choice = 'y'
 
     if choice != 'y':
         print("[-] Skipping cleanup.")
@@ -665,14 +2011,18 @@ def clear_old_apk_files():
 
     print("[!] Cleaning up old APK files...")
 
+    staged_links = load_staged_links()  # read up front, the registry itself is cleared too
     for item in os.listdir(APK_PATCH_DIR):
         item_path = os.path.join(APK_PATCH_DIR, item)
 
-        if item == "dependencies":
-            continue  # skip the dependencies folder
+        if item in ("dependencies", "cache") or item in keep:
+            continue  # skip the dependencies and cache folders
 
         try:
-            if os.path.isdir(item_path):
+            if os.path.isfile(item_path) and staged_link_source(item_path, staged_links):
+                os.remove(item_path)  # only the link goes, the original keeps its data
+                print(f"[🗑] Unlinked staged file: {item} (original untouched)")
+            elif os.path.isdir(item_path):
                 shutil.rmtree(item_path)
                 print(f"[🗑] Deleted folder: {item}")
             else:
@@ -681,83 +2031,795 @@ def clear_old_apk_files():
         except Exception as e:
             print(f"[!] Error deleting {item}: {e}")
 
-    print("[+] Cleanup complete. Only 'dependencies' folder remains.")
+    clear_search_cache()
+    kept = [item for item in keep if os.path.exists(os.path.join(APK_PATCH_DIR, item))]
+    if kept:
+        print(f"[+] Cleanup complete. Kept 'dependencies', 'cache' and: {', '.join(kept)}")
+    else:
+        print("[+] Cleanup complete. Only 'dependencies' and 'cache' folders remain.")
+    return True
+
+class KeywordMatcher:
+    # Aho-Corasick automaton over every distinct word of every keyword, built once per query.
+    # A keyword matches a line when all of its words appear in it; the first matching keyword wins.
+    # With split_words=False each keyword is treated as a single phrase (plain "kw in line").
+
+    def __init__(self, keywords, split_words=True):
+        self.keywords = list(keywords)
+        word_ids = {}
+        self.keyword_words = []
+        for keyword in self.keywords:
+            words = keyword.split() if split_words else [keyword]
+            self.keyword_words.append(tuple({word_ids.setdefault(w, len(word_ids)) for w in words if w}))
+        self.words = list(word_ids)
+
+        # Trie of all words
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+        for word_id, word in enumerate(self.words):
+            state = 0
+            for ch in word:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                    self.goto[state][ch] = nxt
+                state = nxt
+            self.output[state] += (word_id,)
+
+        # Failure links (breadth first so shorter suffixes are resolved first)
+        pending = deque(self.goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for ch, nxt in self.goto[state].items():
+                pending.append(nxt)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(ch, 0)
+                self.output[nxt] += self.output[self.fail[nxt]]
+
+        # Resolve failure links ahead of time so scanning is one dict lookup per character
+        alphabet = set("".join(self.words))
+        self.delta = [None] * len(self.goto)
+        self.delta[0] = dict(self.goto[0])
+        pending = deque(self.goto[0].values())
+        while pending:
+            state = pending.popleft()
+            inherited = self.delta[self.fail[state]]
+            self.delta[state] = {ch: self.goto[state].get(ch, inherited.get(ch, 0)) for ch in alphabet}
+            pending.extend(self.goto[state].values())
+
+        # Lines without any word never reach the automaton, re finds that in C
+        if self.words:
+            self.prefilter = re.compile("|".join(re.escape(w) for w in sorted(self.words, key=len, reverse=True)))
+        else:
+            self.prefilter = None
+
+        # ASCII-only queries can run on raw lowercased bytes, others fall back to decoded text
+        self.byte_words = None
+        self.byte_prefilter = None
+        if self.words and all(w.isascii() for w in self.words):
+            self.byte_words = [w.encode("ascii") for w in self.words]
+            self.byte_prefilter = re.compile(b"|".join(re.escape(w) for w in sorted(self.byte_words, key=len, reverse=True)))
+
+    def could_match(self, text):
+        # One C substring scan per word rejects a buffer faster than the regex alternation
+        return any(word in text for word in self.words)
+
+    def could_match_bytes(self, lower_buf):
+        return any(word in lower_buf for word in self.byte_words)
+
+    def find_words(self, text):
+        found = set()
+        delta, output = self.delta, self.output
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+    def first_match(self, lower_line):
+        if not self.could_match(lower_line):
+            return None
+        found = self.find_words(lower_line)
+        for keyword, word_ids in zip(self.keywords, self.keyword_words):
+            if word_ids and all(word_id in found for word_id in word_ids):
+                return keyword
+        return None
+
+    def iter_line_matches(self, lower_text):
+        # Yields (line_num, keyword) for a whole lowercased buffer, only visiting lines with a word hit
+        return self._iter_hit_lines(lower_text, self.prefilter, "\n", None)
+
+    def iter_buffer_matches(self, lower_buf):
+        # Same as iter_line_matches for lowercased bytes, hit lines are decoded as latin-1 (ASCII words are unaffected)
+        return self._iter_hit_lines(lower_buf, self.byte_prefilter, b"\n", "latin-1")
+
+    def _iter_hit_lines(self, buf, prefilter, newline, encoding):
+        if prefilter is None:
+            return
+        line_num = 1
+        counted_upto = 0
+        pos = 0
+        while True:
+            hit = prefilter.search(buf, pos)
+            if hit is None:
+                return
+            line_start = buf.rfind(newline, 0, hit.start()) + 1
+            line_end = buf.find(newline, hit.start())
+            if line_end == -1:
+                line_end = len(buf)
+            # Line numbers are only counted up to the lines that actually hit
+            line_num += buf.count(newline, counted_upto, line_start)
+            counted_upto = line_start
+            line = buf[line_start:line_end]
+            keyword = self.first_match(line.decode(encoding) if encoding else line)
+            if keyword is not None:
+                yield line_num, keyword
+            pos = line_end + 1
+
+def shift_group_references(pattern, offset):
+    # Renumbers the \N backreferences and (?(N)...) conditionals of a pattern whose groups now start at offset + 1.
+    # Inside [...] and as three octal digits a backslash-digit is a character, not a reference, and stays.
+    out = []
+    i = 0
+    in_class = False
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\" and i + 1 < len(pattern):
+            digits = re.match(r"[1-9]\d{0,2}", pattern[i + 1:])
+            if in_class or digits is None or (len(digits.group()) == 3 and set(digits.group()) <= set("01234567")):
+                out.append(pattern[i:i + 2])
+                i += 2
+                continue
+            number = int(digits.group()[:2]) + offset
+            if number > 99:
+                raise re.error(f"backreference \\{digits.group()[:2]} in {pattern!r}: too many groups across the patterns "
+                               f"to search them together, search this pattern on its own")
+            out.append(f"(?:\\{number})")  # a literal digit right after it stays a digit
+            i += 1 + len(digits.group()[:2])
+            continue
+        if in_class:
+            in_class = c != "]"
+        elif c == "[":
+            # A ] right after [ or [^ is a literal
+            end = i + 1 + (pattern[i + 1:i + 2] == "^")
+            end += pattern[end:end + 1] == "]"
+            out.append(pattern[i:end])
+            i = end
+            in_class = True
+            continue
+        else:
+            conditional = re.match(r"\(\?\((\d+)\)", pattern[i:])
+            if conditional:
+                out.append(f"(?({int(conditional.group(1)) + offset})")
+                i += conditional.end()
+                continue
+        out.append(c)
+        i += 1
+    return "".join(out)
+
+class RegexMatcher:
+    # All patterns merged into one compiled alternation with a named group per pattern, so one pass
+    # over a file replaces one scan per pattern. Each line reports the pattern of its leftmost hit.
+    # Patterns run in MULTILINE mode over whole files, so ^ and $ anchor at every line; numbered
+    # backreferences are shifted to the merged group numbers. Plain keywords (regex=False) keep the
+    # KeywordMatcher rule that every word appears somewhere in the line; whole_token only matches
+    # complete smali identifiers. Exposes the same scanning interface as KeywordMatcher (text path only).
+
+    byte_words = None
+
+    def __init__(self, patterns, regex=True, whole_token=False):
+        self.keywords = list(patterns)
+        self.group_names = []
+        parts = []
+        groups = 0
+        for i, pattern in enumerate(self.keywords):
+            if regex:
+                user_groups = re.compile(pattern).groups  # raise re.error naming the offending pattern, not the merged one
+                pattern = shift_group_references(pattern, groups + 1)
+                words = [pattern]
+            else:
+                user_groups = 0
+                words = [re.escape(word) for word in pattern.split()] or [""]
+            if whole_token:
+                words = [f"(?<!{SMALI_TOKEN_CHARS})(?:{word})(?!{SMALI_TOKEN_CHARS})" for word in words]
+            if len(words) > 1:
+                # Every word anywhere in the line: one lookahead per word, from the start of the line
+                pattern = "^" + "".join(f"(?=[^\n]*?{word})" for word in words)
+            else:
+                pattern = words[0]
+            name = f"pattern{i}"
+            self.group_names.append(name)
+            parts.append(f"(?P<{name}>{pattern})")
+            groups += 1 + user_groups
+        self.combined = re.compile("|".join(parts), re.IGNORECASE | re.MULTILINE)
+
+    def could_match(self, text):
+        return self.combined.search(text) is not None
+
+    def first_match(self, lower_line):
+        hit = self.combined.search(lower_line)
+        return self._pattern_of(hit) if hit else None
+
+    def iter_line_matches(self, lower_text):
+        pos = 0
+        line_num = 1
+        counted_upto = 0
+        while True:
+            hit = self.combined.search(lower_text, pos)
+            if hit is None:
+                return
+            line_start = lower_text.rfind("\n", 0, hit.start()) + 1
+            line_num += lower_text.count("\n", counted_upto, line_start)
+            counted_upto = line_start
+            yield line_num, self._pattern_of(hit)
+            # One result per line, continue on the next one
+            line_end = lower_text.find("\n", hit.start())
+            if line_end == -1:
+                return
+            pos = line_end + 1
+
+    def _pattern_of(self, hit):
+        for name, pattern in zip(self.group_names, self.keywords):
+            if hit.group(name) is not None:
+                return pattern
+        return None
+
+def byte_scan_safe(buf):
+    # The byte path gives the text path's answer only on ASCII with \n or \r\n line ends: the text path
+    # also breaks lines on a lone \r, drops invalid UTF-8 and lowercases non-ASCII letters (some to ASCII)
+    return buf.isascii() and (b"\r" not in buf or buf.count(b"\r") == buf.count(b"\r\n"))
+
+def scan_file_bytes(file_path, matcher, max_hits=None):
+    # Returns the hits, or None when the file needs the text path (see byte_scan_safe)
+    hits = []
+    try:
+        with open(file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < MMAP_MIN_SIZE:
+                data = f.read()
+                if not byte_scan_safe(data):
+                    return None
+                lower_buf = data.lower()
+                if matcher.could_match_bytes(lower_buf):
+                    hits.extend(islice(matcher.iter_buffer_matches(lower_buf), max_hits))
+                return hits
+
+            # Big files are mapped and lowercased one newline-aligned window at a time
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                start = 0
+                lines_before = 0
+                counted_upto = 0
+                while start < size and (max_hits is None or len(hits) < max_hits):
+                    end = buf.find(b"\n", min(start + MMAP_WINDOW_SIZE, size))
+                    end = size if end == -1 else end + 1
+                    window = buf[start:end]
+                    if not byte_scan_safe(window):
+                        return None
+                    lower_window = window.lower()
+                    if matcher.could_match_bytes(lower_window):
+                        lines_before += buf[counted_upto:start].count(b"\n")
+                        counted_upto = start
+                        window_hits = matcher.iter_buffer_matches(lower_window)
+                        if max_hits is not None:
+                            window_hits = islice(window_hits, max_hits - len(hits))
+                        hits.extend((lines_before + line_num, keyword) for line_num, keyword in window_hits)
+                    start = end
+    except Exception:
+        pass  # Ignore unreadable files
+    return hits
+
+def scan_file_for_keywords(file_path, matcher, max_hits=None):
+    # Returns (line_num, keyword) for every line where all words of a keyword appear, up to max_hits
+    if USE_BYTE_SEARCH and matcher.byte_words:
+        hits = scan_file_bytes(file_path, matcher, max_hits)
+        if hits is not None:
+            return hits
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            lower_text = f.read().lower()
+    except Exception:
+        return []  # Ignore unreadable files
+    if not matcher.could_match(lower_text):
+        return []
+    return list(islice(matcher.iter_line_matches(lower_text), max_hits))
+
+def search_shard(file_paths, matcher, max_hits=None):
+    return [scan_file_for_keywords(file_path, matcher, max_hits) for file_path in file_paths]
+
+def split_into_shards(items, shard_count, weights=None):
+    if weights is None:
+        shard_size = max(1, -(-len(items) // max(1, shard_count)))
+        return [items[i:i + shard_size] for i in range(0, len(items), shard_size)]
+
+    # Balance shards by weight (file size) so one shard of huge files does not hold up the rest
+    target = max(1, sum(weights) / max(1, shard_count))
+    shards = []
+    current = []
+    current_weight = 0
+    for item, weight in zip(items, weights):
+        current.append(item)
+        current_weight += weight
+        if current_weight >= target:
+            shards.append(current)
+            current = []
+            current_weight = 0
+    if current:
+        shards.append(current)
+    return shards
+
+def iter_file_hits(file_paths, matcher, workers=1, progress_callback=None, max_hits_per_file=None, file_sizes=None):
+    # Yields (file_index, hits) in the same order as file_paths, whatever the worker count.
+    # Closing the generator early cancels shards that have not started yet.
+    total_files = len(file_paths)
+
+    def report_progress(done):
+        percent = int((done / total_files) * 100)
+        sys.stdout.write(f"\rProgress: {percent}%")
+        sys.stdout.flush()
+        if progress_callback:
+            progress_callback(percent)
+
+    if workers <= 1:
+        for idx, file_path in enumerate(file_paths):
+            yield idx, scan_file_for_keywords(file_path, matcher, max_hits_per_file)
+            report_progress(idx + 1)
+        return
 
-def search(selected_types=None, progress_callback=None, as_json=False):
-    print("\n=== Keyword Search in Base Folder ===\n")
-    base_folder = os.path.join(APK_PATCH_DIR, "base")
+    shards = split_into_shards(file_paths, workers * SEARCH_SHARDS_PER_WORKER, file_sizes)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(search_shard, shard, matcher, max_hits_per_file) for shard in shards]
+        try:
+            # Shards are consumed in file order so ids stay deterministic and hits stream out early
+            idx = 0
+            done = 0
+            for shard, future in zip(shards, futures):
+                hits_per_file = future.result()
+                done += len(shard)
+                report_progress(done)
+                for hits in hits_per_file:
+                    yield idx, hits
+                    idx += 1
+        finally:
+            for future in futures:
+                future.cancel()
+
+def is_binary_file(file_path):
+    try:
+        with open(file_path, 'rb') as f:
+            return b"\0" in f.read(BINARY_SNIFF_SIZE)
+    except OSError:
+        return True
+
+def iter_text_files(folder, selected_types=None):
+    # Yields (root, file, size) in os.walk order using scandir, so sizes come with the listing.
+    # Known binary extensions are never opened; unknown extensions are sniffed for NUL bytes.
+    suffixes = {ext.lower() for ext in selected_types} if selected_types else None
+    multi_dot_suffixes = tuple(ext for ext in suffixes if ext.count(".") > 1) if suffixes else ()
+    pending = [folder]
+    while pending:
+        current = pending.pop()
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    name = entry.name.lower()
+                    dot = name.rfind(".")
+                    ext = name[dot:] if dot != -1 else ""
+                    if suffixes is not None:
+                        if ext not in suffixes and not (multi_dot_suffixes and name.endswith(multi_dot_suffixes)):
+                            continue
+                    elif ext in BINARY_EXTENSIONS:
+                        continue
+                    size = entry.stat().st_size
+                    if size == 0:
+                        continue
+                    files.append((entry.name, size, ext))
+        except OSError:
+            continue
 
+        for file, size, ext in files:
+            if ext not in TEXT_EXTENSIONS and (suffixes is None or ext not in suffixes) and is_binary_file(os.path.join(current, file)):
+                continue
+            yield current, file, size
+        # Depth first, in listing order, like os.walk(topdown=True)
+        pending.extend(reversed(subdirs))
+
+def scan_tree_stats(folder):
+    # Maps path relative to folder -> (mtime_ns, size); scandir gets the stats for free on Windows
+    stats = {}
+    prefix_len = len(os.path.join(folder, ""))
+    pending = [folder]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file():
+                        st = entry.stat()
+                        stats[entry.path[prefix_len:]] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            continue
+    return stats
+
+def file_trigrams(file_path):
+    # Binary files are never searched, so they are not worth indexing either
+    if os.path.splitext(file_path)[1].lower() in BINARY_EXTENSIONS:
+        return set()
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            lower_text = f.read().lower()
+    except Exception:
+        return set()
+    # Search words never contain whitespace, so only trigrams inside a token are needed
+    trigrams = set()
+    for token in set(lower_text.split()):
+        for i in range(len(token) - 2):
+            trigrams.add(token[i:i + 3])
+    return trigrams
+
+def index_shard(file_paths):
+    return [file_trigrams(file_path) for file_path in file_paths]
+
+def load_search_index(base_folder):
+    global search_index_cache
+    try:
+        mtime = os.stat(SEARCH_INDEX_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+    if search_index_cache and search_index_cache[0] == mtime:
+        index = search_index_cache[1]
+    else:
+        try:
+            with open(SEARCH_INDEX_FILE, "r", encoding="utf-8") as f:
+                index = decode_search_index(json.load(f))
+        except Exception as e:
+            print(f"[!] Search index unreadable, it will be rebuilt: {e}")
+            return None
+        search_index_cache = (mtime, index)
+
+    if index.get("version") != SEARCH_INDEX_VERSION or index.get("root") != base_folder:
+        return None
+    return index
+
+def encode_search_index(index):
+    # Posting lists are stored as the raw bytes of their uint32 arrays, base64 in the JSON
+    return {
+        "version": index["version"], "root": index["root"], "byteorder": sys.byteorder,
+        "files": index["files"], "paths": index["paths"],
+        "postings": {trigram: base64.b64encode(ids.tobytes()).decode("ascii") for trigram, ids in index["postings"].items()},
+    }
+
+def decode_search_index(data):
+    # Anything that does not have the expected shape raises, and the index is rebuilt
+    if data.get("version") != SEARCH_INDEX_VERSION:
+        return {"version": data.get("version")}
+    paths = data["paths"]
+    if not all(path is None or isinstance(path, str) for path in paths):
+        raise ValueError("bad path list")
+    files = {}
+    for rel_path, (file_id, mtime_ns, size) in data["files"].items():
+        if not 0 <= file_id < len(paths) or paths[file_id] != rel_path:
+            raise ValueError(f"bad file entry for {rel_path}")
+        files[rel_path] = (int(file_id), int(mtime_ns), int(size))
+    postings = {}
+    for trigram, encoded in data["postings"].items():
+        ids = array('I')
+        ids.frombytes(base64.b64decode(encoded, validate=True))
+        if data["byteorder"] != sys.byteorder:
+            ids.byteswap()
+        if ids and max(ids) >= len(paths):
+            raise ValueError(f"bad posting list for {trigram!r}")
+        postings[trigram] = ids
+    return {"version": data["version"], "root": data["root"], "files": files, "paths": paths, "postings": postings}
+
+def save_search_index(index):
+    global search_index_cache
+    tmp_path = SEARCH_INDEX_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(encode_search_index(index), f, separators=(",", ":"))
+    os.replace(tmp_path, SEARCH_INDEX_FILE)
+    search_index_cache = (os.stat(SEARCH_INDEX_FILE).st_mtime_ns, index)
+
+def compact_search_index(index):
+    # Drop ids of files that were re-indexed or removed and renumber the rest
+    remap = array('i', [-1]) * len(index["paths"])
+    paths = []
+    for old_id, rel_path in enumerate(index["paths"]):
+        if rel_path is not None:
+            remap[old_id] = len(paths)
+            paths.append(rel_path)
+    postings = {}
+    for trigram, ids in index["postings"].items():
+        kept = array('I', (remap[i] for i in ids if remap[i] >= 0))
+        if kept:
+            postings[trigram] = kept
+    index["paths"] = paths
+    index["postings"] = postings
+    index["files"] = {rel_path: (remap[entry[0]],) + tuple(entry[1:]) for rel_path, entry in index["files"].items()}
+
+def update_search_index(base_folder=None, rebuild=False, workers=None):
+    # Builds the index on first use, afterwards only re-reads files whose mtime or size changed
+    base_folder = base_folder or os.path.join(APK_PATCH_DIR, "base")
     if not os.path.exists(base_folder):
-        print(f"[!] Base folder not found at: {base_folder}")
-        return [] if as_json else None
-    
+        return None
+
+    index = None if rebuild else load_search_index(base_folder)
+    if index is None:
+        index = {"version": SEARCH_INDEX_VERSION, "root": base_folder, "files": {}, "paths": [], "postings": {}}
+
+    stats = scan_tree_stats(base_folder)
+    files = index["files"]
+    changed = [rel_path for rel_path, stat in stats.items() if rel_path not in files or files[rel_path][1:] != stat]
+    removed = [rel_path for rel_path in files if rel_path not in stats]
+    if not changed and not removed:
+        return index
+
+    # Old postings stay in place, their ids are simply retired
+    for rel_path in removed + changed:
+        entry = files.pop(rel_path, None)
+        if entry is not None:
+            index["paths"][entry[0]] = None
+
+    if changed:
+        print(f"[*] Indexing {len(changed)} file(s) for search...")
+    file_paths = [os.path.join(base_folder, rel_path) for rel_path in changed]
+    if workers is None:
+        workers = SEARCH_WORKERS if len(file_paths) >= PARALLEL_SEARCH_MIN_FILES else 1
+    if workers > 1:
+        shards = split_into_shards(file_paths, workers * SEARCH_SHARDS_PER_WORKER)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            trigram_sets = [trigrams for shard in executor.map(index_shard, shards) for trigrams in shard]
+    else:
+        trigram_sets = index_shard(file_paths)
+
+    postings = index["postings"]
+    for rel_path, trigrams in zip(changed, trigram_sets):
+        file_id = len(index["paths"])
+        index["paths"].append(rel_path)
+        files[rel_path] = (file_id,) + stats[rel_path]
+        for trigram in trigrams:
+            ids = postings.get(trigram)
+            if ids is None:
+                postings[trigram] = array('I', [file_id])
+            else:
+                ids.append(file_id)
+
+    retired = len(index["paths"]) - len(files)
+    if retired > len(files):
+        compact_search_index(index)
+
+    try:
+        save_search_index(index)
+    except Exception as e:
+        print(f"[!] Failed to save search index: {e}")
+    return index
+
+def search_index_candidates(index, keywords):
+    # Relative paths that may contain at least one keyword, or None if the index cannot narrow the query
+    postings = index["postings"]
+    candidate_ids = set()
+    for keyword in keywords:
+        trigrams = {word[i:i + 3] for word in keyword.split() for i in range(len(word) - 2)}
+        if not trigrams:
+            return None  # only words shorter than 3 characters
+        ids = None
+        for trigram in sorted(trigrams, key=lambda t: len(postings.get(t, ()))):
+            posting = postings.get(trigram)
+            if not posting:
+                ids = set()
+                break
+            ids = set(posting) if ids is None else ids.intersection(posting)
+            if not ids:
+                break
+        candidate_ids.update(ids)
+    paths = index["paths"]
+    return {paths[i] for i in candidate_ids if paths[i] is not None}
+
+def tree_fingerprint(folder):
+    # Directory mtimes catch added/removed/renamed files, file sizes and mtimes catch in-place edits.
+    # Only metadata is read, scandir returns it with the listing on Windows.
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        pending = [(folder, os.stat(folder).st_mtime_ns)]
+    except OSError:
+        return None
+    while pending:
+        current, mtime_ns = pending.pop()
+        digest.update(f"D|{current}|{mtime_ns}\n".encode("utf-8", "surrogateescape"))
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    st = entry.stat(follow_symlinks=False)
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append((entry.path, st.st_mtime_ns))
+                    else:
+                        digest.update(f"F|{entry.name}|{st.st_size}|{st.st_mtime_ns}\n".encode("utf-8", "surrogateescape"))
+        except OSError:
+            continue
+    return digest.hexdigest()
+
+def clear_search_cache():
+    # Called by every step that edits the base folder, the fingerprint covers outside edits
+    search_cache.clear()
+
+def store_search_results(cache_key, total_files, results):
+    if len(results) > SEARCH_CACHE_MAX_RESULTS:
+        return
+    search_cache[cache_key] = (total_files, tuple(results))
+    search_cache.move_to_end(cache_key)
+    cached_results = sum(len(entry[1]) for entry in search_cache.values())
+    while search_cache and (len(search_cache) > SEARCH_CACHE_MAX_ENTRIES or cached_results > SEARCH_CACHE_MAX_RESULTS):
+        _, (_, evicted) = search_cache.popitem(last=False)
+        cached_results -= len(evicted)
+
+def prompt_search_keywords(regex=False):
+    if regex:
+        # Regex patterns keep their case and their own | alternations
+        patterns_input = input("Enter regex pattern(s) separated by ||: ").strip()
+        if not patterns_input:
+            print("[!] No patterns provided.")
+            return []
+        return [pattern.strip() for pattern in patterns_input.split("||") if pattern.strip()]
+
     keywords_input = input("Enter keyword(s) or sentence(s) separated by |: ").strip()
     if not keywords_input:
         print("[!] No keywords provided.")
-        return [] if as_json else None
-
-    keywords = [' '.join(kw.strip().lower().split()) for kw in keywords_input.split("|") if kw.strip()]
+        return []
+    return [' '.join(kw.strip().lower().split()) for kw in keywords_input.split("|") if kw.strip()]
+
+def iter_search(keywords, selected_types=None, progress_callback=None, workers=None,
+                max_results=None, max_per_file=None, summary=None, regex=False, whole_token=False):
+    # Yields search results (same dicts as search(as_json=True)) as soon as each file is scanned.
+    # summary, when given, receives "total_files" once the file list is known.
+    # regex=True treats keywords as regular expressions, whole_token=True only matches whole identifiers.
+    base_folder = os.path.join(APK_PATCH_DIR, "base")
+    if not os.path.exists(base_folder):
+        print(f"[!] Base folder not found at: {base_folder}")
+        return
 
-    matched_results = []
-    all_files = []
+    if regex or whole_token:
+        try:
+            matcher = RegexMatcher(keywords, regex=regex, whole_token=whole_token)
+        except re.error as e:
+            print(f"[!] Invalid pattern: {e}")
+            return
+    else:
+        matcher = KeywordMatcher(keywords)
+
+    # A repeat query on an unchanged tree is answered from the cache
+    cache_key = (
+        tuple(keywords),
+        tuple(sorted(ext.lower() for ext in selected_types or ())),
+        regex,
+        whole_token,
+        max_results,
+        max_per_file,
+        tree_fingerprint(base_folder),
+    )
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        search_cache.move_to_end(cache_key)
+        total_files, cached_results = cached
+        print(f"[*] Base folder unchanged, returning {len(cached_results)} cached result(s).")
+        if max_results and len(cached_results) >= max_results:
+            print(f"[!] Result limit of {max_results} reached, search stopped early.")
+        if summary is not None:
+            summary["total_files"] = total_files
+        if progress_callback:
+            progress_callback(100)
+        for item in cached_results:
+            yield dict(item)
+        return
 
-    # Gather all files to process
-    for root, _, files in os.walk(base_folder):
-        for file in files:
-            if selected_types:
-                if any(file.lower().endswith(ext) for ext in selected_types):
-                    all_files.append((root, file))
-            else:
-                all_files.append((root, file))
+    # Gather all files to process, binary resources are left out
+    all_files = list(iter_text_files(base_folder, selected_types))
 
     total_files = len(all_files)
     if total_files == 0:
         print("[!] No files found in base folder.")
-        return [] if as_json else None
+        return
+
+    # Narrow the file list with the trigram index when one was built for this base folder.
+    # Regex patterns have no literal words to look up, so they always scan every file.
+    if os.path.exists(SEARCH_INDEX_FILE) and not regex:
+        index = update_search_index(base_folder)
+        candidates = search_index_candidates(index, keywords) if index else None
+        if candidates is not None:
+            prefix_len = len(os.path.join(base_folder, ""))
+            # Binary types are not indexed, they only show up here when explicitly selected
+            all_files = [
+                (root, file, size) for root, file, size in all_files
+                if os.path.join(root, file)[prefix_len:] in candidates
+                or os.path.splitext(file)[1].lower() in BINARY_EXTENSIONS
+            ]
+            print(f"[*] Search index narrowed the scan to {len(all_files)} of {total_files} files.")
+            total_files = len(all_files)
+    if summary is not None:
+        summary["total_files"] = total_files
+
+    # workers=None picks the pool automatically for big trees, workers=1 forces a single core
+    if workers is None:
+        workers = SEARCH_WORKERS if total_files >= PARALLEL_SEARCH_MIN_FILES else 1
+    workers = max(1, min(workers, total_files))
 
     # Start search
-    print("[*] Scanning files...\n")
-    for idx, (root, file) in enumerate(all_files):
-        file_path = os.path.join(root, file)
-        folder_name = os.path.relpath(root, base_folder)
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                for line_num, line in enumerate(f, start=1):
-                    lower_line = line.lower()
-
-                    for keyword in keywords:
-                        words = keyword.split()
-                        if all(word in lower_line for word in words):
-                            if as_json:
-                                matched_results.append({
-                                    "id": len(matched_results) + 1,
-                                    "keyword": keyword,
-                                    "line_num": line_num,
-                                    "file": file,
-                                    "folder": folder_name,
-                                    "path": file_path
-                                })
-                            else:
-                                matched_results.append(
-                                    f"{len(matched_results)+1}. {keyword} found in line {line_num} on {file} under {folder_name}"
-                                )
-                            break  # Stop after first match per line
-        except Exception:
-            pass  # Ignore unreadable files
-
-        # Progress bar update
-        percent = int(((idx + 1) / total_files) * 100)
-        sys.stdout.write(f"\rProgress: {percent}%")
-        sys.stdout.flush()
+    file_sizes = [size for _, _, size in all_files]
+    total_mb = sum(file_sizes) / (1024 * 1024)
+    if workers > 1:
+        print(f"[*] Scanning {total_files} files ({total_mb:.1f} MB) with {workers} worker processes...\n")
+    else:
+        print(f"[*] Scanning {total_files} files ({total_mb:.1f} MB)...\n")
+    file_paths = [os.path.join(root, file) for root, file, _ in all_files]
+    file_hits = iter_file_hits(file_paths, matcher, workers, progress_callback, max_per_file, file_sizes)
+    results = []
+    try:
+        for idx, hits in file_hits:
+            root, file, _ = all_files[idx]
+            folder_name = os.path.relpath(root, base_folder)
+            for line_num, keyword in hits:
+                item = {
+                    "id": len(results) + 1,
+                    "keyword": keyword,
+                    "line_num": line_num,
+                    "file": file,
+                    "folder": folder_name,
+                    "path": file_paths[idx]
+                }
+                results.append(item)
+                yield dict(item)
+                if max_results and len(results) >= max_results:
+                    print(f"\n[!] Result limit of {max_results} reached, search stopped early.")
+                    store_search_results(cache_key, total_files, results)
+                    return
+    finally:
+        file_hits.close()
 
-        # GUI progress
-        if progress_callback:
-            progress_callback(percent)
+    # Only complete runs are cached, a consumer that stops early never gets here
+    store_search_results(cache_key, total_files, results)
+
+def search(selected_types=None, progress_callback=None, as_json=False, workers=None,
+           max_results=None, max_per_file=None, regex=False, whole_token=False, keywords=None):
+    print("\n=== Keyword Search in Base Folder ===\n")
+    base_folder = os.path.join(APK_PATCH_DIR, "base")
+
+    if not os.path.exists(base_folder):
+        print(f"[!] Base folder not found at: {base_folder}")
+        return [] if as_json else None
+    
+    keywords = keywords or prompt_search_keywords(regex)
+    if not keywords:
+        return [] if as_json else None
 
+    summary = {}
+    results = iter_search(keywords, selected_types, progress_callback, workers, max_results, max_per_file, summary,
+                          regex=regex, whole_token=whole_token)
     if as_json:
-        return matched_results
-    else:
-        print("\n\n=== Matches Found ===")
+        return list(results)
+
+    matched_results = [
+        f"{item['id']}. {item['keyword']} found in line {item['line_num']} on {item['file']} under {item['folder']}"
+        for item in results
+    ]
+    if "total_files" not in summary:
+        return None
+
+    print("\n\n=== Matches Found ===")
     if matched_results:
         for match in matched_results:
             print(match)
@@ -766,7 +2828,695 @@ def search(selected_types=None, progress_callback=None, as_json=False):
 
     print("\n[✓] Search complete.")
     print(f"Total folders scanned: {len(next(os.walk(base_folder))[1])}")
-    print(f"Total files scanned: {total_files}")
+    print(f"Total files scanned: {summary['total_files']}")
+
+# ---------- Smali symbol index ----------
+SMALI_CLASS_RE = re.compile(r'^\.class\s+(?:[\w-]+\s+)*(\S+)$')
+SMALI_SUPER_RE = re.compile(r'^\.super\s+(\S+)')
+SMALI_FIELD_RE = re.compile(r'^\.field\s+(?:[\w-]+\s+)*([^\s:]+):([^\s=]+)')
+SMALI_METHOD_RE = re.compile(r'^\.method\s+(?:[\w-]+\s+)*([^\s(]+)(\(\S*)$')
+SMALI_INVOKE_RE = re.compile(r'^(invoke-[\w/-]+)\s+\{[^}]*\},\s*(\S+?)->([^\s(]+)(\(\S*)')
+SMALI_FIELD_REF_RE = re.compile(r'^([is](?:get|put)[\w/-]*)\s+.*?(\S+?)->([^\s:]+):(\S+)$')
+SMALI_CONST_STRING_RE = re.compile(r'^const-string(?:/jumbo)?\s+\w+,\s*"(.*)"$')
+
+# Table -> columns after file_id; "line" is the 1-based line in the smali file
+SYMBOL_TABLES = {
+    "classes": ("line", "name", "super"),
+    "methods": ("line", "class", "name", "descriptor"),
+    "fields": ("line", "class", "name", "type"),
+    "invokes": ("line", "class", "method", "opcode", "target_class", "target_name", "target_descriptor"),
+    "field_refs": ("line", "class", "method", "opcode", "target_class", "target_name", "target_type"),
+    "strings": ("line", "class", "method", "value"),
+}
+SYMBOL_INDEXES = (
+    "classes(name)", "classes(super)", "methods(name)", "fields(name)",
+    "invokes(target_class, target_name)", "invokes(target_name)",
+    "field_refs(target_class, target_name)", "field_refs(target_name)",
+    "strings(value)",
+)
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cached_sha256(file_path):
+    # file_sha256 for APKs asked about again and again (import, unpack, symbol index): hashed once per stat
+    st = os.stat(file_path)
+    key = (os.path.abspath(file_path), st.st_size, st.st_mtime_ns, st.st_ino)
+    if key not in file_digests:
+        file_digests[key] = file_sha256(file_path)
+    return file_digests[key]
+
+def symbol_index_path():
+    # One database per APK, so a later session on the same APK starts from the same index.
+    # None without base.apk: a shared fallback key would mix up the indexes of different APKs.
+    apk_path = os.path.join(APK_PATCH_DIR, "base.apk")
+    if not os.path.isfile(apk_path):
+        return None
+    return os.path.join(SYMBOL_INDEX_DIR, f"{cached_sha256(apk_path)}.sqlite")
+
+def parse_smali(text):
+    rows = {table: [] for table in SYMBOL_TABLES}
+    current_class = None
+    current_method = None
+    for line_num, raw_line in enumerate(text.split("\n"), start=1):
+        line = raw_line.strip()
+        if not line:
+            continue
+        first = line[0]
+        if first == ".":
+            if line.startswith(".method"):
+                m = SMALI_METHOD_RE.match(line)
+                if m:
+                    current_method = m.group(1) + m.group(2)
+                    rows["methods"].append((line_num, current_class, m.group(1), m.group(2)))
+            elif line.startswith(".end method"):
+                current_method = None
+            elif line.startswith(".class"):
+                m = SMALI_CLASS_RE.match(line)
+                if m:
+                    current_class = m.group(1)
+                    rows["classes"].append([line_num, current_class, None])
+            elif line.startswith(".super"):
+                m = SMALI_SUPER_RE.match(line)
+                if m and rows["classes"]:
+                    rows["classes"][-1][2] = m.group(1)
+            elif line.startswith(".field"):
+                m = SMALI_FIELD_RE.match(line)
+                if m:
+                    rows["fields"].append((line_num, current_class, m.group(1), m.group(2)))
+        elif first == "i" and line.startswith("invoke-"):
+            m = SMALI_INVOKE_RE.match(line)
+            if m:
+                rows["invokes"].append((line_num, current_class, current_method) + m.groups())
+        elif first in "is" and (line[1:4] in ("get", "put")):
+            m = SMALI_FIELD_REF_RE.match(line)
+            if m:
+                rows["field_refs"].append((line_num, current_class, current_method) + m.groups())
+        elif first == "c" and line.startswith("const-string"):
+            m = SMALI_CONST_STRING_RE.match(line)
+            if m:
+                rows["strings"].append((line_num, current_class, current_method, m.group(1)))
+    rows["classes"] = [tuple(row) for row in rows["classes"]]
+    return rows
+
+def symbol_shard(file_paths, known_digests):
+    # Files whose content hash is unchanged (e.g. a fresh decode of the same APK) are not parsed again.
+    results = []
+    for file_path, known_digest in zip(file_paths, known_digests):
+        try:
+            with open(file_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            results.append((None, None))
+            continue
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        if digest == known_digest:
+            results.append((digest, None))
+        else:
+            results.append((digest, parse_smali(data.decode("utf-8", errors="ignore"))))
+    return results
+
+def update_symbol_index(base_folder=None, workers=None):
+    # Parses every smali file under base/smali*/ once, later calls only re-parse changed files
+    base_folder = base_folder or os.path.join(APK_PATCH_DIR, "base")
+    if not os.path.exists(base_folder):
+        print(f"[!] Base folder not found at: {base_folder}")
+        return None
+    db_path = symbol_index_path()
+    if db_path is None:
+        print("[!] base.apk not found. Select/Import an APK first, the symbol index is kept per APK.")
+        return None
+
+    stats = {}
+    for folder in sorted(os.listdir(base_folder)):
+        smali_dir = os.path.join(base_folder, folder)
+        if folder.startswith("smali") and os.path.isdir(smali_dir):
+            for rel_path, stat in scan_tree_stats(smali_dir).items():
+                if rel_path.endswith(".smali"):
+                    stats[os.path.join(folder, rel_path)] = stat
+
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous=OFF")  # the index can always be rebuilt from base/
+    conn.execute("CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE, mtime_ns INTEGER, size INTEGER, digest TEXT)")
+    for table, columns in SYMBOL_TABLES.items():
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (file_id INTEGER, {', '.join(columns)})")
+
+    known = {row[1]: row for row in conn.execute("SELECT id, path, mtime_ns, size, digest FROM files")}
+    changed = [rel_path for rel_path, stat in stats.items() if rel_path not in known or known[rel_path][2:4] != stat]
+    removed = [rel_path for rel_path in known if rel_path not in stats]
+
+    if changed:
+        print(f"[*] Checking {len(changed)} smali file(s) for the symbol index...")
+    file_paths = [os.path.join(base_folder, rel_path) for rel_path in changed]
+    known_digests = [known[rel_path][4] if rel_path in known else None for rel_path in changed]
+    if workers is None:
+        workers = SEARCH_WORKERS if len(file_paths) >= PARALLEL_SEARCH_MIN_FILES else 1
+    if workers > 1:
+        shards = split_into_shards(list(zip(file_paths, known_digests)), workers * SEARCH_SHARDS_PER_WORKER)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(symbol_shard, [p for p, _ in shard], [d for _, d in shard]) for shard in shards]
+            parsed = [result for future in futures for result in future.result()]
+    else:
+        parsed = symbol_shard(file_paths, known_digests)
+
+    reparsed = 0
+    with conn:
+        # Bulk loads are faster without indexes, they are (re)created at the end
+        if not known:
+            for definition in SYMBOL_INDEXES:
+                conn.execute(f"DROP INDEX IF EXISTS idx_{re.sub(r'[^a-z]+', '_', definition).strip('_')}")
+        for rel_path in removed:
+            file_id = known[rel_path][0]
+            for table in SYMBOL_TABLES:
+                conn.execute(f"DELETE FROM {table} WHERE file_id = ?", (file_id,))
+            conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+        for rel_path, (digest, rows) in zip(changed, parsed):
+            if digest is None:
+                continue  # unreadable, try again next time
+            mtime_ns, size = stats[rel_path]
+            if rel_path in known:
+                file_id = known[rel_path][0]
+                conn.execute("UPDATE files SET mtime_ns = ?, size = ?, digest = ? WHERE id = ?", (mtime_ns, size, digest, file_id))
+                if rows is None:
+                    continue  # same content, only the timestamps moved
+                for table in SYMBOL_TABLES:
+                    conn.execute(f"DELETE FROM {table} WHERE file_id = ?", (file_id,))
+            else:
+                file_id = conn.execute(
+                    "INSERT INTO files (path, mtime_ns, size, digest) VALUES (?, ?, ?, ?)", (rel_path, mtime_ns, size, digest)
+                ).lastrowid
+            reparsed += 1
+            for table, columns in SYMBOL_TABLES.items():
+                if rows[table]:
+                    placeholders = ", ".join("?" * (len(columns) + 1))
+                    conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", [(file_id,) + row for row in rows[table]])
+
+        for table in SYMBOL_TABLES:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_file ON {table}(file_id)")
+        for definition in SYMBOL_INDEXES:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{re.sub(r'[^a-z]+', '_', definition).strip('_')} ON {definition}")
+
+    if reparsed or removed:
+        print(f"[+] Symbol index updated: {reparsed} parsed, {len(removed)} removed.")
+    return conn
+
+def query_symbols(conn, kind, target, exact=False, limit=500):
+    # kind: callers | strings | fields | classes | subclasses | methods
+    # Member targets look like Lcom/unity3d/ads/UnityAds;->show, optionally with a descriptor
+    target = target.strip()
+    member_class, _, member = target.rpartition("->") if "->" in target else (None, None, target)
+
+    if kind in ("callers", "fields"):
+        if kind == "callers":
+            table, symbol_column, separator = "invokes", "target_descriptor", "("
+        else:
+            table, symbol_column, separator = "field_refs", "target_type", ":"
+        name, _, descriptor = member.partition(separator)
+        conditions = ["t.target_name = ?"]
+        params = [name]
+        if member_class:
+            conditions.append("t.target_class = ?")
+            params.append(member_class)
+        if descriptor:
+            conditions.append(f"t.{symbol_column} = ?")
+            # Method descriptors are stored with their "(", field types without the ":"
+            params.append("(" + descriptor if kind == "callers" else descriptor)
+        display_separator = "" if kind == "callers" else "':' || "
+        sql = (
+            f"SELECT f.path, t.line, t.class, t.method, "
+            f"t.opcode || ' ' || t.target_class || '->' || t.target_name || {display_separator}t.{symbol_column} "
+            f"FROM {table} t JOIN files f ON f.id = t.file_id WHERE {' AND '.join(conditions)}"
+        )
+    elif kind == "strings":
+        condition = "t.value = ?" if exact else "t.value LIKE ? ESCAPE '\\'"
+        value = target if exact else "%" + target.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        sql = f"SELECT f.path, t.line, t.class, t.method, t.value FROM strings t JOIN files f ON f.id = t.file_id WHERE {condition}"
+        params = [value]
+    elif kind in ("classes", "subclasses"):
+        column = "name" if kind == "classes" else "super"
+        sql = f"SELECT f.path, t.line, t.name, NULL, t.super FROM classes t JOIN files f ON f.id = t.file_id WHERE t.{column} = ?"
+        params = [target]
+    elif kind == "methods":
+        name, paren, descriptor = member.partition("(")
+        conditions = ["t.name = ?"]
+        params = [name]
+        if member_class:
+            conditions.append("t.class = ?")
+            params.append(member_class)
+        if descriptor:
+            conditions.append("t.descriptor = ?")
+            params.append(paren + descriptor)
+        sql = f"SELECT f.path, t.line, t.class, NULL, t.name || t.descriptor FROM methods t JOIN files f ON f.id = t.file_id WHERE {' AND '.join(conditions)}"
+    else:
+        raise ValueError(f"Unknown symbol query kind: {kind}")
+
+    sql += " ORDER BY f.path, t.line"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    base_folder = os.path.join(APK_PATCH_DIR, "base")
+    return [
+        {
+            "path": os.path.join(base_folder, rel_path),
+            "line_num": line_num,
+            "class": class_name,
+            "method": method,
+            "symbol": symbol,
+        }
+        for rel_path, line_num, class_name, method, symbol in conn.execute(sql, params)
+    ]
+
+def lookup_symbols():
+    print("\n=== Smali Symbol Lookup ===\n")
+    conn = update_symbol_index()
+    if conn is None:
+        return
+
+    kinds = {
+        "1": ("callers", "Method (e.g. Lcom/unity3d/ads/UnityAds;->show or just show): "),
+        "2": ("strings", "Text inside const-string: "),
+        "3": ("fields", "Field (e.g. Lcom/foo/Bar;->mAdView or just mAdView): "),
+        "4": ("classes", "Class (e.g. Lcom/foo/Bar;): "),
+        "5": ("subclasses", "Super class (e.g. Landroid/app/Activity;): "),
+        "6": ("methods", "Method definition (e.g. Lcom/foo/Bar;->onCreate or just onCreate): "),
+    }
+    try:
+        while True:
+            print("\n1. Who calls a method")
+            print("2. Where is a const-string used")
+            print("3. Who reads/writes a field")
+            print("4. Where is a class defined")
+            print("5. Which classes extend a class")
+            print("6. Where is a method defined")
+            print("0. Back to Mainmenu")
+            choice = input("\nEnter your choice: ").strip()
+            if choice not in kinds:
+                return
+            kind, prompt = kinds[choice]
+            target = input(prompt).strip()
+            if not target:
+                continue
+
+            started = time.perf_counter()
+            results = query_symbols(conn, kind, target)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            for i, item in enumerate(results, start=1):
+                where = f"{item['class']}->{item['method']}" if item["method"] else item["class"]
+                print(f"{i}. {item['symbol']} in {where} at line {item['line_num']} of {item['path']}")
+            print(f"\n[✓] {len(results)} result(s) in {elapsed_ms:.1f} ms")
+    finally:
+        conn.close()
+
+# Entries still in effect: revert records and the entries they undid are history, nothing is deleted
+ACTIVE_ENTRY = "kind != 'revert' AND id NOT IN (SELECT reverted_id FROM entries WHERE kind = 'revert')"
+
+def open_journal(journal_file=None):
+    conn = sqlite3.connect(journal_file or JOURNAL_FILE)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS sessions (id INTEGER PRIMARY KEY, started REAL, label TEXT)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, session_id INTEGER, kind TEXT, file_path TEXT, "
+        "line_number INTEGER, original_line TEXT, keyword TEXT, replacement TEXT, digest TEXT, after_digest TEXT)"
+    )
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+    for column, kind in (("digest", "TEXT"), ("after_digest", "TEXT"), ("new_line", "TEXT"), ("reverted_id", "INTEGER")):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE entries ADD COLUMN {column} {kind}")  # journals from before snapshots/revert records
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("CREATE INDEX IF NOT EXISTS entries_file ON entries(file_path)")
+    conn.execute("CREATE INDEX IF NOT EXISTS entries_session ON entries(session_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS entries_reverted ON entries(reverted_id)")
+    conn.commit()
+    if os.path.exists(LOG_FILE):
+        import_legacy_log(conn)
+    return conn
+
+def bind_history_to_apk(apk_sha256):
+    # The journal and snapshots describe edits to one APK's decoded tree. Importing another APK drops them,
+    # their line numbers and snapshots would be written into a tree they no longer describe.
+    if os.path.exists(JOURNAL_FILE):
+        conn = open_journal()
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'apk_sha256'").fetchone()
+        finally:
+            conn.close()
+        if row is not None and row[0] != apk_sha256:
+            for path in (JOURNAL_FILE, JOURNAL_FILE + "-wal", JOURNAL_FILE + "-shm", LOG_FILE, LOG_FILE + ".imported"):
+                if os.path.exists(path):
+                    os.remove(path)
+            shutil.rmtree(SNAPSHOT_DIR, ignore_errors=True)
+            print("[🗑] Dropped the revert history of the previously imported APK")
+        elif row is not None:
+            return
+    # A new journal, or one from before the APK was recorded (imports a legacy log too), is tied to this APK
+    conn = open_journal()
+    try:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('apk_sha256', ?)", (apk_sha256,))
+        conn.commit()
+    finally:
+        conn.close()
+
+def import_legacy_log(conn):
+    # One-time move of modification_log.json into the journal as its own session
+    try:
+        with open(LOG_FILE, "r", encoding="utf-8") as f:
+            mod_log = json.load(f)
+    except Exception as e:
+        print(f"[!] Could not import {LOG_FILE}: {e}")
+        return
+    session_id = conn.execute(
+        "INSERT INTO sessions (started, label) VALUES (?, ?)", (os.path.getmtime(LOG_FILE), "modification_log.json")
+    ).lastrowid
+    conn.executemany(
+        "INSERT INTO entries (session_id, kind, file_path, line_number, original_line, keyword, replacement) VALUES (?, 'replace', ?, ?, ?, ?, ?)",
+        ((session_id, e["file_path"], e["line_number"], e["original_line"], e.get("keyword"), e.get("replacement"))
+         for e in mod_log.get("replaced_lines", [])),
+    )
+    conn.executemany(
+        "INSERT INTO entries (session_id, kind, file_path) VALUES (?, 'delete', ?)",
+        ((session_id, e["file_path"]) for e in mod_log.get("deleted_files", [])),
+    )
+    conn.commit()
+    os.replace(LOG_FILE, LOG_FILE + ".imported")
+    print(f"[+] Imported {LOG_FILE} into the modification journal.")
+
+class ModificationJournal:
+    # One session of the modification journal. Entries are buffered and written in batches, nothing
+    # already written is ever rewritten or deleted; the session row itself is only written with its first entries.
+
+    def __init__(self, label="", journal_file=None):
+        self.conn = open_journal(journal_file)
+        self.label = label
+        self.session_id = None
+        self.pending = []
+        self.count = 0
+
+    def add(self, kind, file_path, line_number=None, original_line=None, keyword=None, replacement=None,
+            digest=None, after_digest=None, new_line=None, reverted_id=None):
+        self.pending.append((kind, file_path, line_number, original_line, keyword, replacement, digest, after_digest,
+                             new_line, reverted_id))
+        if len(self.pending) >= JOURNAL_BATCH_SIZE:
+            self.flush()
+
+    def replaced_lines(self, entries):
+        for e in entries:
+            self.add("replace", e["file_path"], e["line_number"], e["original_line"], e["keyword"], e["replacement"],
+                     new_line=e.get("new_line"))
+
+    def deleted_file(self, file_path, digest=None):
+        self.add("delete", file_path, digest=digest)
+
+    def snapshot(self, file_path, digest, after_digest):
+        # Whole-file before/after state of a rewritten file, lets revert skip the line-by-line path
+        self.add("snapshot", file_path, digest=digest, after_digest=after_digest)
+
+    def reverted(self, entry_id, file_path):
+        self.add("revert", file_path, reverted_id=entry_id)
+
+    def flush(self):
+        if self.pending:
+            if self.session_id is None:
+                self.session_id = self.conn.execute(
+                    "INSERT INTO sessions (started, label) VALUES (?, ?)", (time.time(), self.label)
+                ).lastrowid
+            self.conn.executemany(
+                "INSERT INTO entries (session_id, kind, file_path, line_number, original_line, keyword, replacement, "
+                "digest, after_digest, new_line, reverted_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((self.session_id, *entry) for entry in self.pending),
+            )
+            self.conn.commit()
+            self.count += len(self.pending)
+            self.pending = []
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def list_journal_sessions():
+    # Returns [(session_id, started, label, replaced lines, deleted files)] of the sessions with changes
+    # still in effect, oldest first
+    if not os.path.exists(JOURNAL_FILE) and not os.path.exists(LOG_FILE):
+        return []
+    conn = open_journal()
+    try:
+        return conn.execute(
+            "SELECT s.id, s.started, s.label, "
+            "SUM(e.kind = 'replace'), SUM(e.kind = 'delete') "
+            f"FROM sessions s JOIN (SELECT session_id, kind FROM entries WHERE {ACTIVE_ENTRY}) e ON e.session_id = s.id "
+            "GROUP BY s.id ORDER BY s.id"
+        ).fetchall()
+    finally:
+        conn.close()
+
+def snapshot_blob_path(digest, snapshot_dir=None):
+    return os.path.join(snapshot_dir or SNAPSHOT_DIR, "blobs", digest[:2], digest)
+
+def snapshot_file(file_path, digest=None, snapshot_dir=None, replacing=False):
+    # Stores the current bytes of file_path in the blob store and returns their sha256.
+    # replacing: the caller is about to atomic_write or delete file_path, so the blob can be a hardlink, the name
+    # moves away before anything writes. Otherwise the file may still be saved in place (an external editor, a
+    # manifest rule that changed nothing), so the blob is a private reflink or copy.
+    digest = digest or file_sha256(file_path)
+    blob_path = snapshot_blob_path(digest, snapshot_dir)
+    try:
+        st = os.stat(blob_path)
+    except OSError:
+        st = None
+    if st is not None and st.st_size == os.path.getsize(file_path):
+        if st.st_nlink == 1 or (replacing and os.path.samefile(blob_path, file_path)):
+            return digest  # same content already stored
+    # Missing, or a blob still shared with a live file that may have been edited in place: stored again
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    if replacing and st is None:
+        try:
+            os.link(file_path, blob_path)
+            return digest
+        except FileExistsError:
+            return digest  # another worker stored it first
+        except OSError:
+            pass  # no hardlinks here (FAT32, another drive, ...)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{digest}.", suffix=".tmp", dir=os.path.dirname(blob_path))
+    os.close(fd)
+    try:
+        if not clone_file(file_path, temp_path):
+            shutil.copyfile(file_path, temp_path)
+        os.replace(temp_path, blob_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return digest
+
+def restore_snapshot(digest, file_path):
+    # Copies a blob back (never links, so later in-place edits cannot touch the store).
+    # Returns False when the blob is missing or no longer matches its hash.
+    blob_path = snapshot_blob_path(digest)
+    if not os.path.exists(blob_path):
+        return False
+    folder = os.path.dirname(file_path)
+    os.makedirs(folder, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(file_path)}.", suffix=".tmp", dir=folder)
+    try:
+        sha = hashlib.sha256()
+        with open(blob_path, "rb") as src, os.fdopen(fd, "wb") as dst:
+            for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                sha.update(chunk)
+                dst.write(chunk)
+        if sha.hexdigest() != digest:
+            os.remove(temp_path)
+            return False
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return True
+
+def prune_snapshots():
+    # Drops blobs no change still in effect refers to (reverted entries stay in the journal, their blobs are done)
+    blobs_dir = os.path.join(SNAPSHOT_DIR, "blobs")
+    if not os.path.isdir(blobs_dir) or not os.path.exists(JOURNAL_FILE):
+        return 0
+    conn = open_journal()
+    referenced = {row[0] for row in conn.execute(f"SELECT DISTINCT digest FROM entries WHERE digest IS NOT NULL AND {ACTIVE_ENTRY}")}
+    conn.close()
+    removed = 0
+    for prefix in os.listdir(blobs_dir):
+        prefix_dir = os.path.join(blobs_dir, prefix)
+        for name in os.listdir(prefix_dir):
+            if name not in referenced:
+                try:
+                    os.remove(os.path.join(prefix_dir, name))
+                    removed += 1
+                except OSError:
+                    pass
+    return removed
+
+def atomic_write(file_path, data):
+    # Writes str (utf-8, line endings untouched) or bytes to a temp file next to file_path, then swaps it in.
+    # A crash mid-write leaves the original file intact instead of a truncated one.
+    folder, name = os.path.split(file_path)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=folder or None)
+    try:
+        if isinstance(data, bytes):
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                if ATOMIC_WRITE_FSYNC:
+                    f.flush()
+                    os.fsync(f.fileno())
+        else:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                f.write(data)
+                if ATOMIC_WRITE_FSYNC:
+                    f.flush()
+                    os.fsync(f.fileno())
+        if os.path.exists(file_path):
+            shutil.copymode(file_path, temp_path)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+def replace_in_file(file_path, matcher, replace_with, snapshot_dir=None):
+    # Returns (replacement count, log entries, error, (digest, after_digest)); the file is only
+    # written when something changed, and its original bytes are snapshotted first.
+    try:
+        with open(file_path, "rb") as f:
+            data = f.read()
+        text = data.decode("utf-8")
+    except Exception:
+        return 0, [], None, None  # skip unreadable files (binary, etc)
+
+    # Most files contain none of the keywords, reject them in one pass
+    lower_text = text.lower()
+    if not matcher.could_match(lower_text):
+        return 0, [], None, None
+
+    count = 0
+    log_entries = []
+    lines = text.split("\n")
+    # Only the lines with a hit are visited, first keyword per line like the interactive mode
+    for line_num, kw in matcher.iter_line_matches(lower_text):
+        line = lines[line_num - 1]
+        new_line, n = re.subn(re.escape(kw), lambda _: replace_with, line, flags=re.IGNORECASE)
+        if n == 0 or new_line == line:
+            continue
+        log_entries.append({
+            "file_path": file_path,
+            "line_number": line_num,
+            "original_line": line.rstrip("\r"),
+            "keyword": kw,
+            "replacement": replace_with,
+            "new_line": new_line.rstrip("\r")
+        })
+        lines[line_num - 1] = new_line
+        count += n
+
+    if not count:
+        return 0, [], None, None
+    new_data = "\n".join(lines).encode("utf-8")
+    try:
+        digest = snapshot_file(file_path, hashlib.sha256(data).hexdigest(), snapshot_dir, replacing=True)
+        atomic_write(file_path, new_data)
+    except Exception as e:
+        return 0, [], f"{e}", None
+    return count, log_entries, None, (digest, hashlib.sha256(new_data).hexdigest())
+
+def replace_shard(file_paths, matcher, replace_with, snapshot_dir=None):
+    return [replace_in_file(file_path, matcher, replace_with, snapshot_dir) for file_path in file_paths]
+
+def iter_replace_results(file_paths, matcher, replace_with, workers, file_sizes, report_progress):
+    # Yields replace_in_file() results in file order, shard by shard when a pool is used
+    if workers <= 1:
+        for idx, file_path in enumerate(file_paths):
+            yield replace_in_file(file_path, matcher, replace_with, SNAPSHOT_DIR)
+            report_progress(idx + 1)
+        return
+
+    shards = split_into_shards(file_paths, workers * SEARCH_SHARDS_PER_WORKER, file_sizes)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(replace_shard, shard, matcher, replace_with, SNAPSHOT_DIR) for shard in shards]
+        done = 0
+        for shard, future in zip(shards, futures):
+            yield from future.result()
+            done += len(shard)
+            report_progress(done)
+
+def bulk_replace_keywords(keywords, replace_with, base_folder=None, selected_types=None, workers=None,
+                          progress_callback=None, journal=None):
+    # Non-interactive replace of every keyword occurrence (case-insensitive) in the text files of base_folder.
+    # Returns {file_path: replacements} for the files that changed; untouched files are never rewritten.
+    # Entries go to the given journal session, or to a new one that is closed here.
+    base_folder = base_folder or os.path.join(APK_PATCH_DIR, "base")
+    if not os.path.exists(base_folder):
+        print(f"[!] Base folder not found at: {base_folder}")
+        return {}
+    keywords = [kw.strip().lower() for kw in keywords if kw.strip()]
+    if not keywords:
+        print("[!] No keywords provided.")
+        return {}
+    matcher = KeywordMatcher(keywords, split_words=False)
+
+    file_paths = []
+    file_sizes = []
+    for root, file, size in iter_text_files(base_folder, selected_types):
+        file_paths.append(os.path.join(root, file))
+        file_sizes.append(size)
+    total_files = len(file_paths)
+    if workers is None:
+        workers = SEARCH_WORKERS if total_files >= PARALLEL_SEARCH_MIN_FILES else 1
+
+    def report_progress(done):
+        percent = int((done / total_files) * 100) if total_files else 100
+        sys.stdout.write(f"\rProgress: {percent}%")
+        sys.stdout.flush()
+        if progress_callback:
+            progress_callback(percent)
+
+    own_journal = journal is None
+    if own_journal:
+        journal = ModificationJournal(f"replace {'|'.join(keywords)} -> {replace_with}")
+
+    changes = {}
+    try:
+        results = iter_replace_results(file_paths, matcher, replace_with, workers, file_sizes, report_progress)
+        for file_path, (count, log_entries, error, digests) in zip(file_paths, results):
+            if error:
+                print(f"\n[!] Failed to write changes to {file_path} - {error}")
+            elif count:
+                changes[file_path] = count
+                journal.snapshot(file_path, *digests)
+                journal.replaced_lines(log_entries)
+    finally:
+        if own_journal:
+            journal.close()
+    print()
+
+    if changes:
+        clear_search_cache()
+        # Re-index only the files whose mtime or size changed
+        if own_journal and os.path.exists(SEARCH_INDEX_FILE):
+            update_search_index(base_folder)
+    return changes
 
 def delete_or_replace_keywords():
     print("\n=== Keyword Delete or Replace in Base Folder ===\n")
@@ -789,13 +3539,10 @@ def delete_or_replace_keywords():
         print("[!] No keywords provided.")
         return
     keywords = [kw.strip() for kw in keywords_input.split("|") if kw.strip()]
+    matcher = KeywordMatcher(keywords, split_words=False)
 
-    # Load or initialize modification log
-    if os.path.exists(LOG_FILE):
-        with open(LOG_FILE, "r", encoding="utf-8") as f:
-            mod_log = json.load(f)
-    else:
-        mod_log = {"deleted_files": [], "replaced_lines": []}
+    # Every run is its own journal session, so it can be reverted on its own
+    journal = ModificationJournal(f"{'delete' if choice == '1' else 'replace'} {'|'.join(keywords)}")
 
     if choice == "1":
         deleted_files = 0
@@ -810,7 +3557,7 @@ def delete_or_replace_keywords():
         for root, _, files in os.walk(base_folder):
             for file in files:
                 lower_file = file.lower()
-                if any(kw in lower_file for kw in keywords):
+                if matcher.first_match(lower_file) is not None:
                     file_path = os.path.join(root, file)
                     print(f"\nFile matched for deletion: {file_path}")
                     if delete_all:
@@ -820,11 +3567,13 @@ def delete_or_replace_keywords():
 
                     if confirm == "y":
                         try:
+                            # Keep the original bytes so revert can bring the file back
+                            digest = snapshot_file(file_path, replacing=True)
                             os.remove(file_path)
                             deleted_files += 1
                             print(f"[Deleted] {file_path}")
                             # Log deleted file
-                            mod_log["deleted_files"].append({"file_path": file_path})
+                            journal.deleted_file(file_path, digest)
                         except Exception as e:
                             print(f"[!] Failed to delete: {file_path} - {e}")
 
@@ -842,49 +3591,59 @@ def delete_or_replace_keywords():
         if replace_all_input == "yes":
             replace_all = True
 
-        import re  # import once, can move outside function if you want
+        if replace_all:
+            # No prompts needed, let the worker pool rewrite the files
+            changes = bulk_replace_keywords(keywords, replace_with, base_folder, journal=journal)
+            for file_path, count in changes.items():
+                print(f"[Replaced in] {file_path} ({count} replacements)")
+            replaced_files = len(changes)
+        else:
+            # Case-insensitive replace patterns, compiled once per keyword
+            patterns = {kw: re.compile(re.escape(kw), re.IGNORECASE) for kw in keywords}
 
-        for root, _, files in os.walk(base_folder):
-            for file in files:
+            # Binary resources are skipped without being read
+            for root, file, _ in iter_text_files(base_folder):
                 file_path = os.path.join(root, file)
                 try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        lines = f.readlines()
+                    with open(file_path, "r", encoding="utf-8", newline="") as f:
+                        text = f.read()
                 except Exception:
                     # skip unreadable files (binary, etc)
                     continue
 
-                changed = False
+                # Most files contain none of the keywords, reject them in one pass
+                if not matcher.could_match(text.lower()):
+                    continue
+
+                lines = text.split("\n")
+                file_entries = []
                 for i, line in enumerate(lines):
-                    lower_line = line.lower()
-                    for kw in keywords:
-                        if kw in lower_line:
-                            print(f"\nFile: {file_path}")
-                            print(f"Line {i+1}: {line.strip()}")
-                            if replace_all:
-                                confirm = "y"
-                            else:
-                                confirm = input(f"Replace '{kw}' with '{replace_with}' in this line? (y/n): ").strip().lower()
-
-                            if confirm == "y":
-                                # Save original before replacement for log
-                                mod_log["replaced_lines"].append({
-                                    "file_path": file_path,
-                                    "line_number": i+1,
-                                    "original_line": line.rstrip('\n'),
-                                    "keyword": kw,
-                                    "replacement": replace_with
-                                })
-                                # Case-insensitive replace
-                                pattern = re.compile(re.escape(kw), re.IGNORECASE)
-                                lines[i] = pattern.sub(replace_with, line)
-                                changed = True
-                            break  # Only first keyword per line for simplicity
-
-                if changed:
+                    kw = matcher.first_match(line.lower())  # Only first keyword per line for simplicity
+                    if kw is not None:
+                        print(f"\nFile: {file_path}")
+                        print(f"Line {i+1}: {line.strip()}")
+                        confirm = input(f"Replace '{kw}' with '{replace_with}' in this line? (y/n): ").strip().lower()
+
+                        if confirm == "y":
+                            # Case-insensitive replace
+                            lines[i] = patterns[kw].sub(lambda _: replace_with, line)
+                            # Save original before replacement for log
+                            file_entries.append({
+                                "file_path": file_path,
+                                "line_number": i+1,
+                                "original_line": line.rstrip('\r'),
+                                "keyword": kw,
+                                "replacement": replace_with,
+                                "new_line": lines[i].rstrip('\r')
+                            })
+
+                if file_entries:
                     try:
-                        with open(file_path, "w", encoding="utf-8") as f:
-                            f.writelines(lines)
+                        new_data = "\n".join(lines).encode("utf-8")
+                        digest = snapshot_file(file_path, replacing=True)
+                        atomic_write(file_path, new_data)
+                        journal.snapshot(file_path, digest, hashlib.sha256(new_data).hexdigest())
+                        journal.replaced_lines(file_entries)
                         replaced_files += 1
                         print(f"[Replaced in] {file_path}")
                     except Exception as e:
@@ -893,80 +3652,324 @@ def delete_or_replace_keywords():
         print(f"\n[✓] Replaced keywords in {replaced_files} files.")
 
     else:
+        journal.close()
         print("\nInvalid choice!")
         return
     
-    # Save modification log after changes
-    with open(LOG_FILE, "w", encoding="utf-8") as f:
-        json.dump(mod_log, f, indent=4)
-
-    print(f"\n[✓] Modification log saved to {LOG_FILE}\n")
-
-def revert_modifications():
+    # Flush the last batch of journal entries
+    journal.close()
+
+    if journal.count:
+        print(f"\n[✓] Modification journal saved to {JOURNAL_FILE} (session {journal.session_id})\n")
+    clear_search_cache()
+
+    # Re-index only the files whose mtime or size changed
+    if os.path.exists(SEARCH_INDEX_FILE):
+        update_search_index(base_folder)
+
+def line_still_written(current, new_line, replacement):
+    # True when a line still holds what the session wrote there. Entries from before new_line was logged
+    # only know the replacement text, which at least has to still be in the line.
+    current = current.rstrip("\r")
+    if new_line is not None:
+        return current == new_line
+    return not replacement or replacement.lower() in current.lower()
+
+def revert_lines(path, rows):
+    # Line-by-line fallback for one session's replacements in one file, returns the reverted entry ids.
+    # A line that no longer holds what the session wrote (edited again, or by a later session) is left alone.
+    try:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            lines = f.read().split("\n")
+    except Exception as e:
+        print(f"[!] Could not read {path}: {e}")
+        return []
+
+    changed_ids = []
+    for entry_id, session, _, _, line_number, original_line, _, _, replacement, new_line in rows:
+        line_idx = line_number - 1
+        if 0 <= line_idx < len(lines) and not line_still_written(lines[line_idx], new_line, replacement):
+            print(f"[!] Line {line_number} in {path} changed since session {session}, left as is")
+        elif 0 <= line_idx < len(lines):
+            print(f"Reverting line {line_number} in {path}")
+            print(f"Current: {lines[line_idx].strip()}")
+            print(f"Original: {original_line}")
+            # Keep the file's own line ending
+            lines[line_idx] = original_line + ("\r" if lines[line_idx].endswith("\r") else "")
+            changed_ids.append(entry_id)
+
+    if changed_ids:
+        try:
+            atomic_write(path, "\n".join(lines))
+        except Exception as e:
+            print(f"[!] Failed to write {path}: {e}")
+            return []
+    return changed_ids
+
+def revert_modifications(session_id=None, file_path=None):
+    # Reverts every journaled change, or only those of one session and/or one file.
+    # Entries are streamed from the journal one file at a time, newest session first, so the
+    # work is proportional to the touched files. A rewritten file that still holds exactly what
+    # the session wrote is restored whole from its snapshot, otherwise line by line; deleted
+    # files come back from their snapshot.
     print("\n=== Revert Deleted/Replaced Modifications ===\n")
 
-    if not os.path.exists(LOG_FILE):
+    if not os.path.exists(JOURNAL_FILE) and not os.path.exists(LOG_FILE):
         print("[!] No modification log found.")
         return
 
-    with open(LOG_FILE, "r", encoding="utf-8") as f:
-        mod_log = json.load(f)
-
-    # Revert replaced lines
-    replaced = mod_log.get("replaced_lines", [])
-    if replaced:
-        print(f"Reverting {len(replaced)} replaced lines...\n")
-        # Group replacements by file for efficiency
-        from collections import defaultdict
-        file_changes = defaultdict(list)
-        for entry in replaced:
-            file_changes[entry["file_path"]].append(entry)
+    conditions = [ACTIVE_ENTRY]
+    params = []
+    if session_id is not None:
+        conditions.append("session_id = ?")
+        params.append(session_id)
+    if file_path:
+        if not os.path.isabs(file_path):
+            file_path = os.path.join(APK_PATCH_DIR, "base", file_path)
+        conditions.append("file_path = ?")
+        params.append(os.path.abspath(file_path))
+    where = " WHERE " + " AND ".join(conditions)
+
+    conn = open_journal()
+    reader = conn.cursor()
+    reader.execute(
+        "SELECT id, session_id, kind, file_path, line_number, original_line, digest, after_digest, replacement, new_line "
+        f"FROM entries{where} ORDER BY file_path, session_id DESC, id DESC",
+        params,
+    )
+    reverted_ids = []
+    restored_files = 0
+    reverted_lines = 0
+    lost_files = []
+    for path, file_rows in groupby(reader, key=lambda row: row[3]):
+        for _, rows in groupby(file_rows, key=lambda row: row[1]):
+            rows = list(rows)
+            replaced = [row for row in rows if row[2] == "replace"]
+            snapshots = [row for row in rows if row[2] == "snapshot"]
+            for row in rows:
+                if row[2] != "delete":
+                    continue
+                if row[6] and not os.path.exists(path) and restore_snapshot(row[6], path):
+                    print(f"[Restored] {path}")
+                    reverted_ids.append((row[0], path))
+                    restored_files += 1
+                elif os.path.exists(path):
+                    reverted_ids.append((row[0], path))  # already back
+                else:
+                    lost_files.append(path)
 
-        for file_path, changes in file_changes.items():
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
-            except Exception as e:
-                print(f"[!] Could not read {file_path}: {e}")
+            if not replaced and not snapshots:
+                continue
+            # Rows are newest first: the last write must still be on disk, the first one holds the original
+            if (snapshots and os.path.exists(path) and file_sha256(path) == snapshots[0][7]
+                    and restore_snapshot(snapshots[-1][6], path)):
+                print(f"[Reverted] {path} (from snapshot)")
+                reverted_ids.extend((row[0], path) for row in rows if row[2] != "delete")
+                reverted_lines += len(replaced)
                 continue
 
-            changed = False
-            for change in changes:
-                line_idx = change["line_number"] - 1
-                if 0 <= line_idx < len(lines):
-                    print(f"Reverting line {change['line_number']} in {file_path}")
-                    print(f"Current: {lines[line_idx].strip()}")
-                    print(f"Original: {change['original_line']}")
-                    lines[line_idx] = change["original_line"] + "\n"
-                    changed = True
-
-            if changed:
-                try:
-                    with open(file_path, "w", encoding="utf-8") as f:
-                        f.writelines(lines)
-                    print(f"[Reverted] {file_path}")
-                except Exception as e:
-                    print(f"[!] Failed to write {file_path}: {e}")
+            # Edited since, only put the logged lines back
+            changed_ids = revert_lines(path, replaced)
+            if changed_ids:
+                print(f"[Reverted] {path}")
+                reverted_ids.extend((entry_id, path) for entry_id in changed_ids)
+                reverted_ids.extend((row[0], path) for row in snapshots)
+                reverted_lines += len(changed_ids)
 
+    if reverted_lines:
+        print(f"\n[✓] Reverted {reverted_lines} replaced lines.")
     else:
         print("No replaced lines to revert.")
-
-    # Deleted files cannot be restored automatically — just list them
-    deleted = mod_log.get("deleted_files", [])
-    if deleted:
-        print(f"\nNote: {len(deleted)} files were deleted and cannot be restored automatically.")
-        print("List of deleted files:")
-        for entry in deleted:
-            print(f"- {entry['file_path']}")
+    if restored_files:
+        print(f"[✓] Restored {restored_files} deleted files.")
+
+    reader.close()
+    conn.close()
+    # The journal is append-only: a revert session records which entries it undid
+    label = "revert" + (f" session {session_id}" if session_id is not None else "") + (f" {file_path}" if file_path else "")
+    with ModificationJournal(label) as journal:
+        for entry_id, path in reverted_ids:
+            journal.reverted(entry_id, path)
+    prune_snapshots()
+
+    # Deletions logged without a snapshot (older logs) cannot be restored — just list them
+    if lost_files:
+        print("\nThese files were deleted and cannot be restored automatically:")
+        for path in lost_files:
+            print(f"- {path}")
     else:
-        print("No deleted files logged.")
+        print("No unrecoverable deleted files.")
 
+    clear_search_cache()
     print("\n[✓] Revert operation completed.")
 
+def revert_menu():
+    sessions = list_journal_sessions()
+    if not sessions:
+        print("\n[!] No modification log found.")
+        return
+
+    print("\n=== Modification Sessions ===\n")
+    for session_id, started, label, replaced, deleted in sessions:
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(started))
+        print(f"[{session_id}] {when}  {label}  ({replaced} lines replaced, {deleted} files deleted)")
+
+    print("\nPress Enter to revert everything, enter a session number, or f to revert one file.")
+    choice = input("\nEnter your choice: ").strip().lower()
+    if choice == "":
+        revert_modifications()
+    elif choice == "f":
+        target = input("File path (absolute or relative to base): ").strip().strip('"')
+        if target:
+            revert_modifications(file_path=target)
+    elif choice.isdigit():
+        revert_modifications(session_id=int(choice))
+    else:
+        print("\nInvalid choice!")
+
+def start_tag_end(buf):
+    # Offset just past the '>' closing the start tag at buf[0], quotes respected
+    quote = None
+    for pos in range(1, len(buf)):
+        c = buf[pos]
+        if quote:
+            if c == quote:
+                quote = None
+        elif c in (0x22, 0x27):  # " or '
+            quote = c
+        elif c == 0x3E:  # >
+            return pos + 1
+    raise ValueError("unterminated start tag")
+
+def toggle_enabled_attribute(tag, prefix, value, current):
+    # Returns (new tag bytes, action) with only the android:enabled value touched
+    p = re.escape(prefix)
+    if current is not None:
+        if current.lower() == value.decode():
+            return tag, "unchanged"
+        enabled_re = re.compile(rb"(\s" + p + rb":enabled\s*=\s*)([\"'])[^\"']*\2")
+        return enabled_re.sub(lambda m: m.group(1) + m.group(2) + value + m.group(2), tag, count=1), "changed"
+    # Insert android:enabled right after android:name
+    name_re = re.compile(rb"\s" + p + rb":name\s*=\s*([\"'])[^\"']*\1")
+    name_match = name_re.search(tag)
+    insert = b" " + prefix + b':enabled="' + value + b'"'
+    return tag[:name_match.end()] + insert + tag[name_match.end():], "added"
+
+def patch_manifest_components(manifest_path, keywords, enabled, tags=MANIFEST_COMPONENT_TAGS, dry_run=False):
+    # Sets android:enabled on every component (activity/service/receiver/provider) whose
+    # android:name contains one of the keywords. Returns the change report
+    # [{"line", "tag", "name", "action", "old", "new"}], or None if the manifest could not be parsed.
+    reports = patch_manifest(manifest_path, [(keywords, enabled, tags)], dry_run)
+    return None if reports is None else reports[0]
+
+def patch_manifest(manifest_path, toggles, dry_run=False):
+    # Streams the manifest through expat once for any number of (keywords, enabled, tags) toggles.
+    # A component matched by several toggles gets them in order, so the last one wins like
+    # separate passes would. Only the matching start tags are rewritten; every other byte is
+    # copied through unchanged, and the file is only replaced when something changed.
+    # Returns one change report per toggle, or None if the manifest could not be parsed.
+    toggles = [([k.lower() for k in keywords], b"true" if enabled else b"false", tags)
+               for keywords, enabled, tags in toggles]
+    parser = xml.parsers.expat.ParserCreate(namespace_separator=" ")
+    if hasattr(parser, "SetReparseDeferralEnabled"):
+        # Expat >= 2.6 may hold a start tag back until more data arrives, by then its bytes
+        # could already be copied out; tags have to be reported in the chunk that completes them
+        parser.SetReparseDeferralEnabled(False)
+    prefixes = {}
+    pending = []
+
+    def start_ns(prefix, uri):
+        prefixes.setdefault(uri, prefix)
+
+    def start_element(name, attrs):
+        uri, _, local = name.rpartition(" ")
+        if uri:
+            return
+        component = attrs.get(ANDROID_NS + " name")
+        if not component:
+            return
+        lower = component.lower()
+        matches = [idx for idx, (keywords, _, tags) in enumerate(toggles)
+                   if local in tags and any(k in lower for k in keywords)]
+        if matches:
+            pending.append((parser.CurrentByteIndex, parser.CurrentLineNumber, local, component,
+                            attrs.get(ANDROID_NS + " enabled"), matches))
+
+    parser.StartNamespaceDeclHandler = start_ns
+    parser.StartElementHandler = start_element
+
+    reports = [[] for _ in toggles]
+    folder = os.path.dirname(manifest_path)
+    fd, temp_path = tempfile.mkstemp(prefix=".AndroidManifest.", suffix=".tmp", dir=folder)
+    try:
+        with open(manifest_path, "rb") as src, os.fdopen(fd, "wb") as out:
+            buf = bytearray()
+            buf_start = 0  # offset of buf[0] in the manifest
+            while True:
+                chunk = src.read(MANIFEST_CHUNK_SIZE)
+                buf += chunk
+                parser.Parse(chunk, not chunk)
+
+                for offset, line_num, tag, component, current, matches in pending:
+                    out.write(buf[:offset - buf_start])
+                    del buf[:offset - buf_start]
+                    buf_start = offset
+                    end = start_tag_end(buf)
+                    prefix = (prefixes.get(ANDROID_NS) or "android").encode()
+                    new_tag = bytes(buf[:end])
+                    for idx in matches:
+                        value = toggles[idx][1]
+                        new_tag, action = toggle_enabled_attribute(new_tag, prefix, value, current)
+                        reports[idx].append({"line": line_num, "tag": tag, "name": component, "action": action,
+                                             "old": current, "new": value.decode()})
+                        current = value.decode()
+                    out.write(new_tag)
+                    del buf[:end]
+                    buf_start += end
+                pending.clear()
+
+                if not chunk:
+                    out.write(buf)
+                    break
+                # Expat reports a start tag as soon as its '>' arrives, so nothing before the
+                # last '<' can still be rewritten
+                cut = buf.rfind(b"<")
+                if cut > 0:
+                    out.write(buf[:cut])
+                    del buf[:cut]
+                    buf_start += cut
+
+        changed = any(entry["action"] != "unchanged" for report in reports for entry in report)
+        if changed and not dry_run:
+            shutil.copymode(manifest_path, temp_path)
+            os.replace(temp_path, manifest_path)
+        else:
+            os.remove(temp_path)
+    except (xml.parsers.expat.ExpatError, ValueError) as e:
+        os.remove(temp_path)
+        print(f"[!] Could not parse {manifest_path}: {e}")
+        return None
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return reports
+
+def print_manifest_report(report):
+    for entry in report:
+        if entry["action"] == "changed":
+            print(f"[Line {entry['line']}] Changed android:enabled from {entry['old']} to {entry['new']} for {entry['name']}")
+        elif entry["action"] == "added":
+            print(f"[Line {entry['line']}] Added android:enabled=\"{entry['new']}\" for {entry['name']}")
+        else:
+            print(f"[Line {entry['line']}] android:enabled already {entry['new']} for {entry['name']}")
+    return sum(1 for entry in report if entry["action"] != "unchanged")
+
 def remove_ads():
     print("\n[+] Removing ads from APK...")
 
-    keywords = ['reward','adactivity', 'ads', 'interstitial']
     base_folder = os.path.join(APK_PATCH_DIR, "base")
 
     if not os.path.exists(base_folder):
@@ -974,65 +3977,19 @@ def remove_ads():
         return
     
     manifest_path = os.path.join(base_folder, "AndroidManifest.xml")
-    count = 0
-
-    # Read all lines first
-    with open(manifest_path, 'r', encoding='utf-8', errors='ignore') as f_in:
-        lines = f_in.readlines()
-
-    with open(manifest_path, 'w', encoding='utf-8') as f_out:
-
-        for line_num, line in enumerate(lines, start=1):
-            lower_line = line.lower()
-
-            # Search for android:name="..."
-            name_match = re.search(r'android:name="([^"]+)"', lower_line, re.IGNORECASE)
-            if name_match:
-                name_value = name_match.group(1).lower()
-
-                # Check if name contains any of the keywords
-                if any(k in name_value for k in keywords):
-
-                    if 'android:enabled=' in line:
-                        # Check if enabled="true" or enabled=true
-                        enabled_true_match = re.search(
-                            r'android:enabled\s*=\s*"true"|android:enabled\s*=\s*true',
-                            line,
-                            re.IGNORECASE
-                        )
-                        if enabled_true_match:
-                            line = re.sub(
-                                r'(android:enabled\s*=\s*)"true"',
-                                r'\1"false"',
-                                line,
-                                flags=re.IGNORECASE
-                            )
-                            line = re.sub(
-                                r'(android:enabled\s*=\s*)true',
-                                r'\1false',
-                                line,
-                                flags=re.IGNORECASE
-                            )
-                            print(f"[Line {line_num}] Changed android:enabled from true to false for {name_value}")
-                            count += 1
-                        else:
-                            print(f"[Line {line_num}] android:enabled already false for {name_value}")
-                    else:
-                        # Insert android:enabled="false" after android:name="..."
-                        insert_pos = name_match.end()
-                        line = line[:insert_pos] + ' android:enabled="false"' + line[insert_pos:]
-                        print(f"[Line {line_num}] Added android:enabled=\"false\" for {name_value}")
-                        count += 1
-
-            f_out.write(line)
+    report = patch_manifest_components(manifest_path, AD_KEYWORDS, enabled=False)
+    if report is None:
+        return
+    count = print_manifest_report(report)
 
+    clear_search_cache()
     print(f"[✓] Total changes made: {count}")
     print(f"[+] Patched manifest saved (overwritten) at {manifest_path}")
+    return report
     
 def restore_ads():
     print("\n[+] Restoring ads in APK...")
 
-    keywords = ['reward', 'adactivity', 'ads', 'interstitial']
     base_folder = os.path.join(APK_PATCH_DIR, "base")
 
     if not os.path.exists(base_folder):
@@ -1040,37 +3997,660 @@ def restore_ads():
         return
 
     manifest_path = os.path.join(base_folder, "AndroidManifest.xml")
-    count = 0
-
-    with open(manifest_path, 'r', encoding='utf-8', errors='ignore') as f_in:
-        lines = f_in.readlines()
-
-    with open(manifest_path, 'w', encoding='utf-8') as f_out:
-        for line_num, line in enumerate(lines, start=1):
-            lower_line = line.lower()
-            name_match = re.search(r'android:name="([^"]+)"', lower_line, re.IGNORECASE)
-            if name_match:
-                name_value = name_match.group(1).lower()
-                if any(k in name_value for k in keywords):
-                    if 'android:enabled=' in line:
-                        if re.search(r'android:enabled\s*=\s*"false"|android:enabled\s*=\s*false', line, re.IGNORECASE):
-                            line = re.sub(r'(android:enabled\s*=\s*)"false"', r'\1"true"', line, flags=re.IGNORECASE)
-                            line = re.sub(r'(android:enabled\s*=\s*)false', r'\1true', line, flags=re.IGNORECASE)
-                            print(f"[Line {line_num}] Changed android:enabled from false to true for {name_value}")
-                            count += 1
-                        else:
-                            print(f"[Line {line_num}] android:enabled already true for {name_value}")
-                    else:
-                        insert_pos = name_match.end()
-                        line = line[:insert_pos] + ' android:enabled="true"' + line[insert_pos:]
-                        print(f"[Line {line_num}] Added android:enabled=\"true\" for {name_value}")
-                        count += 1
-            f_out.write(line)
+    report = patch_manifest_components(manifest_path, AD_KEYWORDS, enabled=True)
+    if report is None:
+        return
+    count = print_manifest_report(report)
 
+    clear_search_cache()
     print(f"[✓] Total changes made: {count}")
     print(f"[+] Restored manifest saved (overwritten) at {manifest_path}")
+    return report
+
+
+
+def load_patch_rules(rules_path):
+    # Reads a rule set from JSON, or TOML when tomllib is available (Python 3.11+)
+    if rules_path.lower().endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:
+            raise ValueError("TOML rule files need Python 3.11+, use JSON instead")
+        with open(rules_path, "rb") as f:
+            return tomllib.load(f)
+    with open(rules_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def compile_patch_rules(rule_set):
+    # Validates every rule and builds its matchers once, so workers only run them
+    rules = rule_set.get("rules") if isinstance(rule_set, dict) else None
+    if not rules:
+        raise ValueError("Rule set has no rules")
+
+    compiled = []
+    for idx, rule in enumerate(rules):
+        kind = rule.get("type")
+        name = rule.get("name") or f"{kind} #{idx + 1}"
+        if kind not in PATCH_RULE_TYPES:
+            raise ValueError(f"Rule '{name}': unknown type {kind!r}, expected one of {', '.join(PATCH_RULE_TYPES)}")
+        keywords = [k.lower() for k in rule.get("keywords", []) if k]
+        entry = {
+            "name": name,
+            "type": kind,
+            "paths": tuple(rule.get("paths", ())),
+            "file_types": tuple(ext.lower() for ext in rule.get("file_types", ())),
+        }
+
+        if kind == "manifest":
+            if not keywords:
+                raise ValueError(f"Rule '{name}': manifest rules need keywords")
+            entry["keywords"] = keywords
+            entry["enabled"] = bool(rule.get("enabled", False))
+            entry["tags"] = frozenset(rule.get("tags", MANIFEST_COMPONENT_TAGS))
+        elif kind == "delete":
+            if not keywords and not entry["paths"]:
+                raise ValueError(f"Rule '{name}': delete rules need keywords or paths")
+            entry["matcher"] = KeywordMatcher(keywords, split_words=False) if keywords else None
+        elif kind == "replace":
+            if "replacement" not in rule:
+                raise ValueError(f"Rule '{name}': replace rules need a replacement")
+            replacement = str(rule["replacement"])
+            if rule.get("pattern"):
+                flags = re.IGNORECASE if rule.get("ignore_case") else 0
+                try:
+                    entry["pattern"] = re.compile(rule["pattern"], flags | re.MULTILINE)
+                except re.error as e:
+                    raise ValueError(f"Rule '{name}': bad pattern - {e}")
+                entry["replacement"] = replacement  # regex rules may use \1 backreferences
+                entry["matcher"] = None
+            elif keywords:
+                entry["pattern"] = re.compile("|".join(re.escape(k) for k in sorted(keywords, key=len, reverse=True)), re.IGNORECASE)
+                entry["replacement"] = replacement.replace("\\", "\\\\")  # inserted literally
+                entry["matcher"] = KeywordMatcher(keywords, split_words=False)
+            else:
+                raise ValueError(f"Rule '{name}': replace rules need keywords or a pattern")
+        elif kind == "resource":
+            resource_type = rule.get("resource_type", "string")
+            resource_name = rule.get("resource_name")
+            if not resource_name or "value" not in rule:
+                raise ValueError(f"Rule '{name}': resource rules need resource_name and value")
+            entry["paths"] = entry["paths"] or RESOURCE_VALUE_PATHS
+            entry["needle"] = f'name="{resource_name}"'
+            # <string name="x">old</string>, or <string name="x" /> as apktool writes empty values; both come out
+            # as an open/close pair. Attribute values are skipped whole so a "/" inside one ends nothing.
+            attrs = r'(?:[^>/"]|"[^"]*")*?'
+            tag = re.escape(resource_type)
+            entry["pattern"] = re.compile(
+                rf'(<{tag}(?=\s){attrs}\bname="{re.escape(resource_name)}"{attrs})(?:\s*/>|>.*?</{tag}>)',
+                re.DOTALL,
+            )
+            value = xml_escape(str(rule["value"]))
+            entry["replacement"] = "\\g<1>>" + value.replace("\\", "\\\\") + f"</{resource_type}>"
+        compiled.append(entry)
+    return compiled
+
+def rule_applies(rule, rel_path, ext):
+    if rule["file_types"] and ext not in rule["file_types"]:
+        return False
+    if rule["paths"] and not any(fnmatch.fnmatchcase(rel_path, glob) for glob in rule["paths"]):
+        return False
+    return True
+
+def apply_rules_to_file(base_folder, rel_path, rules, stats, dry_run, snapshot_dir):
+    # Runs every delete/replace/resource rule against one file, reading and writing it at most once.
+    # Returns (action, digest, after_digest, line entries) or None when the file is left alone.
+    posix_path = rel_path.replace(os.sep, "/")
+    name = posix_path.rsplit("/", 1)[-1].lower()
+    dot = name.rfind(".")
+    ext = name[dot:] if dot != -1 else ""
+    file_path = os.path.join(base_folder, rel_path)
+
+    for idx, rule in enumerate(rules):
+        if rule["type"] != "delete":
+            continue
+        started = time.perf_counter()
+        matched = rule_applies(rule, posix_path, ext) and (rule["matcher"] is None or rule["matcher"].first_match(name) is not None)
+        stats[idx][2] += time.perf_counter() - started
+        if matched:
+            stats[idx][0] += 1
+            stats[idx][1] += 1
+            if dry_run:
+                return "deleted", None, None, []
+            try:
+                digest = snapshot_file(file_path, snapshot_dir=snapshot_dir, replacing=True)
+                os.remove(file_path)
+            except OSError as e:
+                return "error", f"{e}", None, []
+            return "deleted", digest, None, []
+
+    text_rules = [(idx, rule) for idx, rule in enumerate(rules)
+                  if rule["type"] in ("replace", "resource") and rule_applies(rule, posix_path, ext)]
+    if not text_rules or ext in BINARY_EXTENSIONS:
+        return None
+    try:
+        with open(file_path, "rb") as f:
+            data = f.read()
+        original = data.decode("utf-8")
+    except Exception:
+        return None  # binary or not utf-8
+
+    text = original
+    lower_text = None
+    for idx, rule in text_rules:
+        started = time.perf_counter()
+        if rule["type"] == "resource":
+            hit = rule["needle"] in text
+        elif rule["matcher"] is not None:
+            if lower_text is None:
+                lower_text = text.lower()
+            hit = rule["matcher"].could_match(lower_text)
+        else:
+            hit = True
+        if hit:
+            text, n = rule["pattern"].subn(rule["replacement"], text)
+            if n:
+                stats[idx][0] += 1
+                stats[idx][1] += n
+                lower_text = None
+        stats[idx][2] += time.perf_counter() - started
+
+    if text == original:
+        return None
+    if dry_run:
+        return "rewritten", None, None, []
+
+    # Line entries let revert fall back to line level if the file is edited again later
+    entries = []
+    old_lines = original.split("\n")
+    new_lines = text.split("\n")
+    if len(old_lines) == len(new_lines):
+        for i, (old, new) in enumerate(zip(old_lines, new_lines)):
+            if old != new:
+                entries.append({"file_path": file_path, "line_number": i + 1, "original_line": old.rstrip("\r"),
+                                "keyword": "rules", "replacement": new.rstrip("\r"), "new_line": new.rstrip("\r")})
+    new_data = text.encode("utf-8")
+    try:
+        digest = snapshot_file(file_path, hashlib.sha256(data).hexdigest(), snapshot_dir, replacing=True)
+        atomic_write(file_path, new_data)
+    except Exception as e:
+        return "error", f"{e}", None, []
+    return "rewritten", digest, hashlib.sha256(new_data).hexdigest(), entries
+
+def rules_shard(base_folder, rel_paths, rules, dry_run, snapshot_dir):
+    # Returns ({rel_path: result} for touched files, [[files, changes, seconds] per rule])
+    stats = [[0, 0, 0.0] for _ in rules]
+    results = {}
+    for rel_path in rel_paths:
+        result = apply_rules_to_file(base_folder, rel_path, rules, stats, dry_run, snapshot_dir)
+        if result is not None:
+            results[rel_path] = result
+    return results, stats
+
+def apply_patch_rules(rule_set, base_folder=None, dry_run=False, workers=None, progress_callback=None):
+    # Applies a rule set (path to a JSON/TOML file, or the already loaded dict) to base/ in one
+    # traversal. Manifest rules stream AndroidManifest.xml; delete, replace and resource rules
+    # share a single scandir walk, each file is read and written at most once. Every change goes
+    # to one journal session. Returns a report with per-rule files, changes and seconds.
+    if isinstance(rule_set, str):
+        rule_set = load_patch_rules(rule_set)
+    rules = compile_patch_rules(rule_set)
+    label = rule_set.get("name", "patch rules")
+    base_folder = base_folder or os.path.join(APK_PATCH_DIR, "base")
+    if not os.path.exists(base_folder):
+        print(f"[!] Base folder not found at: {base_folder}")
+        return None
 
+    started = time.perf_counter()
+    stats = [[0, 0, 0.0] for _ in rules]
+    journal = None if dry_run else ModificationJournal(f"rules {label}")
+    try:
+        # Manifest toggles first, all of them in one stream over the manifest
+        manifest_path = os.path.join(base_folder, "AndroidManifest.xml")
+        manifest_rules = [(idx, rule) for idx, rule in enumerate(rules) if rule["type"] == "manifest"]
+        if manifest_rules and os.path.exists(manifest_path):
+            before = None if dry_run else snapshot_file(manifest_path)
+            pass_started = time.perf_counter()
+            reports = patch_manifest(manifest_path, [(rule["keywords"], rule["enabled"], rule["tags"])
+                                                     for _, rule in manifest_rules], dry_run)
+            # The pass is shared, its time is split evenly over the manifest rules
+            seconds = (time.perf_counter() - pass_started) / len(manifest_rules)
+            for (idx, rule), report in zip(manifest_rules, reports or [None] * len(manifest_rules)):
+                changes = sum(1 for entry in (report or []) if entry["action"] != "unchanged")
+                stats[idx] = [1 if changes else 0, changes, seconds]
+                for entry in (report or []):
+                    if entry["action"] != "unchanged":
+                        print(f"[{rule['name']}] Line {entry['line']}: {entry['tag']} {entry['name']} -> enabled={entry['new']}")
+            if journal:
+                after = file_sha256(manifest_path)
+                if after != before:
+                    journal.snapshot(manifest_path, before, after)
+
+        tree_rules = [rule for rule in rules if rule["type"] != "manifest"]
+        if tree_rules:
+            rel_paths = list(scan_tree_stats(base_folder))
+            total_files = len(rel_paths)
+            if workers is None:
+                workers = SEARCH_WORKERS if total_files >= PARALLEL_SEARCH_MIN_FILES else 1
+            shards = split_into_shards(rel_paths, max(1, workers) * SEARCH_SHARDS_PER_WORKER)
+
+            def report_progress(done):
+                percent = int((done / total_files) * 100) if total_files else 100
+                sys.stdout.write(f"\rProgress: {percent}%")
+                sys.stdout.flush()
+                if progress_callback:
+                    progress_callback(percent)
+
+            def shard_results():
+                if workers <= 1:
+                    for shard in shards:
+                        yield shard, rules_shard(base_folder, shard, rules, dry_run, SNAPSHOT_DIR)
+                    return
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = [executor.submit(rules_shard, base_folder, shard, rules, dry_run, SNAPSHOT_DIR) for shard in shards]
+                    for shard, future in zip(shards, futures):
+                        yield shard, future.result()
+
+            done = 0
+            for shard, (results, shard_stats) in shard_results():
+                for idx, (files, changes, seconds) in enumerate(shard_stats):
+                    if rules[idx]["type"] != "manifest":
+                        stats[idx][0] += files
+                        stats[idx][1] += changes
+                        stats[idx][2] += seconds
+                for rel_path, (action, digest, after_digest, entries) in results.items():
+                    file_path = os.path.join(base_folder, rel_path)
+                    if action == "error":
+                        print(f"\n[!] Failed to patch {file_path} - {digest}")
+                    elif journal and action == "deleted":
+                        journal.deleted_file(file_path, digest)
+                    elif journal:
+                        journal.snapshot(file_path, digest, after_digest)
+                        journal.replaced_lines(entries)
+                done += len(shard)
+                report_progress(done)
+            print()
+    finally:
+        if journal:
+            journal.close()
+
+    total_seconds = time.perf_counter() - started
+    print(f"\n=== Patch rules: {label}{' (dry run)' if dry_run else ''} ===\n")
+    print(f"{'Rule':<40}{'Type':<10}{'Files':>8}{'Changes':>10}{'Seconds':>10}")
+    report = []
+    for rule, (files, changes, seconds) in zip(rules, stats):
+        print(f"{rule['name'][:39]:<40}{rule['type']:<10}{files:>8}{changes:>10}{seconds:>10.3f}")
+        report.append({"name": rule["name"], "type": rule["type"], "files": files, "changes": changes, "seconds": round(seconds, 4)})
+    print(f"\n[✓] Done in {total_seconds:.2f}s")
+
+    if not dry_run and any(entry["changes"] for entry in report):
+        clear_search_cache()
+        print(f"[✓] Changes logged to {JOURNAL_FILE} (session {journal.session_id})")
+        # Re-index only the files whose mtime or size changed
+        if os.path.exists(SEARCH_INDEX_FILE):
+            update_search_index(base_folder)
+    return {"name": label, "dry_run": dry_run, "seconds": round(total_seconds, 4), "rules": report,
+            "session_id": journal.session_id if journal and journal.count else None}
+
+def apply_patch_rules_menu():
+    rules_path = input("Path to the rule file (.json or .toml): ").strip().strip('"')
+    if not rules_path or not os.path.exists(rules_path):
+        print("[!] Rule file not found.")
+        return
+    dry_run = input("Dry run, only report what would change? (y/N): ").strip().lower() == "y"
+    try:
+        apply_patch_rules(rules_path, dry_run=dry_run)
+    except (ValueError, OSError) as e:
+        print(f"[!] Could not apply rules: {e}")
+
+# ---------- Headless command line ----------
+def run_stage(stages, name, func, *args, **kwargs):
+    # Runs one pipeline stage, records (name, seconds, ok); a None/False result counts as a failure
+    print(f"\n===== Stage: {name} =====")
+    started = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    except Exception as e:
+        print(f"[!] {name} failed: {e}")
+        result = None
+    ok = result is not None and result is not False
+    stages.append({"stage": name, "seconds": round(time.perf_counter() - started, 3), "ok": ok})
+    return result if ok else None
+
+def print_stage_timings(stages):
+    print("\n=== Stage timings ===\n")
+    for stage in stages:
+        status = "ok" if stage["ok"] else "FAILED"
+        print(f"{stage['stage']:<24}{stage['seconds']:>10.2f}s  {status}")
+    print(f"{'total':<24}{sum(stage['seconds'] for stage in stages):>10.2f}s")
+
+def clean_workspace_stage(stages, clean, keep):
+    # Headless cleanup: everything but dependencies/, cache/, the revert history and keep goes
+    if not clean:
+        return True
+    return run_stage(stages, "clean workspace", clear_old_apk_files, ask=False, keep=(*WORKSPACE_HISTORY, *keep)) is not None
+
+def run_pipeline(apk_path, rule_files=(), remove_ads_patch=False, split_paths=(), output_dir=None, sign=True,
+                 report_path=None, keep=(), recompress_level=None, clean=True):
+    # import -> unpack -> patches -> pack -> sign, no prompts. Returns True when every stage succeeded.
+    stages = []
+    ok = clean_workspace_stage(stages, clean, keep)
+    ok = ok and run_stage(stages, "import", import_Apk, apk_path, split_paths) is not None
+    if ok:
+        try:
+            profile, dex_names = plan_decode_profile(rule_files, remove_ads_patch)
+        except (OSError, ValueError) as e:
+            print(f"[!] Could not plan the decode from the rule files ({e}), decoding everything.")
+            profile, dex_names = "full", None
+    ok = ok and run_stage(stages, "unpack", unpack_Apk, "base.apk", profile, dex_names) is not None
+    if ok and remove_ads_patch:
+        ok = run_stage(stages, "patch: remove ads", remove_ads) is not None
+    for rule_file in rule_files:
+        if not ok:
+            break
+        ok = run_stage(stages, f"patch: {os.path.basename(rule_file)}", apply_patch_rules, rule_file) is not None
+    packed_apk = run_stage(stages, "pack", pack_Apk, os.path.join(APK_PATCH_DIR, "base"), align=False) if ok else None
+    ok = packed_apk is not None
+    ok = ok and run_stage(stages, "align", align_apk, packed_apk, recompress_level=recompress_level) is not None
+    return finish_pipeline(stages, ok, apk_path, output_dir, sign, report_path)
+
+def run_zip_patch(apk_path, replacements=None, removals=(), split_paths=(), output_dir=None, sign=True,
+                  report_path=None, keep=(), clean=True):
+    # import -> ZIP-level patch -> sign: asset/raw edits without apktool
+    stages = []
+    ok = clean_workspace_stage(stages, clean, keep)
+    ok = ok and run_stage(stages, "import", import_Apk, apk_path, split_paths) is not None
+    ok = ok and run_stage(stages, "zip patch", zip_patch_apk, os.path.join(APK_PATCH_DIR, "base.apk"), replacements, removals) is not None
+    return finish_pipeline(stages, ok, apk_path, output_dir, sign, report_path)
+
+def finish_pipeline(stages, ok, apk_path, output_dir, sign, report_path):
+    # Shared tail of run_pipeline/run_zip_patch: sign, copy the results out, report
+    if sign:
+        ok = ok and run_stage(stages, "sign", sign_Apk) is not None
+
+    if ok and output_dir:
+        source_dir = os.path.join(APK_PATCH_DIR, "signed") if sign else APK_PATCH_DIR
+        os.makedirs(output_dir, exist_ok=True)
+        for file in os.listdir(source_dir):
+            if file.endswith(".apk") and (sign or file.endswith("_patched.apk")):
+                method = stage_file(os.path.join(source_dir, file), os.path.join(output_dir, file), track=False)
+                print(f"[+] Copied {file} → {output_dir} ({method})")
+
+    print_stage_timings(stages)
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump({"apk": apk_path, "ok": ok, "stages": stages}, f, indent=4)
+    print("\n[✓] Pipeline completed." if ok else "\n[✖] Pipeline failed.")
+    return ok
+
+def available_memory_bytes():
+    # Free physical memory, or None when it cannot be told without extra packages
+    try:
+        if sys.platform == "win32":
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                            ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                            ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                            ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                            ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return status.ullAvailPhys
+            return None
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except Exception:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def batch_worker_count(job_count, jobs=None):
+    if jobs:
+        return max(1, min(jobs, job_count))
+    workers = os.cpu_count() or 1
+    memory = available_memory_bytes()
+    if memory is not None:
+        workers = min(workers, max(1, memory // BATCH_JOB_MEMORY))
+    return max(1, min(workers, job_count))
+
+def batch_job(apk_path, workspace, shared_dependencies_dir, shared_cache_dir, rule_files, remove_ads_patch,
+              output_dir, sign):
+    # Runs the whole pipeline in its own workspace with all output (apktool and java included) in pipeline.log.
+    global SEARCH_WORKERS
+    SEARCH_WORKERS = 1  # the batch pool already keeps every core busy
+    set_workspace(workspace, shared_dependencies_dir, shared_cache_dir)
+    log_path = os.path.join(workspace, "pipeline.log")
+    report_path = os.path.join(workspace, "pipeline.json")
+    started = time.perf_counter()
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_fds = (os.dup(1), os.dup(2))
+    try:
+        with open(log_path, "w", encoding="utf-8") as log:
+            os.dup2(log.fileno(), 1)
+            os.dup2(log.fileno(), 2)
+            try:
+                ok = run_pipeline(apk_path, rule_files, remove_ads_patch, output_dir=output_dir, sign=sign,
+                                  report_path=report_path, keep=("pipeline.log",))
+            except Exception as e:
+                print(f"[!] {e}")
+                ok = False
+            sys.stdout.flush()
+            sys.stderr.flush()
+    finally:
+        os.dup2(saved_fds[0], 1)
+        os.dup2(saved_fds[1], 2)
+        os.close(saved_fds[0])
+        os.close(saved_fds[1])
+
+    stages = []
+    if os.path.exists(report_path):
+        with open(report_path, "r", encoding="utf-8") as f:
+            stages = json.load(f)["stages"]
+    failed = next((stage["stage"] for stage in stages if not stage["ok"]), None)
+    return {"apk": apk_path, "ok": ok, "seconds": round(time.perf_counter() - started, 2),
+            "failed_stage": failed, "stages": stages, "log": log_path}
+
+def batch_process(apk_dir, rule_files=(), remove_ads_patch=False, output_dir=None, sign=True, jobs=None,
+                  report_path=None):
+    # Runs the pipeline for every APK in apk_dir, each in batch/<name>/, several at once.
+    # Returns True when every APK went through.
+    apk_paths = sorted(
+        os.path.join(apk_dir, f) for f in os.listdir(apk_dir)
+        if f.lower().endswith(".apk") and os.path.isfile(os.path.join(apk_dir, f))
+    )
+    if not apk_paths:
+        print(f"[!] No APK files found in {apk_dir}")
+        return False
+
+    batch_root = os.path.join(APK_PATCH_DIR, BATCH_DIR_NAME)
+    workspaces = []
+    used = set()
+    for apk_path in apk_paths:
+        name = os.path.splitext(os.path.basename(apk_path))[0]
+        while name.lower() in used:
+            name += "_"
+        used.add(name.lower())
+        workspaces.append(os.path.join(batch_root, name))
+    rule_files = [os.path.abspath(rule_file) for rule_file in rule_files]
+
+    workers = batch_worker_count(len(apk_paths), jobs)
+    print(f"\n[+] Processing {len(apk_paths)} APK(s) with {workers} parallel job(s)...")
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(batch_job, apk_path, workspace, dependencies_dir, CACHE_DIR, rule_files, remove_ads_patch,
+                            os.path.join(output_dir, os.path.basename(workspace)) if output_dir else None, sign): apk_path
+            for apk_path, workspace in zip(apk_paths, workspaces)
+        }
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"apk": futures[future], "ok": False, "seconds": 0.0, "failed_stage": f"crashed: {e}",
+                          "stages": [], "log": None}
+            results.append(result)
+            status = "[✓]" if result["ok"] else "[✖]"
+            print(f"{status} {os.path.basename(result['apk'])} ({result['seconds']:.1f}s)")
+
+    results.sort(key=lambda result: apk_paths.index(result["apk"]))
+    print("\n=== Batch summary ===\n")
+    print(f"{'APK':<40}{'Status':<10}{'Seconds':>10}  Failed stage / log")
+    for result in results:
+        status = "ok" if result["ok"] else "FAILED"
+        detail = "" if result["ok"] else f"{result['failed_stage'] or '-'}  {result['log'] or ''}"
+        print(f"{os.path.basename(result['apk'])[:39]:<40}{status:<10}{result['seconds']:>10.1f}  {detail}")
+    succeeded = sum(1 for result in results if result["ok"])
+    print(f"\n[✓] {succeeded}/{len(results)} APK(s) patched in {time.perf_counter() - started:.1f}s")
+
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump({"workers": workers, "results": results}, f, indent=4)
+    return succeeded == len(results)
+
+def cli(argv=None):
+    # Headless entry point: python PatchApk.py <command> ...; returns the process exit code
+    global USE_TOOL_HOST
+    parser = argparse.ArgumentParser(prog="PatchApk.py", description="Unpack, patch, rebuild and sign APKs without prompts.")
+    parser.add_argument("--workspace", help="Apk_Patch folder to work in (default: ~/Desktop/Apk_Patch)")
+    parser.add_argument("--tool-host", action="store_true", help="keep one warm JVM for apktool and the signer (JDK 11-23)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_cmd = commands.add_parser("run", help="empty the workspace, then import -> unpack -> patch -> pack -> sign in one go")
+    run_cmd.add_argument("apk", help="APK to patch")
+    run_cmd.add_argument("--split", action="append", default=[], help="split APK to sign alongside (repeatable)")
+    run_cmd.add_argument("--rules", action="append", default=[], help="patch rule file to apply (repeatable, in order)")
+    run_cmd.add_argument("--remove-ads", action="store_true", help="apply the built-in remove ads manifest patch")
+    run_cmd.add_argument("--no-sign", action="store_true", help="stop after pack")
+    run_cmd.add_argument("--output", help="copy the resulting APK(s) to this folder")
+    run_cmd.add_argument("--report", help="write stage timings as JSON to this file")
+    run_cmd.add_argument("--keep", action="append", default=[], metavar="NAME",
+                        help="workspace file or folder the cleanup leaves alone (repeatable); revert history is always kept")
+    run_cmd.add_argument("--no-clean", action="store_true", help="skip the workspace cleanup (old splits in it get signed too)")
+    run_cmd.add_argument("--recompress", type=int, choices=range(1, 10), metavar="LEVEL",
+                         help="re-deflate compressed entries at this zlib level (1-9) in the align stage")
+
+    batch_cmd = commands.add_parser("batch", help="run the pipeline for every APK in a folder, several at once")
+    batch_cmd.add_argument("apk_dir", help="folder with the APKs to patch")
+    batch_cmd.add_argument("--jobs", type=int, help="parallel jobs (default: by CPU count and free memory)")
+    batch_cmd.add_argument("--rules", action="append", default=[], help="patch rule file to apply (repeatable, in order)")
+    batch_cmd.add_argument("--remove-ads", action="store_true", help="apply the built-in remove ads manifest patch")
+    batch_cmd.add_argument("--no-sign", action="store_true", help="stop after pack")
+    batch_cmd.add_argument("--output", help="copy each result to <output>/<apk name>/")
+    batch_cmd.add_argument("--report", help="write the batch summary as JSON to this file")
+
+    zip_cmd = commands.add_parser("zip-patch", help="replace/remove entries of an APK without decoding it, then sign")
+    zip_cmd.add_argument("apk", help="APK to patch")
+    zip_cmd.add_argument("--put", action="append", default=[], metavar="ENTRY=FILE", help="replace or add an entry (repeatable)")
+    zip_cmd.add_argument("--remove", action="append", default=[], metavar="GLOB", help="remove matching entries (repeatable)")
+    zip_cmd.add_argument("--split", action="append", default=[], help="split APK to sign alongside (repeatable)")
+    zip_cmd.add_argument("--no-sign", action="store_true", help="stop after patching")
+    zip_cmd.add_argument("--output", help="copy the resulting APK(s) to this folder")
+    zip_cmd.add_argument("--report", help="write stage timings as JSON to this file")
+    zip_cmd.add_argument("--keep", action="append", default=[], metavar="NAME",
+                        help="workspace file or folder the cleanup leaves alone (repeatable); revert history is always kept")
+    zip_cmd.add_argument("--no-clean", action="store_true", help="skip the workspace cleanup (old splits in it get signed too)")
+
+    commands.add_parser("deps", help="download missing tools into dependencies/")
+    unpack_cmd = commands.add_parser("unpack", help="import an APK as base.apk and decode it")
+    unpack_cmd.add_argument("apk")
+    unpack_cmd.add_argument("--profile", choices=sorted(DECODE_PROFILES), default="full",
+                            help="decode only what the planned patches need; the rest stays raw and is reused at pack")
+    unpack_cmd.add_argument("--dex", action="append", default=[], help="with --profile sources: only decode this dex (repeatable)")
+    pack_cmd = commands.add_parser("pack", help="rebuild base/ into base_patched.apk")
+    pack_cmd.add_argument("--full", action="store_true", help="rebuild every dex and the resources, ignore what changed since unpack")
+    pack_cmd.add_argument("--no-align", action="store_true", help="leave the rebuilt APK as apktool wrote it")
+    commands.add_parser("sign", help="sign the rebuilt APK and any split APKs")
+
+    patch_cmd = commands.add_parser("patch", help="apply patch rule files to base/")
+    patch_cmd.add_argument("rules", nargs="*")
+    patch_cmd.add_argument("--remove-ads", action="store_true")
+    patch_cmd.add_argument("--restore-ads", action="store_true")
+    patch_cmd.add_argument("--dry-run", action="store_true")
+
+    search_cmd = commands.add_parser("search", help="search base/ and print JSON results")
+    search_cmd.add_argument("keywords", help="keywords separated by | (regex patterns by || with --regex)")
+    search_cmd.add_argument("--regex", action="store_true")
+    search_cmd.add_argument("--whole-token", action="store_true")
+    search_cmd.add_argument("--max-results", type=int)
+
+    cache_cmd = commands.add_parser("cache", help="list the decoded APK cache, optionally prune it")
+    cache_cmd.add_argument("--prune", metavar="SIZE", help="evict least recently used trees until the cache fits in SIZE (e.g. 5G)")
+    cache_cmd.add_argument("--clear", action="store_true", help="remove every cached tree and signed APK")
+
+    revert_cmd = commands.add_parser("revert", help="revert journaled modifications")
+    revert_cmd.add_argument("--session", type=int)
+    revert_cmd.add_argument("--file")
+
+    args = parser.parse_args(argv)
+    if args.tool_host:
+        USE_TOOL_HOST = True
+        os.environ["APK_PATCH_TOOL_HOST"] = "1"  # batch workers read it at import
+    if args.workspace:
+        set_workspace(args.workspace)
 
+    try:
+        if args.command == "run":
+            ok = run_pipeline(args.apk, args.rules, args.remove_ads, args.split, args.output, not args.no_sign, args.report,
+                              keep=args.keep, recompress_level=args.recompress, clean=not args.no_clean)
+        elif args.command == "batch":
+            ok = batch_process(args.apk_dir, args.rules, args.remove_ads, args.output, not args.no_sign, args.jobs, args.report)
+        elif args.command == "zip-patch":
+            ok = run_zip_patch(args.apk, parse_zip_replacements(args.put), args.remove, args.split, args.output,
+                               not args.no_sign, args.report, keep=args.keep, clean=not args.no_clean)
+        elif args.command == "deps":
+            check_dependency()
+            ok = True
+        elif args.command == "unpack":
+            ok = import_Apk(args.apk) is not None and unpack_Apk("base.apk", args.profile, args.dex) is not None
+        elif args.command == "pack":
+            ok = pack_Apk(os.path.join(APK_PATCH_DIR, "base"), incremental=not args.full, align=not args.no_align) is not None
+        elif args.command == "sign":
+            ok = sign_Apk() is not None
+        elif args.command == "patch":
+            ok = True
+            if args.remove_ads:
+                ok = remove_ads() is not None
+            if ok and args.restore_ads:
+                ok = restore_ads() is not None
+            for rule_file in args.rules:
+                ok = ok and apply_patch_rules(rule_file, dry_run=args.dry_run) is not None
+        elif args.command == "search":
+            if args.regex:
+                keywords = [k.strip() for k in args.keywords.split("||") if k.strip()]
+            else:
+                keywords = [' '.join(k.strip().lower().split()) for k in args.keywords.split("|") if k.strip()]
+            # Progress goes to stderr, stdout only carries the JSON
+            with redirect_stdout(sys.stderr):
+                results = search(as_json=True, regex=args.regex, whole_token=args.whole_token,
+                                 max_results=args.max_results, keywords=keywords)
+            print(json.dumps(results, indent=2))
+            ok = True
+        elif args.command == "cache":
+            if args.clear or args.prune:
+                removed, freed = prune_decode_cache(0 if args.clear else parse_size(args.prune))
+                print(f"[+] Removed {removed} tree(s), freed {format_size(freed)}.")
+            if args.clear:
+                removed, freed = prune_signed_cache(0)
+                print(f"[+] Removed {removed} signed APK(s), freed {format_size(freed)}.")
+            print_decode_cache()
+            ok = True
+        elif args.command == "revert":
+            revert_modifications(session_id=args.session, file_path=args.file)
+            ok = True
+    except (ValueError, OSError, re.error, zipfile.BadZipFile) as e:
+        print(f"[!] {e}")
+        ok = False
+    return 0 if ok else 1
 
 def main():
     print("\n=== APK Patcher ===\n")
@@ -1086,6 +4666,11 @@ def main():
     print("[+] 10. Revert deleted/replaced modifications")
     print("[+] 11. Patch APK (Remove Ads)")
     print("[+] 12. Patch APK (Restore Ads)")
+    print("[+] 13. Regex search in base folder")
+    print("[+] 14. Smali symbol lookup (callers, const-strings, fields, classes)")
+    print("[+] 15. Apply patch rule file")
+    print("[+] 16. Inspect/prune decoded APK cache")
+    print("[+] 17. Replace/remove files inside the APK (no unpack)")
     print("[+] 0. Back to Mainmenu")
 
     choice = input("\nEnter the number of your choice: ").strip()
@@ -1109,14 +4694,30 @@ def main():
     elif choice == "9":
         delete_or_replace_keywords()
     elif choice == "10":
-        revert_modifications()
+        revert_menu()
     elif choice == "11":
         remove_ads()
     elif choice == "12":
         restore_ads()
+    elif choice == "13":
+        whole_token = input("Match whole smali identifiers only? (y/N): ").strip().lower() == "y"
+        search(regex=True, whole_token=whole_token)
+    elif choice == "14":
+        lookup_symbols()
+    elif choice == "15":
+        apply_patch_rules_menu()
+    elif choice == "16":
+        decode_cache_menu()
+    elif choice == "17":
+        zip_patch_menu()
     else:
         return
     
 if __name__ == "__main__":
-    main()
-    PORE()
+    if len(sys.argv) > 1:
+        sys.exit(cli())
+    # Interactive menu, looped rather than recursed so long sessions do not grow the stack
+    while True:
+        main()
+        if not PORE():
+            break
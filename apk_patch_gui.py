@@ -16,11 +16,20 @@ APK_PATCH_DIR = os.path.join(os.path.expanduser("~"), "Desktop", "Apk_Patch")
 search_mode = False
 file_types = ['.SMALI', '.XML']
 file_type_vars = {}
+search_options = ['Regex', 'Whole token']
+search_option_vars = {}
+SEARCH_MAX_RESULTS = 20000  # keeps the Listbox responsive on very broad keywords
+SEARCH_MAX_PER_FILE = 200
+SEARCH_FLUSH_INTERVAL = 0.2  # seconds between Listbox updates while a search streams in
 
 # Helper Functions
 def get_selected_file_types():
     return [ft.lower() for ft, var in file_type_vars.items() if var.get()]
 
+def get_search_option(name):
+    var = search_option_vars.get(name)
+    return bool(var and var.get())
+
 # ---------- UI helpers ----------
 class TextRedirector:
     def __init__(self, text_widget):
@@ -130,6 +139,12 @@ def create_gui():
         var = tk.BooleanVar()
         tk.Checkbutton(file_types_container, text=ft, variable=var).grid(row=0, column=i, padx=5, pady=2)
         file_type_vars[ft] = var
+
+    # Search mode checkboxes on a second row
+    for i, option in enumerate(search_options):
+        var = tk.BooleanVar()
+        tk.Checkbutton(file_types_container, text=option, variable=var).grid(row=1, column=i, padx=5, pady=2)
+        search_option_vars[option] = var
     
     # Buttons container with spacing and uniform button size
     buttons_container = ttk.Frame(left_frame)
@@ -243,28 +258,40 @@ def create_gui():
         global search_mode
         search_mode = value
 
-    def create_message_box(results):
-        print("\n\n=== Matches Found ===")
-        
-        # Create a new popup window
-        popup = tk.Toplevel(root)
-        popup.title("Goto File")
-        popup.geometry("600x300")
-       
-         # Label
-        tk.Label(popup, text="Click a file path to open:", font=("Arial", 12, "bold")).pack(pady=5)
-
-        # Listbox for paths (non-editable)
-        listbox = tk.Listbox(popup, font=("Consolas", 10), selectmode=tk.SINGLE)
-        listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
-
-        # Populate listbox with path values
-        for item in results:
-            print(f"{item['id']}. {item['keyword']} found in line {item['line_num']} on {item['file']} under {item['folder']}")
-            listbox.insert(tk.END, f"{item['id']}. {item['path']} (line {item['line_num']})")
+    def create_message_box():
+        # Builds the popup on the main thread and returns add_results(items), callable from any thread
+        results = []
+        widgets = {}
+
+        def build():
+            # Create a new popup window
+            popup = tk.Toplevel(root)
+            popup.title("Goto File")
+            popup.geometry("600x300")
+           
+             # Label
+            tk.Label(popup, text="Click a file path to open:", font=("Arial", 12, "bold")).pack(pady=5)
+
+            # Listbox for paths (non-editable)
+            listbox = tk.Listbox(popup, font=("Consolas", 10), selectmode=tk.SINGLE)
+            listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+            widgets["listbox"] = listbox
+
+            listbox.bind("<Double-1>", open_selected)
+
+            # Close button
+            tk.Button(popup, text="Close", command=popup.destroy).pack(pady=5)
+
+        def insert(items):
+            results.extend(items)
+            try:
+                widgets["listbox"].insert(tk.END, *[f"{item['id']}. {item['path']} (line {item['line_num']})" for item in items])
+            except tk.TclError:
+                pass  # popup closed while results were still streaming in
 
         # Function to open file when double-clicked
         def open_selected(event):
+            listbox = widgets["listbox"]
             selection = listbox.curselection()
             if not selection:
                 print("DEBUG: No selection")
@@ -309,23 +336,62 @@ def create_gui():
             except Exception as e:
                 messagebox.showerror("Error", f"Could not open file:\n{e}")
 
-        listbox.bind("<Double-1>", open_selected)
+        root.after(0, build)
+
+        def add_results(items):
+            for item in items:
+                print(f"{item['id']}. {item['keyword']} found in line {item['line_num']} on {item['file']} under {item['folder']}")
+            root.after(0, insert, list(items))
 
-        # Close button
-        tk.Button(popup, text="Close", command=popup.destroy).pack(pady=5)
+        return add_results
 
     def search_with_flag():
+        import time
         try:
             set_search_mode(True)
-            results = apk_mod.search(
+            print("\n=== Keyword Search in Base Folder ===\n")
+            regex = get_search_option('Regex')
+            whole_token = get_search_option('Whole token')
+            keywords = apk_mod.prompt_search_keywords(regex)
+            if not keywords:
+                return
+
+            # Results stream into the popup in small batches instead of one huge insert at the end
+            add_results = None
+            batch = []
+            per_file = {}
+            last_flush = time.monotonic()
+            for item in apk_mod.iter_search(
+                keywords,
                 get_selected_file_types(),
                 progress_callback=lambda p: root.after(0, update_progress, p),
-                as_json=True
-            )
-            if  results:
-                create_message_box(results)
-            else:
+                max_results=SEARCH_MAX_RESULTS,
+                max_per_file=SEARCH_MAX_PER_FILE,
+                regex=regex,
+                whole_token=whole_token
+            ):
+                batch.append(item)
+                per_file[item['path']] = per_file.get(item['path'], 0) + 1
+                if time.monotonic() - last_flush >= SEARCH_FLUSH_INTERVAL:
+                    if add_results is None:
+                        print("\n\n=== Matches Found ===")
+                        add_results = create_message_box()
+                    add_results(batch)
+                    batch = []
+                    last_flush = time.monotonic()
+
+            if batch:
+                if add_results is None:
+                    print("\n\n=== Matches Found ===")
+                    add_results = create_message_box()
+                add_results(batch)
+            if add_results is None:
                 log_box.insert(tk.END, "No Words Found")
+            # iter_search reports the total limit itself, the per-file one is only visible from here
+            capped = sum(1 for count in per_file.values() if count >= SEARCH_MAX_PER_FILE)
+            if capped:
+                print(f"\n[!] {capped} file(s) reached the limit of {SEARCH_MAX_PER_FILE} matches per file, "
+                      "later matches in them are not listed.")
         finally:
             set_search_mode(False)
 
@@ -349,6 +415,7 @@ def create_gui():
         ("Install Signed APK via ADB", apk_mod.install_Apk),
         ("Clear old APK files", apk_mod.clear_old_apk_files),
         ("Search in base folder", search_with_flag),
+        ("Smali symbol lookup", apk_mod.lookup_symbols),
         ("Delete/Replace keywords", apk_mod.delete_or_replace_keywords),
         ("Revert modifications", apk_mod.revert_modifications),
         ("Remove ads patch", apk_mod.remove_ads),
@@ -0,0 +1,311 @@
+# benchmark.py
+# Times the hot paths of PatchApk.py on synthetic decompiled-APK trees, fully offline.
+#
+#   python benchmark.py                          # default scales, results in benchmark_results.json
+#   python benchmark.py --smali 1000,10000 --output v2.json --compare v1.json
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import builtins
+import platform
+import tempfile
+import contextlib
+import multiprocessing
+
+# Words that make the generated smali look like a real app with ad SDKs mixed in
+SMALI_OPCODES = [
+    "move-result-object v0", "return-void", "const/4 v1, 0x0", "if-eqz v0, :cond_0",
+    "check-cast v0, Ljava/lang/String;", "new-instance v2, Ljava/lang/StringBuilder;",
+    "goto :goto_0", ":cond_0", "move-result v1", "return-object v0",
+]
+SMALI_INVOKES = [
+    "invoke-virtual {p0}, Landroid/app/Activity;->finish()V",
+    "invoke-static {v0}, Landroid/text/TextUtils;->isEmpty(Ljava/lang/CharSequence;)Z",
+    "invoke-direct {v2}, Ljava/lang/StringBuilder;-><init>()V",
+    "invoke-interface {v0}, Ljava/util/List;->size()I",
+]
+AD_INVOKES = [
+    "invoke-virtual {v0, v1}, Lcom/google/android/gms/ads/AdView;->loadAd(Lcom/google/android/gms/ads/AdRequest;)V",
+    "invoke-static {p0}, Lcom/unity3d/ads/UnityAds;->show(Landroid/app/Activity;)V",
+    "invoke-virtual {v0}, Lcom/applovin/mediation/ads/MaxInterstitialAd;->showAd()V",
+]
+AD_STRINGS = ["ca-app-pub-3940256099942544/1033173712", "interstitial_placement", "rewardedVideo"]
+COMPONENT_TAGS = ["activity", "service", "receiver", "provider"]
+AD_COMPONENTS = [
+    "com.google.android.gms.ads.AdActivity", "com.unity3d.ads.adunit.AdUnitActivity",
+    "com.applovin.adview.AppLovinInterstitialActivity", "com.ironsource.sdk.controller.InterstitialActivity",
+    "com.vungle.ads.internal.ui.VungleActivity", "com.google.android.gms.ads.RewardedAdService",
+]
+
+SEARCH_KEYWORDS = "admob|interstitial|unityads;->show|rewardedvideo"
+REPLACE_KEYWORD = "interstitial_placement"
+
+
+# ---------- Tree generator ----------
+def write_smali(path, class_name, rng, ad_ratio):
+    lines = [
+        f".class public L{class_name};",
+        ".super Ljava/lang/Object;",
+        f'.source "{class_name.rsplit("/", 1)[-1]}.java"',
+        "",
+    ]
+    for f in range(rng.randint(1, 6)):
+        lines.append(f".field private m{f}:Ljava/lang/String;")
+    for m in range(rng.randint(2, 12)):
+        lines.append("")
+        lines.append(f".method public method{m}(Ljava/lang/String;)V")
+        lines.append("    .locals 3")
+        for _ in range(rng.randint(5, 40)):
+            roll = rng.random()
+            if roll < ad_ratio:
+                lines.append("    " + rng.choice(AD_INVOKES))
+            elif roll < ad_ratio * 2:
+                lines.append(f'    const-string v0, "{rng.choice(AD_STRINGS)}"')
+            elif roll < 0.4:
+                lines.append("    " + rng.choice(SMALI_INVOKES))
+            elif roll < 0.5:
+                lines.append(f'    const-string v0, "text_{rng.randrange(100000)}"')
+            else:
+                lines.append("    " + rng.choice(SMALI_OPCODES))
+        lines.append("    return-void")
+        lines.append(".end method")
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def write_manifest(path, components, rng):
+    lines = [
+        '<?xml version="1.0" encoding="utf-8" standalone="no"?>',
+        '<manifest xmlns:android="http://schemas.android.com/apk/res/android" package="com.example.bench">',
+        "    <application android:label=\"@string/app_name\">",
+    ]
+    for i in range(components):
+        tag = rng.choice(COMPONENT_TAGS)
+        name = rng.choice(AD_COMPONENTS) + str(i) if rng.random() < 0.2 else f"com.example.bench.Component{i}"
+        enabled = rng.choice(["", ' android:enabled="true"', ' android:enabled="false"'])
+        lines.append(f'        <{tag} android:exported="false" android:name="{name}"{enabled}/>')
+    lines.append("    </application>")
+    lines.append("</manifest>")
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def generate_tree(apk_patch_dir, smali_files, xml_files, binary_files, binary_size_kb, manifest_components,
+                  ad_ratio=0.02, seed=1):
+    # Creates apk_patch_dir/base laid out like an apktool decode; returns (file count, total bytes)
+    rng = random.Random(seed)
+    base = os.path.join(apk_patch_dir, "base")
+    shutil.rmtree(base, ignore_errors=True)
+    os.makedirs(base)
+
+    dex_count = max(1, smali_files // 8000 + 1)
+    for i in range(smali_files):
+        smali_root = "smali" if i % dex_count == 0 else f"smali_classes{i % dex_count + 1}"
+        package = f"com/example/pkg{i % 97}/sub{i % 13}"
+        folder = os.path.join(base, smali_root, *package.split("/"))
+        os.makedirs(folder, exist_ok=True)
+        write_smali(os.path.join(folder, f"C{i}.smali"), f"{package}/C{i}", rng, ad_ratio)
+
+    for i in range(xml_files):
+        folder = os.path.join(base, "res", rng.choice(["layout", "values", "xml", "drawable"]))
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"res_{i}.xml"), "w", encoding="utf-8", newline="\n") as f:
+            f.write('<?xml version="1.0" encoding="utf-8"?>\n<resources>\n')
+            for j in range(rng.randint(5, 60)):
+                value = rng.choice(AD_STRINGS) if rng.random() < ad_ratio else f"value {i} {j}"
+                f.write(f'    <string name="s_{i}_{j}">{value}</string>\n')
+            f.write("</resources>\n")
+
+    binary_folders = [("res", "drawable-xxhdpi", ".png"), ("lib", "arm64-v8a", ".so"), ("assets", "data", ".bin")]
+    for i in range(binary_files):
+        top, sub, ext = binary_folders[i % len(binary_folders)]
+        folder = os.path.join(base, top, sub)
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"blob_{i}{ext}"), "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n\x00" + os.urandom(binary_size_kb * 1024))
+
+    write_manifest(os.path.join(base, "AndroidManifest.xml"), manifest_components, rng)
+
+    total_files = 0
+    total_bytes = 0
+    for root, _, files in os.walk(base):
+        for file in files:
+            total_files += 1
+            total_bytes += os.path.getsize(os.path.join(root, file))
+    return total_files, total_bytes
+
+
+# ---------- Operations ----------
+@contextlib.contextmanager
+def scripted_input(answers):
+    # PatchApk is prompt driven, feed it the answers and hide its output
+    answers = iter(answers)
+    old_input = builtins.input
+    old_stdout = sys.stdout
+    builtins.input = lambda prompt="": next(answers, "")
+    try:
+        with open(os.devnull, "w", encoding="utf-8") as devnull:
+            sys.stdout = devnull
+            yield
+    finally:
+        builtins.input = old_input
+        sys.stdout = old_stdout
+
+
+def run_operation(apk_patch_dir, operation):
+    import PatchApk as apk_mod
+    apk_mod.set_workspace(apk_patch_dir)
+
+    if operation == "search_serial":
+        with scripted_input([SEARCH_KEYWORDS]):
+            apk_mod.search(as_json=True, workers=1)
+    elif operation == "search_parallel":
+        with scripted_input([SEARCH_KEYWORDS]):
+            apk_mod.search(as_json=True, workers=apk_mod.SEARCH_WORKERS)
+    elif operation == "index_build":
+        with scripted_input([]):
+            apk_mod.update_search_index(rebuild=True)
+    elif operation == "search_indexed":
+        with scripted_input([SEARCH_KEYWORDS]):
+            apk_mod.search(as_json=True)
+    elif operation == "delete_or_replace_keywords":
+        with scripted_input(["2", REPLACE_KEYWORD, "bench_placement", "yes"]):
+            apk_mod.delete_or_replace_keywords()
+    elif operation == "revert_modifications":
+        with scripted_input([]):
+            apk_mod.revert_modifications()
+    elif operation == "remove_ads":
+        with scripted_input([]):
+            apk_mod.remove_ads()
+    elif operation == "restore_ads":
+        with scripted_input([]):
+            apk_mod.restore_ads()
+    else:
+        raise ValueError(f"Unknown operation: {operation}")
+
+
+def operation_child(apk_patch_dir, operation, queue):
+    # Runs in a fresh interpreter so peak RSS belongs to this operation only
+    import resource
+    started = time.perf_counter()
+    error = None
+    try:
+        run_operation(apk_patch_dir, operation)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - started
+    # Kilobytes on Linux. Pool workers have all been joined by now; RUSAGE_CHILDREN only gives the
+    # largest single worker, not their sum, so it is reported next to the parent rather than added
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    worker_peak_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    queue.put({"seconds": elapsed, "peak_rss_mb": peak_kb / 1024, "worker_peak_rss_mb": worker_peak_kb / 1024,
+               "error": error})
+
+
+OPERATIONS = [
+    "search_serial", "search_parallel", "index_build", "search_indexed",
+    "delete_or_replace_keywords", "revert_modifications", "remove_ads", "restore_ads",
+]
+
+
+def time_operation(apk_patch_dir, operation):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=operation_child, args=(apk_patch_dir, operation, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+# ---------- Reporting ----------
+def compare_results(results, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["scale"], r["operation"]): r for r in json.load(f)["results"]}
+    print(f"\n=== Compared with {baseline_path} ===\n")
+    print(f"{'scale':>8}  {'operation':<28}{'before':>10}{'after':>10}{'change':>9}")
+    for r in results:
+        old = baseline.get((r["scale"], r["operation"]))
+        if not old or not old["seconds"]:
+            continue
+        change = (r["seconds"] - old["seconds"]) / old["seconds"] * 100
+        flag = "  <-- slower" if change > 10 else ""
+        print(f"{r['scale']:>8}  {r['operation']:<28}{old['seconds']:>9.3f}s{r['seconds']:>9.3f}s{change:>+8.1f}%{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PatchApk.py on synthetic decompiled APK trees.")
+    parser.add_argument("--smali", default="1000,5000,20000", help="comma separated smali file counts, one run per scale")
+    parser.add_argument("--xml-per-smali", type=float, default=0.1, help="XML resource files per smali file")
+    parser.add_argument("--binary-per-smali", type=float, default=0.05, help="binary assets per smali file")
+    parser.add_argument("--binary-size-kb", type=int, default=64)
+    parser.add_argument("--manifest-components", type=int, default=2000)
+    parser.add_argument("--operations", default=",".join(OPERATIONS))
+    parser.add_argument("--workdir", help="where trees are generated (default: a temp folder, removed afterwards)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    operations = [op.strip() for op in args.operations.split(",") if op.strip()]
+    workdir = args.workdir or tempfile.mkdtemp(prefix="apkpatch_bench_")
+    results = []
+    try:
+        for scale in [int(n) for n in args.smali.split(",") if n.strip()]:
+            apk_patch_dir = os.path.join(workdir, f"scale_{scale}")
+            print(f"\n[+] Generating tree with {scale} smali files in {apk_patch_dir}...")
+            started = time.perf_counter()
+            total_files, total_bytes = generate_tree(
+                apk_patch_dir,
+                smali_files=scale,
+                xml_files=int(scale * args.xml_per_smali),
+                binary_files=int(scale * args.binary_per_smali),
+                binary_size_kb=args.binary_size_kb,
+                manifest_components=args.manifest_components,
+            )
+            print(f"    {total_files} files, {total_bytes / (1024 * 1024):.1f} MB in {time.perf_counter() - started:.1f}s")
+
+            for operation in operations:
+                timing = time_operation(apk_patch_dir, operation)
+                seconds = timing["seconds"]
+                entry = {
+                    "scale": scale,
+                    "operation": operation,
+                    "files": total_files,
+                    "bytes": total_bytes,
+                    "seconds": round(seconds, 4),
+                    "files_per_s": round(total_files / seconds, 1) if seconds else None,
+                    "mb_per_s": round(total_bytes / (1024 * 1024) / seconds, 2) if seconds else None,
+                    "peak_rss_mb": round(timing["peak_rss_mb"], 1),
+                    "worker_peak_rss_mb": round(timing["worker_peak_rss_mb"], 1),
+                    "error": timing["error"],
+                }
+                results.append(entry)
+                status = f"[!] {entry['error']}" if entry["error"] else ""
+                print(f"    {operation:<28}{seconds:>8.3f}s {entry['files_per_s'] or 0:>10.0f} files/s "
+                      f"{entry['mb_per_s'] or 0:>8.1f} MB/s {entry['peak_rss_mb']:>8.1f} MB RSS "
+                      f"{entry['worker_peak_rss_mb']:>8.1f} MB worker RSS {status}")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"\n[✓] Results saved to {args.output}")
+
+    if args.compare:
+        compare_results(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# PatchApk creates its workspace under ~/Desktop at import, keep that out of the real home folder
+os.environ["HOME"] = os.environ["USERPROFILE"] = tempfile.mkdtemp(prefix="apk_patch_home_")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PatchApk  # noqa: E402
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    # A fresh Apk_Patch folder per test; returns the module with every workspace path pointing into it
+    PatchApk.set_workspace(str(tmp_path / "Apk_Patch"))
+    os.makedirs(PatchApk.dependencies_dir, exist_ok=True)
+    return PatchApk
@@ -0,0 +1,83 @@
+import json
+import os
+import zipfile
+
+
+def make_apk(path, dex=b"dex"):
+    with zipfile.ZipFile(path, "w") as apk:
+        apk.writestr("AndroidManifest.xml", b"manifest")
+        apk.writestr("classes.dex", dex)
+    return str(path)
+
+
+def log_session(workspace):
+    target = os.path.join(workspace.APK_PATCH_DIR, "base", "a.smali")
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, "w", encoding="utf-8") as f:
+        f.write("old\n")
+    with workspace.ModificationJournal("test") as journal:
+        journal.deleted_file(target, workspace.snapshot_file(target))
+    return target
+
+
+def test_history_kept_for_same_apk_and_dropped_for_another(workspace, tmp_path):
+    apk = make_apk(tmp_path / "a.apk")
+    workspace.import_Apk(apk)
+    log_session(workspace)
+    assert len(workspace.list_journal_sessions()) == 1
+
+    workspace.import_Apk(apk)
+    assert len(workspace.list_journal_sessions()) == 1
+
+    workspace.import_Apk(make_apk(tmp_path / "b.apk", b"other dex"))
+    assert workspace.list_journal_sessions() == []
+    assert not os.path.exists(workspace.SNAPSHOT_DIR)
+
+
+def test_search_command_prints_only_json(workspace, capsys):
+    smali = os.path.join(workspace.APK_PATCH_DIR, "base", "smali", "a")
+    os.makedirs(smali)
+    with open(os.path.join(smali, "Ad.smali"), "w", encoding="utf-8") as f:
+        f.write(".class La/Ad;\n    invoke-static {}, La/Ad;->showInterstitial()V\n")
+
+    assert workspace.cli(["--workspace", workspace.APK_PATCH_DIR, "search", "showinterstitial"]) == 0
+    results = json.loads(capsys.readouterr().out)
+    assert [item["line_num"] for item in results] == [2]
+
+
+def journal_rows(workspace):
+    conn = workspace.open_journal()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_revert_is_appended_and_skips_lines_edited_later(workspace, capsys):
+    target = os.path.join(workspace.APK_PATCH_DIR, "base", "a.smali")
+    os.makedirs(os.path.dirname(target))
+    with open(target, "w", encoding="utf-8") as f:
+        f.write("const-string v0, \"ads\"\nconst-string v1, \"track\"\n")
+
+    for keyword, replacement in (("ads", "none"), ("none", "off"), ("track", "skip")):
+        count, entries, error, digests = workspace.replace_in_file(
+            target, workspace.KeywordMatcher([keyword]), replacement)
+        assert count == 1 and error is None
+        with workspace.ModificationJournal(keyword) as journal:
+            journal.replaced_lines(entries)
+            journal.snapshot(target, *digests)
+    first, second, third = [row[0] for row in workspace.list_journal_sessions()]
+    logged = journal_rows(workspace)
+
+    # The second session rewrote line 1 again, reverting the first must not undo that
+    workspace.revert_modifications(session_id=first)
+    assert "changed since session" in capsys.readouterr().out
+    with open(target, encoding="utf-8") as f:
+        assert f.read() == "const-string v0, \"off\"\nconst-string v1, \"skip\"\n"
+    assert journal_rows(workspace) == logged
+
+    workspace.revert_modifications(session_id=third)
+    with open(target, encoding="utf-8") as f:
+        assert f.read() == "const-string v0, \"off\"\nconst-string v1, \"track\"\n"
+    assert [row[0] for row in workspace.list_journal_sessions()] == [first, second]
+    assert journal_rows(workspace) > logged
@@ -0,0 +1,56 @@
+import json
+import os
+import zipfile
+
+import PatchApk
+
+
+def make_unpacked_apk(tmp_path):
+    apk_path = tmp_path / "base.apk"
+    with zipfile.ZipFile(apk_path, "w") as apk:
+        apk.writestr("AndroidManifest.xml", b"binary manifest")
+        apk.writestr("classes.dex", b"dex 1")
+        apk.writestr("classes2.dex", b"dex 2")
+        apk.writestr("resources.arsc", b"arsc")
+        apk.writestr("res/layout/main.xml", b"binary layout")
+    unpack_dir = tmp_path / "base"
+    for rel_path, text in (("apktool.yml", "version: 2.9.3\n"), ("AndroidManifest.xml", "<manifest/>\n"),
+                           ("res/values/strings.xml", "<resources/>\n"), ("smali/a/A.smali", ".class La/A;\n"),
+                           ("smali_classes2/b/B.smali", ".class Lb/B;\n")):
+        path = unpack_dir / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+    return str(unpack_dir), PatchApk.record_unpack_manifest(str(unpack_dir), str(apk_path))
+
+
+def build_outputs(unpack_dir):
+    build_apk = os.path.join(unpack_dir, "build", "apk")
+    with open(os.path.join(unpack_dir, "build", PatchApk.REUSED_OUTPUTS_FILE), encoding="utf-8") as f:
+        reused = json.load(f)
+    return sorted(os.listdir(build_apk)), reused
+
+
+def test_only_the_edited_dex_is_rebuilt(tmp_path):
+    unpack_dir, manifest = make_unpacked_apk(tmp_path)
+
+    assert PatchApk.prepare_incremental_build(unpack_dir, manifest)
+    assert build_outputs(unpack_dir) == (
+        ["AndroidManifest.xml", "classes.dex", "classes2.dex", "res", "resources.arsc"],
+        ["classes.dex", "classes2.dex", "resources"])
+
+    with open(os.path.join(unpack_dir, "smali_classes2", "b", "B.smali"), "a", encoding="utf-8") as f:
+        f.write(".source \"B.java\"\n")
+    assert PatchApk.prepare_incremental_build(unpack_dir, manifest)
+    # The seeded classes2.dex is stale and goes, apktool b rebuilds it
+    assert build_outputs(unpack_dir) == (
+        ["AndroidManifest.xml", "classes.dex", "res", "resources.arsc"], ["classes.dex", "resources"])
+
+    # What apktool built is not ours to delete on the next pack
+    rebuilt = os.path.join(unpack_dir, "build", "apk", "classes2.dex")
+    with open(rebuilt, "wb") as f:
+        f.write(b"rebuilt dex 2")
+    assert PatchApk.prepare_incremental_build(unpack_dir, manifest)
+    assert build_outputs(unpack_dir) == (
+        ["AndroidManifest.xml", "classes.dex", "classes2.dex", "res", "resources.arsc"], ["classes.dex", "resources"])
+    with open(rebuilt, "rb") as f:
+        assert f.read() == b"rebuilt dex 2"
@@ -0,0 +1,46 @@
+import pytest
+
+import PatchApk
+
+MANIFEST = (
+    '<?xml version="1.0" encoding="utf-8" standalone="no"?>\n'
+    '<manifest xmlns:android="http://schemas.android.com/apk/res/android" package="com.game">\n'
+    '    <application android:label="Game">\n'
+    '        <activity android:name="com.google.android.gms.ads.AdActivity" android:exported="false"/>\n'
+    '        <service android:enabled="true" android:name="com.ads.SyncService"/>\n'
+    '        <!-- <receiver android:name="com.ads.Commented"/> -->\n'
+    '        <receiver\n            android:name="com.game.BootReceiver">\n        </receiver>\n'
+    '    </application>\n'
+    '</manifest>\n'
+)
+
+EXPECTED = MANIFEST.replace(
+    'AdActivity"', 'AdActivity" android:enabled="false"').replace(
+    'android:enabled="true" android:name="com.ads.SyncService"', 'android:enabled="false" android:name="com.ads.SyncService"')
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, PatchApk.MANIFEST_CHUNK_SIZE])
+def test_manifest_patch_does_not_depend_on_chunk_size(tmp_path, monkeypatch, chunk_size):
+    # Tags split across chunk boundaries must be rewritten exactly like in one read
+    monkeypatch.setattr(PatchApk, "MANIFEST_CHUNK_SIZE", chunk_size)
+    manifest = tmp_path / "AndroidManifest.xml"
+    manifest.write_text(MANIFEST, encoding="utf-8")
+
+    report = PatchApk.patch_manifest_components(str(manifest), ["ads"], enabled=False)
+    assert [(entry["line"], entry["action"]) for entry in report] == [(4, "added"), (5, "changed")]
+    assert manifest.read_text(encoding="utf-8") == EXPECTED
+
+
+def test_manifest_toggles_share_one_pass_and_last_one_wins(tmp_path):
+    manifest = tmp_path / "AndroidManifest.xml"
+    manifest.write_text(MANIFEST, encoding="utf-8")
+
+    reports = PatchApk.patch_manifest(str(manifest), [
+        (["ads"], False, PatchApk.MANIFEST_COMPONENT_TAGS),
+        (["syncservice", "bootreceiver"], True, ("service",)),
+    ])
+    assert [entry["action"] for entry in reports[0]] == ["added", "changed"]
+    assert [(entry["name"], entry["old"], entry["action"]) for entry in reports[1]] == [
+        ("com.ads.SyncService", "false", "changed")]
+    assert manifest.read_text(encoding="utf-8") == EXPECTED.replace(
+        'android:enabled="false" android:name="com.ads.SyncService"', 'android:enabled="true" android:name="com.ads.SyncService"')
@@ -0,0 +1,59 @@
+import os
+
+import PatchApk
+
+
+def resource_rule(**extra):
+    rule = {"type": "resource", "resource_name": "admob_app_id", "value": "none"}
+    rule.update(extra)
+    return PatchApk.compile_patch_rules({"rules": [rule]})[0]
+
+
+def apply(rule, text):
+    return rule["pattern"].subn(rule["replacement"], text)
+
+
+def test_resource_rule_rewrites_value():
+    text, count = apply(resource_rule(), '<string name="admob_app_id">ca-app-pub-1/2</string>')
+    assert count == 1
+    assert text == '<string name="admob_app_id">none</string>'
+
+
+def test_resource_rule_self_closing_keeps_next_resource():
+    # apktool writes empty strings self-closing; the lazy match must not run on into app_name
+    source = '<string name="admob_app_id" />\n<string name="app_name">Game</string>\n'
+    text, count = apply(resource_rule(), source)
+    assert count == 1
+    assert text == '<string name="admob_app_id">none</string>\n<string name="app_name">Game</string>\n'
+
+
+def test_resource_rule_skips_other_types_and_names():
+    source = ('<string-array name="admob_app_id"><item>x</item></string-array>\n'
+              '<string name="admob_app_id_2">keep</string>\n'
+              '<string translatable="false" name="admob_app_id">a/b</string>\n')
+    text, count = apply(resource_rule(value="<&>"), source)
+    assert count == 1
+    assert text.splitlines()[:2] == source.splitlines()[:2]
+    assert text.splitlines()[2] == '<string translatable="false" name="admob_app_id">&lt;&amp;&gt;</string>'
+
+
+def test_resource_rule_through_apply_patch_rules(workspace, tmp_path):
+    values = os.path.join(workspace.APK_PATCH_DIR, "base", "res", "values")
+    os.makedirs(values)
+    strings = os.path.join(values, "strings.xml")
+    with open(strings, "w", encoding="utf-8") as f:
+        f.write('<resources>\n    <string name="admob_app_id" />\n    <string name="app_name">Game</string>\n</resources>\n')
+    rule_file = tmp_path / "rules.json"
+    rule_file.write_text('{"rules": [{"type": "resource", "resource_name": "admob_app_id", "value": ""}]}')
+
+    assert workspace.apply_patch_rules(str(rule_file)) is not None
+    with open(strings, encoding="utf-8") as f:
+        assert '<string name="app_name">Game</string>' in f.read()
+
+
+def test_manifest_patches_plan_the_resources_decode(tmp_path):
+    # apktool -s decodes manifest and resources together, one profile means one decode cache entry
+    rule_file = tmp_path / "rules.json"
+    rule_file.write_text('{"rules": [{"type": "manifest", "keywords": ["ads"], "enabled": false}]}')
+    assert PatchApk.plan_decode_profile(remove_ads_patch=True) == ("resources", None)
+    assert PatchApk.plan_decode_profile([str(rule_file)]) == ("resources", None)
@@ -0,0 +1,92 @@
+import json
+import os
+import re
+
+import pytest
+
+import PatchApk
+
+SMALI = (
+    ".method public show()V\n"
+    "    invoke-static {v0}, Lcom/ads/Ad;->show()V\n"
+    "    const-string v1, \"aa\"\n"
+    "    return-void\n"
+    ".end method\n"
+)
+
+
+def line_hits(matcher, text=SMALI):
+    return list(matcher.iter_line_matches(text.lower()))
+
+
+def test_regex_anchors_work_per_line():
+    matcher = PatchApk.RegexMatcher([r"^\s*invoke-static", r"void$"])
+    assert line_hits(matcher) == [(2, r"^\s*invoke-static"), (4, "void$")]
+
+
+def test_regex_backreference_in_merged_pattern():
+    matcher = PatchApk.RegexMatcher([r"(x)y", r'"(a)\1"'])
+    assert line_hits(matcher) == [(3, r'"(a)\1"')]
+
+
+def test_regex_too_many_groups_is_a_clear_error():
+    with pytest.raises(re.error, match="backreference"):
+        PatchApk.RegexMatcher(["(a)" * 60, "(b)" * 40 + r"\40"])
+
+
+def test_whole_token_keywords_match_words_anywhere_in_line():
+    # Same rule as KeywordMatcher: every word somewhere in the line, in any order
+    matcher = PatchApk.RegexMatcher(["v1 const-string"], regex=False, whole_token=True)
+    assert line_hits(matcher) == [(3, "v1 const-string")]
+    # invoke is only part of the invoke-static token
+    assert line_hits(PatchApk.RegexMatcher(["invoke"], regex=False, whole_token=True)) == []
+
+
+def test_search_index_is_stored_as_json_and_reloads(workspace):
+    base = os.path.join(workspace.APK_PATCH_DIR, "base")
+    os.makedirs(os.path.join(base, "smali"))
+    for name, text in (("Ad.smali", SMALI), ("Game.smali", ".class LGame;\n")):
+        with open(os.path.join(base, "smali", name), "w", encoding="utf-8") as f:
+            f.write(text)
+    workspace.update_search_index(base, rebuild=True, workers=1)
+
+    with open(workspace.SEARCH_INDEX_FILE, encoding="utf-8") as f:
+        assert json.load(f)["version"] == workspace.SEARCH_INDEX_VERSION
+    workspace.search_index_cache = None
+    index = workspace.load_search_index(base)
+    assert workspace.search_index_candidates(index, ["invoke-static"]) == {os.path.join("smali", "Ad.smali")}
+
+    # A tampered file is rebuilt, never trusted
+    with open(workspace.SEARCH_INDEX_FILE, "w", encoding="utf-8") as f:
+        f.write('{"version": 2, "root": "x", "byteorder": "little", "files": {"a": [5, 0, 0]}, "paths": [], "postings": {}}')
+    workspace.search_index_cache = None
+    assert workspace.load_search_index(base) is None
+
+
+@pytest.mark.parametrize("data", [
+    b"a\rshowads\nb\n",  # lone \r is a line break for the text path
+    b"a\r\nshowads\r\nb\r\n",
+    b"x\nshow\xffads\n",  # invalid UTF-8 is dropped by the text path
+    "x\nK ads show\n".encode("utf-8"),  # Kelvin sign lowercases to ASCII k
+    b"x\n" * 50 + b"SHOWADS\n",
+])
+@pytest.mark.parametrize("mmap_min_size", [PatchApk.MMAP_MIN_SIZE, 0])
+def test_byte_scan_agrees_with_text_scan(tmp_path, monkeypatch, data, mmap_min_size):
+    path = tmp_path / "a.smali"
+    path.write_bytes(data)
+    monkeypatch.setattr(PatchApk, "MMAP_MIN_SIZE", mmap_min_size)
+    monkeypatch.setattr(PatchApk, "MMAP_WINDOW_SIZE", 8)
+    matcher = PatchApk.KeywordMatcher(["showads", "k ads"])
+    byte_hits = PatchApk.scan_file_for_keywords(str(path), matcher)
+    monkeypatch.setattr(PatchApk, "USE_BYTE_SEARCH", False)
+    assert byte_hits == PatchApk.scan_file_for_keywords(str(path), matcher)
+
+
+def test_result_limit_is_reported_for_cached_results_too(workspace, capsys):
+    smali = os.path.join(workspace.APK_PATCH_DIR, "base", "smali")
+    os.makedirs(smali)
+    with open(os.path.join(smali, "Ad.smali"), "w", encoding="utf-8") as f:
+        f.write(SMALI)
+    for _ in range(2):
+        assert len(list(workspace.iter_search(["v0"], workers=1, max_results=1))) == 1
+        assert "Result limit of 1 reached" in capsys.readouterr().out
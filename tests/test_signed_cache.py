@@ -0,0 +1,24 @@
+import os
+
+
+def test_prune_signed_cache_tolerates_entries_removed_by_another_worker(workspace, monkeypatch):
+    os.makedirs(workspace.SIGNED_CACHE_DIR)
+    paths = []
+    for i in range(3):
+        path = os.path.join(workspace.SIGNED_CACHE_DIR, f"{i}.apk")
+        with open(path, "wb") as f:
+            f.write(b"x" * 100)
+        os.utime(path, (i, i))
+        paths.append(path)
+
+    real_remove = os.remove
+
+    def remove_raced(path):
+        # Another batch worker evicts the oldest entry first
+        real_remove(path)
+        if path == paths[0]:
+            raise FileNotFoundError(path)
+
+    monkeypatch.setattr(os, "remove", remove_raced)
+    assert workspace.prune_signed_cache(max_bytes=150) == (1, 100)
+    assert sorted(os.listdir(workspace.SIGNED_CACHE_DIR)) == ["2.apk"]
@@ -0,0 +1,20 @@
+import os
+import zipfile
+
+
+def test_symbol_index_needs_base_apk_and_is_keyed_by_its_hash(workspace):
+    smali = os.path.join(workspace.APK_PATCH_DIR, "base", "smali", "a")
+    os.makedirs(smali)
+    with open(os.path.join(smali, "A.smali"), "w", encoding="utf-8") as f:
+        f.write(".class public La/A;\n.super Ljava/lang/Object;\n")
+    assert workspace.update_symbol_index(workers=1) is None
+
+    apk_path = os.path.join(workspace.APK_PATCH_DIR, "base.apk")
+    with zipfile.ZipFile(apk_path, "w") as apk:
+        apk.writestr("classes.dex", b"dex")
+    conn = workspace.update_symbol_index(workers=1)
+    try:
+        assert workspace.query_symbols(conn, "classes", "La/A;")
+    finally:
+        conn.close()
+    assert os.listdir(workspace.SYMBOL_INDEX_DIR) == [workspace.file_sha256(apk_path) + ".sqlite"]
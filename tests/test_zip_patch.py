@@ -0,0 +1,71 @@
+import struct
+import zipfile
+
+import PatchApk
+
+
+def make_apk(path):
+    with zipfile.ZipFile(path, "w") as apk:
+        apk.writestr("AndroidManifest.xml", b"<manifest/>" * 50, zipfile.ZIP_DEFLATED)
+        apk.writestr("a", b"x", zipfile.ZIP_STORED)  # odd name length shifts everything after it
+        apk.writestr("classes.dex", b"dex" * 100, zipfile.ZIP_DEFLATED)
+        apk.writestr("resources.arsc", b"arsc" * 33, zipfile.ZIP_STORED)
+        apk.writestr("lib/arm64-v8a/libgame.so", b"\x7fELF" + b"\0" * 999, zipfile.ZIP_STORED)
+        apk.writestr("assets/config.json", b'{"ads": true}', zipfile.ZIP_DEFLATED)
+        apk.writestr("assets/ads/banner.png", b"png", zipfile.ZIP_STORED)
+        apk.writestr("assets/ads/video.mp4", b"mp4", zipfile.ZIP_STORED)
+        apk.writestr("META-INF/MANIFEST.MF", b"Manifest-Version: 1.0\n")
+        apk.writestr("META-INF/CERT.SF", b"sf")
+        apk.writestr("META-INF/CERT.RSA", b"rsa")
+    return str(path)
+
+
+def data_offsets(path):
+    # Offset of each entry's data, read from its local header
+    offsets = {}
+    with zipfile.ZipFile(path) as apk, open(path, "rb") as f:
+        for info in apk.infolist():
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack("<HH", f.read(4))
+            offsets[info.filename] = (info.compress_type, info.header_offset + 30 + name_len + extra_len)
+    return offsets
+
+
+def assert_aligned(path):
+    for name, (compress_type, offset) in data_offsets(path).items():
+        if compress_type == zipfile.ZIP_STORED:
+            assert offset % (4096 if name.endswith(".so") else 4) == 0, name
+
+
+def test_zip_patch_replaces_removes_and_drops_v1_signature(workspace, tmp_path):
+    apk = make_apk(tmp_path / "base.apk")
+    config = tmp_path / "config.json"
+    config.write_bytes(b'{"ads": false}')
+    extra = tmp_path / "extra.bin"
+    extra.write_bytes(b"new")
+
+    out = PatchApk.zip_patch_apk(apk, {"assets/config.json": str(config), "assets/extra.bin": str(extra)},
+                                 ["assets/ads/*"], output_path=str(tmp_path / "out.apk"))
+
+    with zipfile.ZipFile(out) as patched, zipfile.ZipFile(apk) as original:
+        assert patched.testzip() is None
+        assert patched.namelist() == ["AndroidManifest.xml", "a", "classes.dex", "resources.arsc",
+                                      "lib/arm64-v8a/libgame.so", "assets/config.json", "assets/extra.bin"]
+        assert patched.read("assets/config.json") == b'{"ads": false}'
+        assert patched.read("assets/extra.bin") == b"new"
+        for name in ("AndroidManifest.xml", "classes.dex", "lib/arm64-v8a/libgame.so"):
+            assert patched.read(name) == original.read(name)
+            assert patched.getinfo(name).compress_type == original.getinfo(name).compress_type
+    assert_aligned(out)
+
+
+def test_align_apk_round_trip(tmp_path):
+    apk = make_apk(tmp_path / "base.apk")
+    out = PatchApk.align_apk(apk, str(tmp_path / "aligned.apk"), recompress_level=9, workers=2)
+
+    with zipfile.ZipFile(out) as aligned, zipfile.ZipFile(apk) as original:
+        assert aligned.testzip() is None
+        assert aligned.namelist() == original.namelist()
+        for name in original.namelist():
+            assert aligned.read(name) == original.read(name)
+    assert_aligned(out)
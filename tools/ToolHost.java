@@ -0,0 +1,124 @@
+// ToolHost.java
+// Long-lived JVM for PatchApk.py: loads apktool / uber-apk-signer once and runs their main() per request,
+// so only the first call pays for JVM startup and JIT warm-up.
+//
+// Started by PatchApk.py as `java ToolHost.java` (single-file source launch, needs a JDK 11-23).
+// Catching System.exit needs a SecurityManager: allowed by default on 11, with -Djava.security.manager=allow
+// on 12-23 (PatchApk.py passes it), impossible from 24 on. Without the trap PatchApk.py does not use the host.
+// Protocol, one line per message, UTF-8:
+//   host -> python  READY trap|notrap          once at startup (trap: System.exit inside a tool is caught)
+//   python -> host  <jar path>\t<arg>\t<arg>...  run the jar's Main-Class with these arguments
+//   host -> python  DONE <exit code>           after every request
+//   python -> host  EXIT                       shut down
+// Tool output is sent to stderr so stdout only carries the protocol.
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.util.Arrays;
+import java.util.HashMap;
+import java.util.Map;
+import java.util.jar.JarFile;
+
+public class ToolHost {
+
+    static class ExitTrap extends SecurityException {
+        final int status;
+
+        ExitTrap(int status) {
+            super("System.exit(" + status + ")");
+            this.status = status;
+        }
+    }
+
+    public static void main(String[] argv) throws Exception {
+        PrintStream protocol = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        System.setOut(System.err);
+        boolean trapped = trapExit();
+
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        Map<String, Method> mains = new HashMap<>();
+        protocol.println(trapped ? "READY trap" : "READY notrap");
+
+        String line;
+        while ((line = in.readLine()) != null) {
+            if (line.equals("EXIT")) {
+                break;
+            }
+            String[] parts = line.split("\t", -1);
+            int code;
+            Thread thread = Thread.currentThread();
+            ClassLoader previous = thread.getContextClassLoader();
+            try {
+                Method main = mains.get(parts[0]);
+                if (main == null) {
+                    main = loadMain(parts[0]);
+                    mains.put(parts[0], main);
+                }
+                thread.setContextClassLoader(main.getDeclaringClass().getClassLoader());
+                main.invoke(null, (Object) Arrays.copyOfRange(parts, 1, parts.length));
+                code = 0;
+            } catch (InvocationTargetException e) {
+                Throwable cause = e.getCause();
+                if (cause instanceof ExitTrap) {
+                    code = ((ExitTrap) cause).status;
+                } else {
+                    cause.printStackTrace();
+                    code = 1;
+                }
+            } catch (ExitTrap e) {
+                code = e.status;
+            } catch (Throwable t) {
+                t.printStackTrace();
+                code = 1;
+            } finally {
+                thread.setContextClassLoader(previous);
+            }
+            System.err.flush();
+            protocol.println("DONE " + code);
+        }
+    }
+
+    // Each jar gets its own class loader so apktool and the signer never see each other's bundled libraries
+    static Method loadMain(String jarPath) throws Exception {
+        String mainClass;
+        try (JarFile jar = new JarFile(jarPath)) {
+            mainClass = jar.getManifest().getMainAttributes().getValue("Main-Class");
+        }
+        URLClassLoader loader = new URLClassLoader(new URL[] {new File(jarPath).toURI().toURL()},
+                ClassLoader.getPlatformClassLoader());
+        return Class.forName(mainClass, true, loader).getMethod("main", String[].class);
+    }
+
+    // Turns System.exit inside a tool into an exception. Needs -Djava.security.manager=allow on Java 18-23
+    // and is impossible on 24+; without it a tool's exit ends the host and PatchApk.py starts a new one.
+    @SuppressWarnings("removal")
+    static boolean trapExit() {
+        try {
+            System.setSecurityManager(new SecurityManager() {
+                @Override
+                public void checkPermission(java.security.Permission permission) {
+                }
+
+                @Override
+                public void checkPermission(java.security.Permission permission, Object context) {
+                }
+
+                @Override
+                public void checkExit(int status) {
+                    throw new ExitTrap(status);
+                }
+            });
+            return true;
+        } catch (Throwable t) {
+            return false;
+        }
+    }
+}